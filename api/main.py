@@ -1,11 +1,12 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query, Request
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os
+import json
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 from src.document_ingestion.data_ingestion import (
     DocumentComparator, 
     DocHandler, 
@@ -15,7 +16,17 @@ from src.document_ingestion.data_ingestion import (
 from custom_logging import GLOBAL_LOGGER as log
 from src.document_analyser.data_analysis import DocumentAnalyzer
 from src.document_compare.document_comparator import DocumentComparator as DocComparatorLLM
-from src.document_chat.retrieval import ConversationalRAG
+from src.document_chat.retrieval import ConversationalRAG, batch_query_settings
+from utils.model_loader import MODEL_REGISTRY
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.concurrency import run_blocking
+from utils.document_ops import FastAPIFileAdapter
+from utils.file_io import MAX_REQUEST_BYTES, UploadTooLarge
+from utils.blob_store import BlobStore, UnknownBlobs, is_sha256
+from utils.job_queue import get_job_queue, JobContext, QueueFull
+from utils.global_index import global_index_settings, is_valid_tag, tenant_index_dir
+from utils.hybrid_retriever import SEARCH_TYPES, default_search_type
+from utils.page_diff import page_diff_settings
 
 
 FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
@@ -42,6 +53,17 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def reject_oversized_requests(request: Request, call_next):
+    # Refuse on the declared length before the multipart body is spooled to disk; bodies
+    # without a Content-Length (chunked) are still cut off by the UploadBudget while copying
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413,
+                            content={"detail": f"Request exceeds the {MAX_REQUEST_BYTES} byte upload limit"})
+    return await call_next(request)
+
+
 # Serve static template
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -54,16 +76,13 @@ async def serve_ui(request: Request):
 def health_check():
     return {"status": "ok", "message": "API is healthy"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "model_registry": MODEL_REGISTRY.stats(),
+        "vectorstore_cache": VECTORSTORE_CACHE.stats(),
+    }
 
-class FastAPIFileAdapter:
-    """ Adapt FASTAPI UplodFile : .name + .getbuffer() API"""
-    def __init__(self, uf: UploadFile):
-        self._uf = uf
-        self.name = uf.filename
-
-    def getbuffer(self) -> bytes:
-        self._uf.file.seek(0)
-        return self._uf.file.read()
 
 def _read_pdf_via_handler(handler: DocHandler, file_path: str):
     """Helper function to read PDF using DocHandler."""
@@ -75,15 +94,18 @@ def _read_pdf_via_handler(handler: DocHandler, file_path: str):
 @app.post("/analyze")
 async def analyze_documents(file: UploadFile = File(...)) -> Any:
     try:
-        dh = DocHandler()
-        saved_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = _read_pdf_via_handler(dh, saved_path)
+        # Disk writes and fitz parsing run in the bounded executor, the LLM call is awaited
+        dh = await run_blocking(DocHandler)
+        saved_path = await run_blocking(dh.save_pdf, FastAPIFileAdapter(file))
+        text = await run_blocking(_read_pdf_via_handler, dh, saved_path)
         analyser = DocumentAnalyzer()
-        analysis_result = analyser.analyze_document(text)
+        analysis_result = await analyser.aanalyze_document(text)
         return JSONResponse(content=analysis_result)
 
     except HTTPException:
         raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis Failed : {str(e)}")
     
@@ -91,56 +113,215 @@ async def analyze_documents(file: UploadFile = File(...)) -> Any:
 @app.post("/compare")
 async def compare_documents(reference: UploadFile = File(...), actual: UploadFile = File(...)) -> Any:
     try:
-        dc = DocumentComparator()
-        ref_path, act_path = dc.save_uploaded_files(
+        dc = await run_blocking(DocumentComparator)
+        ref_path, act_path = await run_blocking(
+            dc.save_uploaded_files,
             FastAPIFileAdapter(reference), 
             FastAPIFileAdapter(actual)
         )
 
-        _ = ref_path, act_path
-        combined_text = dc.combine_documents()
         comparator = DocComparatorLLM()
-        df = comparator.compare_documents(combined_text)
+        if page_diff_settings()["enabled"]:
+            # Unchanged pages are answered locally; only changed ones reach the LLM
+            ref_pages = await run_blocking(dc.read_pages, ref_path)
+            act_pages = await run_blocking(dc.read_pages, act_path)
+            df, diff = await comparator.acompare_pages(ref_pages, act_pages)
+            return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id, "diff": diff}
+        combined_text = await run_blocking(dc.combine_documents)
+        df = await comparator.acompare_documents(combined_text)
         print("##########", df)
         return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id}
         
     except HTTPException:
         raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison Failed : {str(e)}")
     
 
+@app.get("/uploads/{sha256}")
+async def upload_lookup(sha256: str) -> Any:
+    """Cheap "do you already have this file?" check so clients can skip re-uploading it."""
+    if not is_sha256(sha256.lower()):
+        raise HTTPException(status_code=400, detail="Expected a 64-character hex SHA-256 digest")
+    blob = await run_blocking(BlobStore(Path(UPLOAD_BASE) / "blobs").get, sha256.lower())
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"Unknown blob: {sha256}")
+    return {"sha256": blob["sha256"], "size": blob["size"], "exists": True}
+
+
 @app.post("/chat/index")
 async def chat_build_index(
-    files: List[UploadFile] = File(...),
+    files: Optional[List[UploadFile]] = File(None),
+    blob_hashes: List[str] = Form([]),
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     chunk_size: int = Form(1000),
     chunk_overlap: int = Form(200),
     k: int = Form(5),
+    background: bool = Form(False),
+    replace: bool = Form(False),
+    tenant_id: Optional[str] = Form(None),
 ) -> Any:
     try:
-        log.info(f"Indexing chat session. Session ID: {session_id}, Files: {[f.filename for f in files]}")
+        files = files or []
+        if not files and not blob_hashes:
+            raise HTTPException(status_code=400, detail="Provide files and/or blob_hashes")
+        log.info(f"Indexing chat session. Session ID: {session_id}, Files: {[f.filename for f in files]}",
+                 blob_hashes=blob_hashes)
         wrapped = [FastAPIFileAdapter(f) for f in files]
         # this is my main class for storing a data into VDB
         # created a object of ChatIngestor
-        ci = ChatIngestor(
+        ci = await run_blocking(
+            ChatIngestor,
             temp_base=UPLOAD_BASE,
             faiss_base=FAISS_BASE,
             use_session_dirs=use_session_dirs,
             session_id=session_id or None,
+            tenant_id=tenant_id or None,
         )
+        if background:
+            # Uploads must be on disk before the request ends; the rest runs as a job
+            paths = await run_blocking(ci.save_uploads, wrapped, blob_hashes)
+            job_id = get_job_queue().submit(
+                "chat_index", _run_index_job, ci, paths,
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k, replace=replace,
+            )
+            log.info(f"Index job queued for session: {ci.session_id}", job_id=job_id)
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id, "status": "queued", "session_id": ci.session_id,
+                "k": k, "use_session_dirs": use_session_dirs,
+            })
+
         # NOTE: ensure your ChatIngestor saves with index_name="index" or FAISS_INDEX_NAME
         # e.g., if it calls FAISS.save_local(dir, index_name=FAISS_INDEX_NAME)
-        ci.built_retriver(  # if your method name is actually build_retriever, fix it there as well
-            wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+        # save -> parse -> split -> embed -> index is all blocking work, keep it off the event loop
+        await run_blocking(  # if your method name is actually build_retriever, fix it there as well
+            ci.built_retriver, wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k,
+            known_hashes=blob_hashes, replace=replace,
         )
         log.info(f"Index created successfully for session: {ci.session_id}")
         return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
     except HTTPException:
         raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnknownBlobs as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Indexing queue is full, retry later: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Indexing Failed : {str(e)}")
+
+
+def _run_index_job(ctx: JobContext, ci: ChatIngestor, paths: List[Path], **kwargs: Any) -> Dict[str, Any]:
+    ci.ingest_paths(paths, progress=ctx.update, **kwargs)
+    return {"session_id": ci.session_id, "k": kwargs.get("k")}
+
+
+@app.get("/chat/index/{job_id}")
+async def chat_index_status(job_id: str) -> Any:
+    job = await run_blocking(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.delete("/chat/index/{job_id}")
+async def chat_index_cancel(job_id: str) -> Any:
+    queue = get_job_queue()
+    if await run_blocking(queue.get, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    cancelled = await run_blocking(queue.cancel, job_id)
+    return {"job_id": job_id, "cancel_requested": cancelled}
+
+
+def _index_target(session_id: Optional[str], use_session_dirs: bool, tenant_id: Optional[str] = None,
+                  scope: str = "session"):
+    """
+    (index directory, sessions filter) for a request. In global index mode the index is
+    the tenant's shared one and scope="session" filters it to session_id; scope="tenant"
+    searches every session of the tenant.
+    """
+    if global_index_settings()["enabled"]:
+        if scope not in ("session", "tenant"):
+            raise HTTPException(status_code=400, detail="scope must be 'session' or 'tenant'")
+        if tenant_id is not None and not is_valid_tag(tenant_id):
+            raise HTTPException(status_code=400, detail=f"Invalid tenant_id: {tenant_id!r}")
+        if scope == "session" and not session_id:
+            raise HTTPException(status_code=400, detail="session_id is required for session-scoped queries")
+        index_dir = str(tenant_index_dir(FAISS_BASE, tenant_id))
+        sessions = [session_id] if scope == "session" else None
+    else:
+        if use_session_dirs and not session_id:
+            raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
+        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
+        sessions = None
+    if not os.path.isdir(index_dir):
+        raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+    return index_dir, sessions
+
+
+def _search_type(search_type: Optional[str]) -> str:
+    """Retrieval mode for a query: similarity, mmr or hybrid (BM25 + vectors); retriever.search_type by default."""
+    search_type = search_type or default_search_type()
+    if search_type not in SEARCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"search_type must be one of {', '.join(SEARCH_TYPES)}")
+    return search_type
+
+
+def _search_kwargs(k: int, fetch_k: Optional[int], lambda_mult: Optional[float]) -> Dict[str, Any]:
+    """Retriever kwargs: fetch_k (candidate pool for mmr/hybrid) and lambda (mmr diversity) only when given."""
+    kwargs: Dict[str, Any] = {"k": k}
+    if fetch_k is not None:
+        if fetch_k < k:
+            raise HTTPException(status_code=400, detail="fetch_k must be at least k")
+        kwargs["fetch_k"] = fetch_k
+    if lambda_mult is not None:
+        if not 0.0 <= lambda_mult <= 1.0:
+            raise HTTPException(status_code=400, detail="lambda must be between 0 and 1")
+        kwargs["lambda_mult"] = lambda_mult
+    return kwargs
+
+
+def _session_ingestor(session_id: Optional[str], use_session_dirs: bool,
+                      tenant_id: Optional[str] = None) -> ChatIngestor:
+    _index_target(session_id, use_session_dirs, tenant_id)
+    return ChatIngestor(temp_base=UPLOAD_BASE, faiss_base=FAISS_BASE, use_session_dirs=use_session_dirs,
+                        session_id=session_id or None, tenant_id=tenant_id or None)
+
+
+@app.get("/chat/documents")
+async def chat_list_documents(
+    session_id: Optional[str] = Query(None),
+    use_session_dirs: bool = Query(True),
+    tenant_id: Optional[str] = Query(None),
+) -> Any:
+    ci = await run_blocking(_session_ingestor, session_id, use_session_dirs, tenant_id)
+    documents = await run_blocking(ci.list_documents)
+    return {"session_id": session_id, "documents": [{"source": s, "chunks": n} for s, n in documents.items()]}
+
+
+@app.delete("/chat/documents")
+async def chat_delete_documents(
+    source: List[str] = Query(...),
+    session_id: Optional[str] = Query(None),
+    use_session_dirs: bool = Query(True),
+    tenant_id: Optional[str] = Query(None),
+) -> Any:
+    """Remove documents (by uploaded file name) from a session index; re-index with replace=true to update one."""
+    try:
+        ci = await run_blocking(_session_ingestor, session_id, use_session_dirs, tenant_id)
+        stats = await run_blocking(ci.delete_documents, source)
+        log.info(f"Documents deleted for session: {session_id}", sources=source, **stats)
+        return {"session_id": session_id, "sources": source, **stats}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {e}")
     
 
 @app.post("/chat/query")
@@ -149,29 +330,135 @@ async def chat_query(
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     k: int = Form(5),
+    tenant_id: Optional[str] = Form(None),
+    scope: str = Form("session"),
+    search_type: Optional[str] = Form(None),
+    fetch_k: Optional[int] = Form(None),
+    lambda_mult: Optional[float] = Form(None, alias="lambda"),
 ) -> Any:
     try:
         log.info(f"Received chat query: '{question}' | session: {session_id}")
-        if use_session_dirs and not session_id:
-            raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
-
-        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
-        if not os.path.isdir(index_dir):
-            raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+        index_dir, sessions = _index_target(session_id, use_session_dirs, tenant_id, scope)
+        search_type = _search_type(search_type)
+        search_kwargs = _search_kwargs(k, fetch_k, lambda_mult)
 
         rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=FAISS_INDEX_NAME)  # build retriever + chain
-        response = rag.invoke(question, chat_history=[])
+        # build retriever + chain (may hit disk on a cold cache)
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME,
+                           search_type=search_type, search_kwargs=search_kwargs, sessions=sessions)
+        response = await rag.ainvoke(question, chat_history=[])
         log.info("Chat query handled successfully.")
 
         return {
             "answer": response,
             "session_id": session_id,
             "k": k,
+            "search_type": search_type,
             "engine": "LCEL-RAG"
         }
     except HTTPException:
         raise
     except Exception as e:
         log.exception("Chat query failed")
-        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+
+@app.post("/chat/query/batch")
+async def chat_query_batch(
+    questions: List[str] = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+    tenant_id: Optional[str] = Form(None),
+    scope: str = Form("session"),
+    search_type: Optional[str] = Form(None),
+    fetch_k: Optional[int] = Form(None),
+    lambda_mult: Optional[float] = Form(None, alias="lambda"),
+    max_concurrency: Optional[int] = Form(None),
+) -> Any:
+    """Answer many standalone questions against one index: per-question answers, sources and timings."""
+    settings = batch_query_settings()
+    questions = [q for q in questions if q.strip()]
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(questions) > settings["max_questions"]:
+        raise HTTPException(status_code=400, detail=f"At most {settings['max_questions']} questions per batch")
+    if max_concurrency is not None and max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be at least 1")
+    concurrency = min(max_concurrency or settings["max_concurrency"], settings["max_concurrency"])
+    index_dir, sessions = _index_target(session_id, use_session_dirs, tenant_id, scope)
+    search_type = _search_type(search_type)
+    search_kwargs = _search_kwargs(k, fetch_k, lambda_mult)
+
+    try:
+        log.info(f"Received batch chat query: {len(questions)} questions | session: {session_id}")
+        rag = ConversationalRAG(session_id=session_id)
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME,
+                           search_type=search_type, search_kwargs=search_kwargs, sessions=sessions)
+        response = await rag.abatch(questions, max_concurrency=concurrency)
+        log.info("Batch chat query handled successfully.")
+        return {
+            **response,
+            "session_id": session_id,
+            "k": k,
+            "search_type": search_type,
+            "engine": "LCEL-RAG",
+        }
+    except Exception as e:
+        log.exception("Batch chat query failed")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+
+def _format_stream_event(event: Dict[str, Any], fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps(event, default=str) + "\n"
+    name = event.get("event", "message")
+    body = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {name}\ndata: {json.dumps(body, default=str)}\n\n"
+
+
+@app.post("/chat/query/stream")
+async def chat_query_stream(
+    question: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+    format: str = Form("sse"),
+    tenant_id: Optional[str] = Form(None),
+    scope: str = Form("session"),
+    search_type: Optional[str] = Form(None),
+    fetch_k: Optional[int] = Form(None),
+    lambda_mult: Optional[float] = Form(None, alias="lambda"),
+) -> Any:
+    """Streaming /chat/query: token events as they are generated, then an 'end' event with sources and timings."""
+    log.info(f"Received streaming chat query: '{question}' | session: {session_id}")
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    index_dir, sessions = _index_target(session_id, use_session_dirs, tenant_id, scope)
+    search_type = _search_type(search_type)
+    search_kwargs = _search_kwargs(k, fetch_k, lambda_mult)
+
+    try:
+        rag = ConversationalRAG(session_id=session_id)
+        await run_blocking(rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME,
+                           search_type=search_type, search_kwargs=search_kwargs, sessions=sessions)
+    except Exception as e:
+        log.exception("Chat stream setup failed")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in rag.astream(question, chat_history=[]):
+                yield _format_stream_event(event, format)
+            log.info("Streaming chat query handled successfully.")
+        except Exception as e:
+            # Headers are already sent, so failures are reported in-band
+            log.exception("Streaming chat query failed")
+            yield _format_stream_event({"event": "error", "detail": f"Query failed: {e}"}, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
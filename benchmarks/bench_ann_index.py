@@ -0,0 +1,88 @@
+"""
+Offline recall@k vs. query latency for each faiss_db.index.type.
+
+    python benchmarks/bench_ann_index.py --vectors 100000 --dim 256 --queries 200
+
+Vectors are a normalised Gaussian mixture (clustered like real embeddings).
+Ground truth is the exact Flat search; every ANN type is built through
+utils.faiss_store.new_index with the same settings the app would use, then
+searched one query at a time while sweeping its query-time knob.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import faiss
+
+from utils.faiss_store import index_settings, new_index, tune_index
+
+
+def _data(n: int, dim: int, n_queries: int, clusters: int = 200):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    def sample(m):
+        x = centers[rng.integers(0, clusters, m)] + 0.5 * rng.standard_normal((m, dim), dtype=np.float32)
+        faiss.normalize_L2(x)
+        return x
+    return sample(n), sample(n_queries)
+
+
+def _serialized_mb(index) -> float:
+    return faiss.serialize_index(index).nbytes / 2**20
+
+
+def _measure(index, queries, truth, k):
+    latencies, hits = [], 0
+    for q, gt in zip(queries, truth):
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(ids[0]) & set(gt))
+    return hits / (len(queries) * k), float(np.percentile(latencies, 50) * 1000), float(np.percentile(latencies, 95) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    x, queries = _data(args.vectors, args.dim, args.queries)
+    flat = faiss.IndexFlatL2(args.dim)
+    flat.add(x)
+    _, truth = flat.search(queries, args.k)
+
+    print(f"{args.vectors} x {args.dim} vectors, {args.queries} single-vector queries, recall@{args.k}\n")
+    print(f"{'type':>8} | {'knob':>13} | {'build s':>7} | {'MB':>6} | {'recall':>6} | {'p50 ms':>6} | {'p95 ms':>6}")
+    print("-" * 70)
+    recall, p50, p95 = _measure(flat, queries, truth, args.k)
+    print(f"{'flat':>8} | {'-':>13} | {0:>7.1f} | {_serialized_mb(flat):>6.0f} | {recall:>6.3f} | {p50:>6.2f} | {p95:>6.2f}")
+
+    sweeps = {
+        "ivf_flat": ("nprobe", [4, 16, 64]),
+        "hnsw": ("ef_search", [16, 64, 256]),
+        "ivf_pq": ("nprobe", [4, 16, 64]),
+    }
+    for kind, (knob, values) in sweeps.items():
+        settings = index_settings({"type": kind, "min_train_vectors": 0})
+        start = time.perf_counter()
+        index = new_index(args.dim, x, settings)
+        index.add(x)
+        build = time.perf_counter() - start
+        size = _serialized_mb(index)
+        for value in values:
+            tune_index(index, {**settings, knob: value})
+            recall, p50, p95 = _measure(index, queries, truth, args.k)
+            print(f"{kind:>8} | {knob + '=' + str(value):>13} | {build:>7.1f} | {size:>6.0f} | "
+                  f"{recall:>6.3f} | {p50:>6.2f} | {p95:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
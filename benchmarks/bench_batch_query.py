@@ -0,0 +1,77 @@
+"""
+Retrieval throughput of /chat/query/batch against answering questions one by one.
+
+    python benchmarks/bench_batch_query.py --questions 200 --chunks 20000 --dim 1536 --rtt-ms 40
+
+Embeddings are deterministic fakes that sleep --rtt-ms per provider call (the network
+round trip that dominates a real embedding request). Reports, for --questions questions:
+
+  per question   one embed_query call and one similarity_search per question
+  batch          one embed_documents call and one matrix search (similarity_search_batch)
+
+LLM generation is not included; the batch endpoint overlaps it with max_concurrency.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.faiss_store import load_faiss, save_faiss, similarity_search_batch
+
+
+class RemoteFakeEmbedding(DeterministicFakeEmbedding):
+    rtt_ms: float = 40.0
+
+    def embed_documents(self, texts):
+        time.sleep(self.rtt_ms / 1000)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        time.sleep(self.rtt_ms / 1000)
+        return super().embed_query(text)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=200)
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--rtt-ms", type=float, default=40.0)
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    embeddings = RemoteFakeEmbedding(size=args.dim, rtt_ms=0)
+    texts = [f"chunk {i} about topic {i % 97}" for i in range(args.chunks)]
+    questions = [f"what about topic {i % 97}?" for i in range(args.questions)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_faiss(FAISS.from_texts(texts, embeddings), tmp)
+        vs = load_faiss(tmp, embeddings, mmap=True)
+        embeddings.rtt_ms = args.rtt_ms
+
+        start = time.perf_counter()
+        single = [vs.similarity_search(q, k=args.k) for q in questions]
+        loop_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = similarity_search_batch(vs, np.array(embeddings.embed_documents(questions)), args.k)
+        batch_s = time.perf_counter() - start
+        assert [[d.page_content for d in r] for r in batched] == [[d.page_content for d in r] for r in single]
+
+    print(f"{args.questions} questions, {args.chunks} chunks, dim {args.dim}, k={args.k}, rtt {args.rtt_ms:g} ms")
+    print(f"{'retrieval':<14}{'total s':>10}{'questions/s':>14}")
+    for name, secs in (("per question", loop_s), ("batch", batch_s)):
+        print(f"{name:<14}{secs:>10.2f}{args.questions / secs:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
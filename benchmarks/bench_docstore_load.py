@@ -0,0 +1,83 @@
+"""
+Cold open + top-k query cost of the pickle docstore vs. the sqlite docstore.
+
+    python benchmarks/bench_docstore_load.py --chunks 20000 50000
+
+Builds one index per size and saves it both ways, then opens each in a fresh
+subprocess (so RSS is not shared) and runs a single k=5 search.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DIM = 256
+
+
+def _build(path: str, n: int):
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.faiss_store import save_faiss
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, DIM), dtype=np.float32)
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet " * 40 for i in range(n)]
+    metadatas = [{"source": f"doc{i // 50}.pdf", "page": i % 50} for i in range(n)]
+    vs = FAISS.from_embeddings(list(zip(texts, vectors.tolist())), DeterministicFakeEmbedding(size=DIM),
+                               metadatas=metadatas)
+    vs.save_local(os.path.join(path, "pickle"))
+    save_faiss(vs, os.path.join(path, "sqlite"))
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _open_and_query(path: str, mode: str):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.faiss_store import load_faiss
+
+    emb = DeterministicFakeEmbedding(size=DIM)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    vs = load_faiss(os.path.join(path, mode), emb)
+    opened = time.perf_counter()
+    vs.similarity_search_by_vector(emb.embed_query("query"), k=5)
+    done = time.perf_counter()
+    rss_after = _rss_mb()
+    print(json.dumps({"open_ms": (opened - start) * 1000, "query_ms": (done - opened) * 1000,
+                      "rss_mb": rss_after - rss_before}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[20_000, 50_000])
+    parser.add_argument("--_child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args._child:
+        _open_and_query(*args._child)
+        return
+
+    print(f"{'chunks':>7} | {'docstore':>8} | {'open ms':>8} | {'query ms':>8} | {'RSS +MB':>7}")
+    print("-" * 52)
+    for n in args.chunks:
+        with tempfile.TemporaryDirectory() as tmp:
+            _build(tmp, n)
+            for mode in ("pickle", "sqlite"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--_child", tmp, mode],
+                    capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1]
+                r = json.loads(out)
+                print(f"{n:>7} | {mode:>8} | {r['open_ms']:>8.1f} | {r['query_ms']:>8.2f} | {r['rss_mb']:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Embedding throughput vs. concurrency against a local fake embedding server.
+
+    python benchmarks/bench_embedding_executor.py --texts 4000 --latency 0.1
+
+Runs BatchedEmbeddings over a real OpenAIEmbeddings client pointed at the fake
+server, for several concurrency levels, then once more with a request-rate cap to
+show the adaptive 429 backoff.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.fake_embedding_server import FakeEmbeddingServer
+from utils.embedding_executor import BatchedEmbeddings
+
+
+def _client(server: FakeEmbeddingServer) -> OpenAIEmbeddings:
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        api_key="sk-bench",
+        base_url=server.base_url,
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+
+
+def _texts(n: int):
+    return [f"chunk {i}: " + "lorem ipsum dolor sit amet " * 30 for i in range(n)]
+
+
+def run(n_texts: int, latency: float, batch_size: int, levels):
+    texts = _texts(n_texts)
+    print(f"{n_texts} texts, batch_size={batch_size}, server latency={latency * 1000:.0f} ms/request\n")
+    print(f"{'concurrency':>11} | {'seconds':>8} | {'texts/s':>9} | {'speedup':>7}")
+    print("-" * 46)
+    baseline = None
+    with FakeEmbeddingServer(latency=latency) as server:
+        for c in levels:
+            emb = BatchedEmbeddings(_client(server), max_batch_size=batch_size, max_concurrency=c)
+            start = time.perf_counter()
+            vectors = emb.embed_documents(texts)
+            elapsed = time.perf_counter() - start
+            assert len(vectors) == len(texts)
+            baseline = baseline or elapsed
+            print(f"{c:>11} | {elapsed:>8.2f} | {len(texts) / elapsed:>9.0f} | {baseline / elapsed:>6.1f}x")
+
+    cap, window = 20, 1.0
+    print(f"\nWith a cap of {cap} requests per {window:.0f}s (concurrency 16):")
+    with FakeEmbeddingServer(latency=latency, max_requests=cap, window=window) as server:
+        emb = BatchedEmbeddings(_client(server), max_batch_size=batch_size, max_concurrency=16, base_delay=0.2)
+        start = time.perf_counter()
+        vectors = emb.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts)
+        print(f"  {len(vectors)} texts in {elapsed:.2f}s ({len(texts) / elapsed:.0f} texts/s, "
+              f"provider ceiling {cap * batch_size / window:.0f} texts/s), {server.rejected} requests got 429, "
+              f"final concurrency limit {emb._limiter.limit}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=4000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    run(args.texts, args.latency, args.batch_size, args.levels)
@@ -0,0 +1,87 @@
+"""
+Session-scoped search in a shared tenant index vs. one index per session.
+
+    python benchmarks/bench_global_index.py --sessions 50 --chunks 2000 --queries 200
+
+Builds --sessions sessions of --chunks vectors each, once as separate per-session
+Flat indexes (today's layout) and once as one tenant SegmentedIndex, and reports
+mean query latency for:
+
+  per-session      search the session's own index
+  scoped (owned)   tenant index, session filter; each session still owns its segment
+  scoped (merged)  tenant index compacted into one segment, session filter via IDSelector
+  over-fetch       merged tenant index, fetch k * sessions and filter afterwards
+  tenant-wide      merged tenant index, no filter (cross-session query)
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.faiss_segments import ScopedIndex, Segment, SegmentedIndex
+
+
+def _time(fn, queries) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q[None, :])
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=50)
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    rng = np.random.default_rng(0)
+    n = args.sessions * args.chunks
+    x = rng.standard_normal((n, args.dim)).astype(np.float32)
+    target = args.sessions // 2
+    lo, hi = target * args.chunks, (target + 1) * args.chunks
+    queries = x[rng.integers(lo, hi, args.queries)] + 0.01
+
+    own = faiss.IndexFlatL2(args.dim)
+    own.add(x[lo:hi])
+
+    segments = []
+    for s in range(args.sessions):
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(args.dim))
+        index.add_with_ids(x[s * args.chunks:(s + 1) * args.chunks], np.arange(s * args.chunks, (s + 1) * args.chunks))
+        segments.append(Segment(f"seg-{s}", index, s * args.chunks))
+    owned = ScopedIndex(SegmentedIndex(args.dim, segments, next_id=n), np.arange(lo, hi))
+
+    merged_index = faiss.IndexIDMap2(faiss.IndexFlatL2(args.dim))
+    merged_index.add_with_ids(x, np.arange(n))
+    merged = SegmentedIndex(args.dim, [Segment("seg-all", merged_index, 0)], next_id=n)
+    scoped_merged = ScopedIndex(merged, np.arange(lo, hi))
+
+    def over_fetch(q):
+        _, ids = merged.search(q, args.k * args.sessions)
+        keep = ids[(ids >= lo) & (ids < hi)]
+        return keep[: args.k]
+
+    rows = [
+        ("per-session", _time(lambda q: own.search(q, args.k), queries)),
+        ("scoped (owned)", _time(lambda q: owned.search(q, args.k), queries)),
+        ("scoped (merged)", _time(lambda q: scoped_merged.search(q, args.k), queries)),
+        ("over-fetch", _time(over_fetch, queries)),
+        ("tenant-wide", _time(lambda q: merged.search(q, args.k), queries)),
+    ]
+    print(f"{args.sessions} sessions x {args.chunks} chunks, dim {args.dim}, k={args.k}")
+    print(f"{'mode':<18}{'ms/query':>10}")
+    for name, ms in rows:
+        print(f"{name:<18}{ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
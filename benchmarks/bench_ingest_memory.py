@@ -0,0 +1,102 @@
+"""
+Peak memory of chat ingestion against corpus size: streamed batches vs one batch.
+
+    python benchmarks/bench_ingest_memory.py --gb 2 --files 8 --batch-chunks 512 0
+
+Writes --gb of synthetic UTF-8 text as --files files, then ingests them with
+ChatIngestor.ingest_paths once per --batch-chunks value, each run in a fresh process
+so its peak RSS is its own. 0 means a single batch holding every chunk (the fully
+materialised path ingestion used before streaming). Embeddings are deterministic
+fakes of --dim dimensions, so the numbers measure parsing, splitting and indexing.
+"""
+import os
+import sys
+import time
+import json
+import resource
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORDS = ("pump valve clause refund supplier delivery warranty annex section order invoice shipment "
+         "inspection tolerance pressure assembly gasket torque schedule liability").split()
+
+
+def _write_corpus(root: Path, total_bytes: int, files: int):
+    rng = np.random.default_rng(0)
+    per_file = total_bytes // files
+    paths = []
+    for f in range(files):
+        path = root / f"corpus-{f}.txt"
+        written = 0
+        with open(path, "w", encoding="utf-8") as out:
+            while written < per_file:
+                # Unique lines so every chunk is new to the index
+                idx = rng.integers(0, len(WORDS), (2000, 14))
+                block = "".join(f"{n} " + " ".join(WORDS[i] for i in row) + ".\n"
+                                for n, row in zip(range(written, written + 2000), idx))
+                out.write(block)
+                written += len(block)
+        paths.append(path)
+    return paths
+
+
+def _child(args):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.document_ingestion import data_ingestion
+    from src.document_ingestion.data_ingestion import ChatIngestor
+
+    class _Loader:
+        def load_embeddings(self):
+            return DeterministicFakeEmbedding(size=args.dim)
+
+    batch = args.child_batch or 1 << 62
+    data_ingestion.document_batch_settings = lambda: batch
+    paths = sorted(Path(args.corpus).glob("corpus-*.txt"))
+    with tempfile.TemporaryDirectory() as tmp:
+        ingestor = ChatIngestor(temp_base=os.path.join(tmp, "data"), faiss_base=os.path.join(tmp, "faiss"),
+                                use_session_dirs=True, session_id="bench")
+        ingestor.model_loader = _Loader()
+        counts = {}
+        start = time.perf_counter()
+        ingestor.ingest_paths(paths, progress=lambda **c: counts.update(c))
+        secs = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"peak_mb": peak_mb, "seconds": secs, "chunks": counts.get("chunks", 0)}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gb", type=float, default=2.0)
+    ap.add_argument("--files", type=int, default=8)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--batch-chunks", type=int, nargs="+", default=[512, 0])
+    ap.add_argument("--corpus", help=argparse.SUPPRESS)
+    ap.add_argument("--child-batch", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.corpus:
+        return _child(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_corpus(Path(tmp), int(args.gb * 2**30), args.files)
+        print(f"{args.gb:g} GiB corpus in {args.files} files, dim {args.dim}")
+        print(f"{'batch_chunks':<14}{'chunks':>10}{'peak RSS MiB':>14}{'seconds':>10}")
+        for batch in args.batch_chunks:
+            out = subprocess.run(
+                [sys.executable, __file__, "--corpus", tmp, "--child-batch", str(batch), "--dim", str(args.dim)],
+                capture_output=True, text=True, cwd=os.path.join(os.path.dirname(__file__), ".."),
+            )
+            if out.returncode:
+                print(f"{batch or 'all':<14}{'failed':>10}  {out.stderr.strip().splitlines()[-1]}")
+                continue
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{batch or 'all':<14}{result['chunks']:>10}{result['peak_mb']:>14.0f}{result['seconds']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
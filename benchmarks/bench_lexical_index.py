@@ -0,0 +1,78 @@
+"""
+BM25 lookup latency of the ingestion-time lexical index.
+
+    python benchmarks/bench_lexical_index.py --chunks 50000 --batch 2000 --queries 500
+
+Writes --chunks synthetic chunks (~150 terms each, Zipf-distributed vocabulary plus
+one part code per chunk) as lexical segments of --batch chunks, the way ingestion
+does, then reports index size and per-query latency for identifier lookups and
+natural-language questions. Hybrid retrieval adds the lexical latency only when it
+exceeds the dense search it runs alongside.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.lexical_index import LexicalIndex, add_lexical_batch
+
+
+def _percentiles(fn, queries):
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=50000)
+    ap.add_argument("--batch", type=int, default=2000)
+    ap.add_argument("--vocab", type=int, default=30000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = np.array([f"w{i}" for i in range(args.vocab)])
+    zipf = 1.0 / np.arange(1, args.vocab + 1)
+    zipf /= zipf.sum()
+
+    def chunk(i):
+        body = " ".join(words[rng.choice(args.vocab, 150, p=zipf)])
+        return f"{body} part PN-{i:06d}-B clause {i % 40}.{i % 7}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for lo in range(0, args.chunks, args.batch):
+            hi = min(lo + args.batch, args.chunks)
+            add_lexical_batch(tmp, [chunk(i) for i in range(lo, hi)], range(lo, hi))
+        build_s = time.perf_counter() - start
+
+        lexical = LexicalIndex.load(tmp)
+        codes = [f"which pump uses PN-{i:06d}-B" for i in rng.integers(0, args.chunks, args.queries)]
+        questions = [" ".join(words[rng.choice(args.vocab, 8, p=zipf)]) for _ in range(args.queries)]
+        tombstones = rng.choice(args.chunks, args.chunks // 20, replace=False)
+
+        rows = [
+            ("identifier", _percentiles(lambda q: lexical.search(q, args.k), codes)),
+            ("question", _percentiles(lambda q: lexical.search(q, args.k), questions)),
+            ("question+tombstones", _percentiles(lambda q: lexical.search(q, args.k, exclude=tombstones), questions)),
+        ]
+
+    print(f"{args.chunks} chunks in {len(lexical.segments)} segments, {lexical.nbytes / 2**20:.1f} MiB, "
+          f"built in {build_s:.1f}s")
+    print(f"{'query':<22}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, (p50, p95) in rows:
+        print(f"{name:<22}{p50:>10.2f}{p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
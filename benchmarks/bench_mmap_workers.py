@@ -0,0 +1,108 @@
+"""
+Per-worker open latency and memory for in-memory vs. memory-mapped index loads.
+
+    python benchmarks/bench_mmap_workers.py --vectors 200000 --workers 4
+
+Builds one flat index (sqlite docstore), then starts N worker processes at once,
+as `uvicorn --workers N` would, each opening the index and running a few searches.
+RssAnon is the worker's private heap; Pss splits shared page-cache pages between
+the processes mapping them, so its sum is the real total.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DIM = 384
+
+
+def _build(path: str, n: int):
+    import faiss
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.faiss_store import save_faiss
+
+    index = faiss.IndexFlatL2(DIM)
+    index.add(np.random.default_rng(0).standard_normal((n, DIM), dtype=np.float32))
+    ids = [str(i) for i in range(n)]
+    docstore = InMemoryDocstore({i: Document(page_content=f"chunk {i}") for i in ids})
+    vs = FAISS(DeterministicFakeEmbedding(size=DIM), index, docstore, dict(enumerate(ids)))
+    save_faiss(vs, path)
+
+
+def _memory() -> dict:
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                key, value = line.split(":")
+                out[key] = int(value.split()[0]) / 1024
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                out["Pss"] = int(line.split()[1]) / 1024
+    return out
+
+
+def _worker(path: str, mmap: str):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.faiss_store import load_faiss
+
+    emb = DeterministicFakeEmbedding(size=DIM)
+    base = _memory()
+    start = time.perf_counter()
+    vs = load_faiss(path, emb, mmap=mmap == "1")
+    opened = time.perf_counter()
+    for i in range(20):
+        vs.similarity_search_by_vector(emb.embed_query(f"q{i}"), k=5)
+    queried = time.perf_counter()
+    time.sleep(1.0)  # keep every worker alive while the others measure
+    mem = _memory()
+    print(json.dumps({
+        "open_ms": (opened - start) * 1000,
+        "query_ms": (queried - opened) * 1000 / 20,
+        "anon_mb": mem["RssAnon"] - base["RssAnon"],
+        "pss_mb": mem["Pss"] - base["Pss"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--_child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args._child:
+        _worker(*args._child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _build(tmp, args.vectors)
+        size_mb = os.path.getsize(os.path.join(tmp, "index.faiss")) / 2**20
+        print(f"{args.vectors} x {DIM} flat index ({size_mb:.0f} MB), {args.workers} workers\n")
+        print(f"{'load':>6} | {'open ms':>8} | {'query ms':>8} | {'heap MB/worker':>14} | {'total PSS MB':>12}")
+        print("-" * 62)
+        for mmap in ("0", "1"):
+            procs = [
+                subprocess.Popen([sys.executable, __file__, "--_child", tmp, mmap],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                for _ in range(args.workers)
+            ]
+            results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+            avg = {k: sum(r[k] for r in results) / len(results) for k in results[0]}
+            total_pss = sum(r["pss_mb"] for r in results)
+            label = "mmap" if mmap == "1" else "heap"
+            print(f"{label:>6} | {avg['open_ms']:>8.1f} | {avg['query_ms']:>8.2f} | "
+                  f"{avg['anon_mb']:>14.1f} | {total_pss:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
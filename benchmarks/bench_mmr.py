@@ -0,0 +1,74 @@
+"""
+Cost of MMR re-ranking on top of a similarity search.
+
+    python benchmarks/bench_mmr.py --fetch-k 50 --k 5 --dim 1536 --repeat 500
+
+Compares, for one query and a pool of --fetch-k candidates:
+
+  reconstruct (per id)   candidate vectors read one reconstruct() call at a time (langchain FAISS)
+  reconstruct (batch)    SegmentedIndex.reconstruct_batch, one call per segment
+  select (langchain)     langchain's maximal_marginal_relevance
+  select (numpy)         utils.mmr.mmr_select over the candidate matrix
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from utils.faiss_segments import Segment, SegmentedIndex
+from utils.mmr import mmr_select
+
+
+def _us(fn, repeat) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fetch-k", type=int, default=50)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--segments", type=int, default=4)
+    ap.add_argument("--vectors", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=500)
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    segments = []
+    for i, part in enumerate(np.array_split(np.arange(args.vectors), args.segments)):
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(args.dim))
+        index.add_with_ids(x[part], part)
+        segments.append(Segment(f"seg-{i}", index, int(part[0])))
+    seg = SegmentedIndex(args.dim, segments, next_id=args.vectors)
+
+    query = x[0] + 0.1 * rng.standard_normal(args.dim).astype(np.float32)
+    _, ids = seg.search(query[None, :], args.fetch_k)
+    ids = ids[0]
+    pool = seg.reconstruct_batch(ids)
+    assert mmr_select(query, pool, args.k) == maximal_marginal_relevance(query, list(pool), k=args.k)
+
+    rows = [
+        ("reconstruct (per id)", _us(lambda: [seg.reconstruct(int(i)) for i in ids], args.repeat)),
+        ("reconstruct (batch)", _us(lambda: seg.reconstruct_batch(ids), args.repeat)),
+        ("select (langchain)", _us(lambda: maximal_marginal_relevance(query, list(pool), k=args.k), args.repeat)),
+        ("select (numpy)", _us(lambda: mmr_select(query, pool, args.k), args.repeat)),
+    ]
+    print(f"fetch_k={args.fetch_k}, k={args.k}, dim {args.dim}, {args.segments} segments")
+    print(f"{'step':<24}{'us/query':>10}")
+    for name, us in rows:
+        print(f"{name:<24}{us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
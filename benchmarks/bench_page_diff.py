@@ -0,0 +1,98 @@
+"""
+/compare prompt size with and without the local page diff.
+
+    python benchmarks/bench_page_diff.py --pages 100 --edits 3 --inserts 1
+
+Builds a --pages page reference document (~350 words a page, page-number footers)
+and a revision with --edits edited pages and --inserts inserted pages (which shift
+every later page number), then reports for the full-document prompt and the
+changed-pages prompt:
+
+  prompt tokens   input tokens of the formatted comparison prompt (tiktoken cl100k, else chars/4)
+  output rows     page rows the LLM has to generate (unchanged pages are emitted locally)
+  local ms        time spent aligning and diffing pages before the LLM call
+
+Prompt and output size are what drive LLM latency and cost for this endpoint.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.output_parsers import JsonOutputParser
+from model.models import ChangeFormat
+from prompt.prompt_library import PROMPT_REGISTRY
+from utils.page_diff import UNCHANGED, align_pages, changed_pages_text
+
+WORDS = ("supplier shall deliver goods within days of the purchase order subject to clause refund policy annex "
+         "warranty liability inspection acceptance invoice payment terms notice termination").split()
+
+
+def _tokens():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(enc.encode(text, disallowed_special=()))
+    except Exception:
+        return lambda text: len(text) // 4
+
+
+def _page(rng, i, total):
+    lines = [" ".join(rng.choice(WORDS, 12)) + "." for _ in range(30)]
+    return "\n".join([f"Section {i + 1}"] + lines + [f"Page {i + 1} of {total}"])
+
+
+def _combined(name, pages):
+    # DocumentComparator.read_pdf + combine_documents
+    body = "\n".join(f"\n --- Page {n + 1} --- \n{text}" for n, text in enumerate(pages))
+    return f"Document: {name}\n{body}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=100)
+    ap.add_argument("--edits", type=int, default=3)
+    ap.add_argument("--inserts", type=int, default=1)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    reference = [_page(rng, i, args.pages) for i in range(args.pages)]
+    total = args.pages + args.inserts
+    actual = [text.replace(f"of {args.pages}", f"of {total}") for text in reference]
+    for at in sorted(rng.choice(args.pages, args.inserts, replace=False), reverse=True):
+        actual.insert(int(at), _page(rng, 10_000 + int(at), total))
+    # Renumber footers after the inserts, then edit one line on a few pages
+    actual = [t.rsplit("\n", 1)[0] + f"\nPage {n + 1} of {total}" for n, t in enumerate(actual)]
+    for n in rng.choice(len(actual), args.edits, replace=False):
+        lines = actual[n].split("\n")
+        lines[5] = lines[5].replace("days", "business days") + " Amended."
+        actual[n] = "\n".join(lines)
+
+    count = _tokens()
+    fmt = JsonOutputParser(pydantic_object=ChangeFormat).get_format_instructions()
+    full_prompt = PROMPT_REGISTRY["document_comparison"].format(
+        combined_docs=_combined("reference.pdf", reference) + "\n\n" + _combined("actual.pdf", actual),
+        format_instruction=fmt,
+    )
+
+    start = time.perf_counter()
+    pairs = align_pages(reference, actual)
+    changed = changed_pages_text(pairs, reference, actual)
+    local_ms = (time.perf_counter() - start) * 1000
+    diff_prompt = PROMPT_REGISTRY["document_comparison_diff"].format(changed_pages=changed, format_instruction=fmt)
+    sent = sum(p.status != UNCHANGED for p in pairs)
+
+    full_tokens, diff_tokens = count(full_prompt), count(diff_prompt)
+    print(f"{args.pages} pages, {args.edits} edited, {args.inserts} inserted -> {sent} pages sent to the LLM")
+    print(f"{'prompt':<14}{'prompt tokens':>15}{'output rows':>13}{'local ms':>10}")
+    print(f"{'full':<14}{full_tokens:>15}{len(pairs):>13}{0:>10.1f}")
+    print(f"{'page diff':<14}{diff_tokens:>15}{sent:>13}{local_ms:>10.1f}")
+    print(f"prompt tokens -{1 - diff_tokens / full_tokens:.1%}, output rows -{1 - sent / len(pairs):.1%}")
+
+
+if __name__ == "__main__":
+    main()
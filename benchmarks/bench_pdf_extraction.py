@@ -0,0 +1,77 @@
+"""
+PDF text extraction speedup against worker (core) count.
+
+    python benchmarks/bench_pdf_extraction.py --pages 2000 --workers 1 2 4 8
+
+Writes a --pages page PDF (or uses --pdf) and times utils.pdf_text.extract_page_texts
+with a process pool of each --workers size. 1 worker is the sequential path /analyze
+and /compare used before. Pool start-up is excluded (the API's pool is long-lived);
+speedup is bounded by the cores actually available (os.cpu_count()).
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.pdf_text import extract_page_texts
+
+LOREM = ("Section {p}.{i}: the supplier shall deliver goods within thirty days of the purchase order, "
+         "subject to clause {i} and the refund policy in annex B. ")
+
+
+def _write_pdf(path: str, pages: int):
+    with fitz.open() as doc:
+        for p in range(pages):
+            page = doc.new_page()
+            text = "\n".join(LOREM.format(p=p, i=i) for i in range(40))
+            page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=7)
+        doc.save(path)
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf")
+    ap.add_argument("--pages", type=int, default=2000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf or os.path.join(tmp, "bench.pdf")
+        if not args.pdf:
+            _write_pdf(path, args.pages)
+        with fitz.open(path) as doc:
+            pages = doc.page_count
+
+        baseline = None
+        print(f"{pages} pages, {os.cpu_count()} cores available")
+        print(f"{'workers':<10}{'seconds':>10}{'pages/s':>10}{'speedup':>10}")
+        for workers in args.workers:
+            if workers == 1:
+                secs = _best_of(lambda: extract_page_texts(path, max_workers=1), args.repeat)
+            else:
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    list(pool.map(abs, range(workers)))  # start every worker before timing
+                    secs = _best_of(lambda: extract_page_texts(path, max_workers=workers, pool=pool), args.repeat)
+            baseline = baseline or secs
+            print(f"{workers:<10}{secs:>10.2f}{pages / secs:>10.0f}{baseline / secs:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
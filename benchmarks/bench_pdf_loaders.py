@@ -0,0 +1,52 @@
+"""
+Chat-ingestion PDF parsers compared: every registered "pdf" loader on the same file.
+
+    python benchmarks/bench_pdf_loaders.py --pages 300 --repeat 3
+
+Writes a --pages page text PDF (or uses --pdf) and reports, per loader in
+utils.document_loaders, the best wall time over --repeat runs, pages/s and the
+speedup over pypdf (the PyPDFLoader chat ingestion used before the registry).
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_pdf_extraction import _write_pdf
+from utils.document_loaders import LOADERS
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf")
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.pdf or os.path.join(tmp, "bench.pdf"))
+        if not args.pdf:
+            _write_pdf(str(path), args.pages)
+
+        results = {}
+        for name, loader in LOADERS["pdf"].items():
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                docs = loader(path)
+                best = min(best, time.perf_counter() - start)
+            results[name] = (best, len(docs), sum(len(d.page_content) for d in docs))
+
+    baseline = results["pypdf"][0]
+    print(f"{path.name}: {results['pypdf'][1]} pages")
+    print(f"{'loader':<10}{'seconds':>10}{'pages/s':>10}{'chars':>12}{'speedup':>10}")
+    for name, (secs, pages, chars) in results.items():
+        print(f"{name:<10}{secs:>10.2f}{pages / secs:>10.0f}{chars:>12}{baseline / secs:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
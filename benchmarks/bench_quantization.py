@@ -0,0 +1,83 @@
+"""
+Memory and recall of quantized flat segments with full-precision rescoring.
+
+    python benchmarks/bench_quantization.py --vectors 20000 --dim 1536 --queries 200 --factors 1 4 10
+
+Writes the same --vectors clustered, unit-length vectors (text-embedding-3-small sized by
+default) as one segment per faiss_db.quantization type and reports, per type and
+rescore factor:
+
+  resident MiB   bytes loaded into memory (the codes; float32 rows stay mapped on disk)
+  disk MiB       codes plus the full-precision sidecar
+  recall@k       overlap with exact float32 search
+  ms/query       single-threaded search including rescoring
+
+"none" is today's float32 flat segment; its factor column is not applicable.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.faiss_segments import SegmentedIndex, full_vectors_path, read_manifest, segments_dir
+from utils.faiss_store import index_settings, read_index, segment_builder
+
+
+def _corpus(rng, n, dim, clusters=200):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vectors", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--factors", type=int, nargs="+", default=[1, 4, 10])
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    rng = np.random.default_rng(0)
+    x = _corpus(rng, args.vectors, args.dim)
+    queries = x[rng.integers(0, args.vectors, args.queries)] + 0.02 * rng.standard_normal((args.queries, args.dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(x)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{args.vectors} vectors, dim {args.dim}, k={args.k}")
+    print(f"{'type':<8}{'factor':>8}{'resident MiB':>14}{'disk MiB':>10}{'recall@k':>10}{'ms/query':>10}")
+    for kind in ("none", "fp16", "sq8", "binary"):
+        with tempfile.TemporaryDirectory() as tmp:
+            seg = SegmentedIndex(args.dim)
+            seg.add(x)
+            build = segment_builder(index_settings({"type": "flat"}), {"type": kind, "rescore_factor": 1})
+            seg.flush(tmp, build=build)
+            entry = read_manifest(tmp)["segments"][0]
+            codes = segments_dir(tmp) / entry["name"]
+            full = full_vectors_path(segments_dir(tmp), entry["name"])
+            resident = os.path.getsize(codes)
+            disk = resident + (os.path.getsize(full) if full.exists() else 0)
+
+            loaded = SegmentedIndex.load(tmp, "index", lambda p: read_index(Path(p), mmap=True))
+            for factor in (args.factors if kind != "none" else [1]):
+                loaded.rescore_factor = factor
+                start = time.perf_counter()
+                _, ids = loaded.search(queries, args.k)
+                ms = (time.perf_counter() - start) / args.queries * 1000
+                recall = np.mean([len(np.intersect1d(a, b)) / args.k for a, b in zip(ids, truth)])
+                label = str(factor) if kind != "none" else "-"
+                print(f"{kind:<8}{label:>8}{resident / 2**20:>14.1f}{disk / 2**20:>10.1f}{recall:>10.3f}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
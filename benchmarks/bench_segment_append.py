@@ -0,0 +1,77 @@
+"""
+Cost of persisting a small append to a large session: full rewrite vs. segments.
+
+    python benchmarks/bench_segment_append.py --chunks 50000 --append 20
+
+Builds a session index of --chunks vectors, then appends --append chunks (about
+one page) through FAISSManager-style load -> add -> save, once with the
+single-file layout and once with segments, and reports the save time and the
+bytes written.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from utils import faiss_store
+from utils.faiss_store import load_faiss, save_faiss
+
+DIM = 1536  # text-embedding-3-small
+
+
+def _bytes_written() -> int:
+    # wchar: bytes this process passed to write(), index files and sqlite pages alike
+    with open("/proc/self/io") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("wchar"))
+
+
+def run(n: int, n_append: int, segments: bool):
+    settings = {"enabled": segments, "max_segments": 8}
+    with mock.patch.object(faiss_store, "segment_settings", lambda: settings), tempfile.TemporaryDirectory() as tmp:
+        emb = DeterministicFakeEmbedding(size=DIM)
+        rng = np.random.default_rng(0)
+        import faiss
+        index = faiss.IndexFlatL2(DIM)
+        index.add(rng.standard_normal((n, DIM), dtype=np.float32))
+        ids = [f"c{i}" for i in range(n)]
+        docstore = InMemoryDocstore({i: Document(page_content="lorem ipsum " * 80) for i in ids})
+        save_faiss(FAISS(emb, index, docstore, dict(enumerate(ids))), tmp)
+
+        vs = load_faiss(tmp, emb, mmap=True, for_write=True)
+        texts = [f"new chunk {i} " + "dolor sit amet " * 60 for i in range(n_append)]
+        vectors = rng.standard_normal((n_append, DIM), dtype=np.float32).tolist()
+        before = _bytes_written()
+        start = time.perf_counter()
+        vs.add_embeddings(list(zip(texts, vectors)))
+        save_faiss(vs, tmp)
+        elapsed = time.perf_counter() - start
+        return elapsed, _bytes_written() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--append", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Session of {args.chunks} chunks x {DIM} dims, appending {args.append} chunks\n")
+    print(f"{'layout':>12} | {'save ms':>8} | {'MB written':>10}")
+    print("-" * 38)
+    for label, segments in (("single file", False), ("segments", True)):
+        elapsed, written = run(args.chunks, args.append, segments)
+        print(f"{label:>12} | {elapsed * 1000:>8.1f} | {written / 2**20:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
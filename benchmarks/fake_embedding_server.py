@@ -0,0 +1,87 @@
+"""
+Minimal OpenAI-compatible /v1/embeddings server for benchmarks.
+
+Each request sleeps `latency` seconds (simulated round trip) and, when `max_requests` is
+set, answers 429 with Retry-After once that many requests arrived within `window` seconds.
+Vectors are deterministic per input text.
+"""
+import json
+import time
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def _vector(text: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class FakeEmbeddingServer:
+    def __init__(self, latency: float = 0.05, dim: int = 256, max_requests: int = 0, window: float = 60.0):
+        self.latency = latency
+        self.dim = dim
+        self.max_requests = max_requests
+        self.window = window
+        self.requests = 0
+        self.rejected = 0
+        self._window: list = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if not server._admit():
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0.2")
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(b'{"error": {"message": "rate limited", "type": "rate_limit"}}')
+                    return
+                time.sleep(server.latency)
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                data = []
+                for i, text in enumerate(inputs):
+                    vec = _vector(str(text), server.dim)
+                    emb = (base64.b64encode(vec.tobytes()).decode()
+                           if body.get("encoding_format") == "base64" else vec.tolist())
+                    data.append({"object": "embedding", "index": i, "embedding": emb})
+                payload = json.dumps({"object": "list", "data": data, "model": body.get("model"),
+                                      "usage": {"prompt_tokens": 0, "total_tokens": 0}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def _admit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if not self.max_requests:
+                return True
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < self.window]
+            if len(self._window) >= self.max_requests:
+                self.rejected += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
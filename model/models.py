@@ -24,5 +24,6 @@ class SummaryResponse(RootModel[list[ChangeFormat]]):
 class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis"
     DOCUMENT_COMPARISON = "document_comparison"
+    DOCUMENT_COMPARISON_DIFF = "document_comparison_diff"
     CONTEXTUALIZE_QUESTION = "contextualize_question"
     CONTEXT_QA = "context_qa"
\ No newline at end of file
@@ -31,6 +31,26 @@ Your response should follow this format:
 {format_instruction}
 """)
 
+# Prompt for the pages a local page-by-page diff found changed (unchanged pages never reach the LLM)
+document_comparison_diff_prompt = ChatPromptTemplate.from_template("""
+You will be provided with the pages that differ between a reference PDF and an actual PDF.
+Each section is headed with its page number ("reference -> actual" when the numbering shifted)
+and whether the page was changed, added or removed. Changed pages are given as line diffs:
+lines starting with '-' are only in the reference, lines starting with '+' only in the actual
+document, other lines are unchanged context.
+
+1. Describe the substantive change on every page listed, using the page label from its heading
+2. Return exactly one entry per listed page
+
+Changed pages:
+
+{changed_pages}
+
+Your response should follow this format:
+
+{format_instruction}
+""")
+
 contextualize_question_prompt = ChatPromptTemplate.from_messages([
     ("system", (
         "Given a conversation history and the most recent user query, rewrite the query as a standalone question "
@@ -56,6 +76,7 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
     "document_comparison": document_comparison_prompt,
+    "document_comparison_diff": document_comparison_diff_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
 }
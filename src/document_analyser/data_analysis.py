@@ -1,5 +1,5 @@
 import sys
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
 from custom_logging import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 from model.models import Metadata
@@ -16,8 +16,7 @@ class DocumentAnalyzer:
         
 
         try:
-            self.loader = ModelLoader()
-            self.llm = self.loader.load_llm()
+            self.llm = MODEL_REGISTRY.load_llm()
 
             # Parsers
             self.parser = JsonOutputParser(pydantic_object=Metadata)
@@ -49,4 +48,22 @@ class DocumentAnalyzer:
         
         except Exception as e:
             log.error(f"Error analyzing document: {e}")
-            raise DocumentPortalException(f"Error analyzing document: {e}", sys)
\ No newline at end of file
+            raise DocumentPortalException(f"Error analyzing document: {e}", sys)
+
+    async def aanalyze_document(self, document_text: str) -> dict:
+        """Async variant of analyze_document; the LLM call does not block the event loop."""
+        try:
+            chain = self.prompt | self.llm | self.fixing_parser
+            log.info("LLM powered document analysis started (async)")
+
+            response = await chain.ainvoke({
+                "format_instructions": self.parser.get_format_instructions(),
+                "document": document_text
+            })
+            log.info("Document analysis completed successfully", keys = list(response.keys()))
+
+            return response
+
+        except Exception as e:
+            log.error(f"Error analyzing document: {e}")
+            raise DocumentPortalException(f"Error analyzing document: {e}", sys)
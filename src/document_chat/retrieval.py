@@ -1,14 +1,20 @@
 import sys
 import os
+import time
+import asyncio
 from operator import itemgetter
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
+from langchain_core.vectorstores import VectorStoreRetriever
 
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.faiss_store import similarity_search_batch
+from utils.concurrency import run_blocking
+from utils.config_loader import load_config
 from exception.custom_exception import DocumentPortalException
 #from logger import GLOBAL_LOGGER as log
 from custom_logging import GLOBAL_LOGGER as log
@@ -16,6 +22,15 @@ from prompt.prompt_library import PROMPT_REGISTRY
 from model.models import PromptType
 
 
+def batch_query_settings() -> Dict[str, Any]:
+    """batch_query from config: questions accepted per request and generations in flight."""
+    cfg = load_config().get("batch_query", {}) or {}
+    return {
+        "max_questions": int(cfg.get("max_questions", 500)),
+        "max_concurrency": int(cfg.get("max_concurrency", 8)),
+    }
+
+
 class ConversationalRAG:
     """
     LCEL-based Conversational RAG with lazy retriever initialization.
@@ -24,6 +39,13 @@ class ConversationalRAG:
         rag = ConversationalRAG(session_id="abc")
         rag.load_retriever_from_faiss(index_path="faiss_index/abc", k=5, index_name="index")
         answer = rag.invoke("What is ...?", chat_history=[])
+
+        # or stream tokens as they are generated
+        async for event in rag.astream("What is ...?", chat_history=[]):
+            ...
+
+        # or answer many standalone questions at once
+        result = await rag.abatch(["What is ...?", "Who ...?"], max_concurrency=8)
     """
 
     def __init__(self, session_id: Optional[str], retriever=None):
@@ -42,6 +64,8 @@ class ConversationalRAG:
             # Lazy pieces
             self.retriever = retriever
             self.chain = None
+            self.question_rewriter = None
+            self.answer_chain = None
             if self.retriever is not None:
                 self._build_lcel_chain()
 
@@ -59,27 +83,33 @@ class ConversationalRAG:
         index_name: str = "index",
         search_type: str = "similarity",
         search_kwargs: Optional[Dict[str, Any]] = None,
+        sessions: Optional[List[str]] = None,
     ):
         """
-        Load FAISS vectorstore from disk and build retriever + LCEL chain.
+        Load FAISS vectorstore (via the process-wide cache) and build retriever + LCEL chain.
+
+        sessions restricts retrieval to those sessions' chunks when index_path is a
+        tenant's shared index (global index mode); None searches the whole index.
+        search_type="hybrid" adds BM25 over the ingestion-time lexical index, fused
+        with the vector hits (exact identifiers such as clause numbers or part codes).
         """
         try:
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
 
-            embeddings = ModelLoader().load_embeddings()
-            vectorstore = FAISS.load_local(
-                index_path,
-                embeddings,
-                index_name=index_name,
-                allow_dangerous_deserialization=True,  # ok if you trust the index
-            )
+            embeddings = MODEL_REGISTRY.load_embeddings()
 
             if search_kwargs is None:
                 search_kwargs = {"k": k}
 
-            self.retriever = vectorstore.as_retriever(
-                search_type=search_type, search_kwargs=search_kwargs
+            # Warm path: no disk read while the on-disk index version is unchanged
+            self.retriever = VECTORSTORE_CACHE.get_retriever(
+                index_path,
+                embeddings,
+                index_name=index_name,
+                search_type=search_type,
+                search_kwargs=search_kwargs,
+                sessions=sessions,
             )
             self._build_lcel_chain()
 
@@ -88,6 +118,7 @@ class ConversationalRAG:
                 index_path=index_path,
                 index_name=index_name,
                 k=k,
+                search_type=search_type,
                 session_id=self.session_id,
             )
             return self.retriever
@@ -122,11 +153,162 @@ class ConversationalRAG:
             log.error("Failed to invoke ConversationalRAG", error=str(e))
             raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
 
+    async def ainvoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Invoke the LCEL pipeline without blocking the event loop."""
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before ainvoke().", sys
+                )
+            chat_history = chat_history or []
+            payload = {"input": user_input, "chat_history": chat_history}
+            answer = await self.chain.ainvoke(payload)
+            if not answer:
+                log.warning(
+                    "No answer generated", user_input=user_input, session_id=self.session_id
+                )
+                return "no answer generated."
+            log.info(
+                "Chain invoked successfully (async)",
+                session_id=self.session_id,
+                user_input=user_input,
+                answer_preview=str(answer)[:150],
+            )
+            return answer
+        except Exception as e:
+            log.error("Failed to invoke ConversationalRAG (async)", error=str(e))
+            raise DocumentPortalException("Invocation error in ConversationalRAG", sys)
+
+    async def astream(
+        self, user_input: str, chat_history: Optional[List[BaseMessage]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the answer token by token.
+
+        Yields {"event": "token", "data": str} per generated chunk, then one
+        {"event": "end", "sources": [...], "timings": {...}} with the retrieved
+        chunks' metadata and per-stage timings in milliseconds.
+        """
+        try:
+            if self.chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before astream().", sys
+                )
+            chat_history = chat_history or []
+            payload = {"input": user_input, "chat_history": chat_history}
+            timings: Dict[str, float] = {}
+            start = time.perf_counter()
+
+            # Same stages as self.chain, run one by one so tokens and sources can be surfaced
+            standalone = await self.question_rewriter.ainvoke(payload)
+            timings["rewrite_ms"] = (time.perf_counter() - start) * 1000
+
+            t = time.perf_counter()
+            docs = await self.retriever.ainvoke(standalone)
+            timings["retrieve_ms"] = (time.perf_counter() - t) * 1000
+
+            t = time.perf_counter()
+            answer_len = 0
+            async for token in self.answer_chain.astream({**payload, "context": self._format_docs(docs)}):
+                if "ttft_ms" not in timings:
+                    timings["ttft_ms"] = (time.perf_counter() - start) * 1000
+                answer_len += len(token)
+                yield {"event": "token", "data": token}
+            timings["generate_ms"] = (time.perf_counter() - t) * 1000
+            timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+            log.info(
+                "Chain streamed successfully",
+                session_id=self.session_id,
+                user_input=user_input,
+                answer_chars=answer_len,
+                **timings,
+            )
+            yield {
+                "event": "end",
+                "sources": [getattr(d, "metadata", {}) for d in docs],
+                "timings": {k: round(v, 2) for k, v in timings.items()},
+            }
+        except Exception as e:
+            log.error("Failed to stream ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Streaming error in ConversationalRAG", sys)
+
+    async def abatch(self, questions: List[str], max_concurrency: int = 8) -> Dict[str, Any]:
+        """
+        Answer many standalone questions (no chat history, so no rewrite step).
+
+        Similarity retrieval embeds every question in one embedding call and runs one
+        matrix search; other search types retrieve concurrently. Generations run with
+        at most max_concurrency in flight. Returns {"results": [...], "timings": {...}}
+        with, per question, its answer (or error), sources and generate_ms.
+        """
+        try:
+            if self.answer_chain is None:
+                raise DocumentPortalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before abatch().", sys
+                )
+            start = time.perf_counter()
+            docs_per_question = await self._aretrieve_batch(questions, max_concurrency)
+            retrieve_ms = (time.perf_counter() - start) * 1000
+
+            limit = asyncio.Semaphore(max(1, max_concurrency))
+
+            async def answer(question: str, docs) -> Dict[str, Any]:
+                async with limit:
+                    t = time.perf_counter()
+                    result: Dict[str, Any] = {"question": question}
+                    try:
+                        result["answer"] = await self.answer_chain.ainvoke(
+                            {"input": question, "chat_history": [], "context": self._format_docs(docs)}
+                        )
+                    except Exception as e:
+                        # One failed generation should not sink the rest of the batch
+                        log.error("Batch question failed", session_id=self.session_id, error=str(e))
+                        result["error"] = str(e)
+                    result["sources"] = [getattr(d, "metadata", {}) for d in docs]
+                    result["timings"] = {"generate_ms": round((time.perf_counter() - t) * 1000, 2)}
+                    return result
+
+            t = time.perf_counter()
+            results = await asyncio.gather(*(answer(q, d) for q, d in zip(questions, docs_per_question)))
+            timings = {
+                "retrieve_ms": round(retrieve_ms, 2),
+                "generate_ms": round((time.perf_counter() - t) * 1000, 2),
+                "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+            log.info(
+                "Batch answered",
+                session_id=self.session_id,
+                questions=len(questions),
+                failed=sum("error" in r for r in results),
+                **timings,
+            )
+            return {"results": results, "timings": timings}
+        except Exception as e:
+            log.error("Failed to answer batch in ConversationalRAG", error=str(e))
+            raise DocumentPortalException("Batch error in ConversationalRAG", sys)
+
     # ---------- Internals ----------
 
+    async def _aretrieve_batch(self, questions: List[str], max_concurrency: int) -> List[List[Any]]:
+        retriever = self.retriever
+        if isinstance(retriever, VectorStoreRetriever) and retriever.search_type == "similarity":
+            vs = retriever.vectorstore
+            k = int(retriever.search_kwargs.get("k", 4))
+
+            # Questions are queries: keep them out of the chunk embedding cache
+            embed = getattr(vs.embedding_function, "embed_queries", vs.embedding_function.embed_documents)
+
+            def search():
+                vectors = embed(questions)
+                return similarity_search_batch(vs, vectors, k)
+
+            return await run_blocking(search)
+        return await retriever.abatch(questions, config={"max_concurrency": max(1, max_concurrency)})
+
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.load_llm()
             if not llm:
                 raise ValueError("LLM could not be loaded")
             log.info("LLM loaded successfully", session_id=self.session_id)
@@ -145,7 +327,7 @@ class ConversationalRAG:
                 raise DocumentPortalException("No retriever set before building chain", sys)
 
             # 1) Rewrite user question with chat history context
-            question_rewriter = (
+            self.question_rewriter = (
                 {"input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
                 | self.llm
@@ -153,18 +335,17 @@ class ConversationalRAG:
             )
 
             # 2) Retrieve docs for rewritten question
-            retrieve_docs = question_rewriter | self.retriever | self._format_docs
+            retrieve_docs = self.question_rewriter | self.retriever | self._format_docs
 
             # 3) Answer using retrieved context + original input + chat history
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser()
             self.chain = (
                 {
                     "context": retrieve_docs,
                     "input": itemgetter("input"),
                     "chat_history": itemgetter("chat_history"),
                 }
-                | self.qa_prompt
-                | self.llm
-                | StrOutputParser()
+                | self.answer_chain
             )
 
             log.info("LCEL graph built successfully", session_id=self.session_id)
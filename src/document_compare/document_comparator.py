@@ -1,5 +1,7 @@
+import re
 import sys
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Sequence, Tuple
+
 import pandas as pd
 from custom_logging import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
@@ -7,22 +9,25 @@ from model.models import ChangeFormat
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
 from prompt.prompt_library import PROMPT_REGISTRY
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from utils.page_diff import UNCHANGED, align_pages, changed_pages_text, page_diff_settings
+
+def _page_key(label: Any) -> str:
+    # The LLM may echo "Page 4 -> 5" for the heading's "4 -> 5"
+    return re.sub(r"^page\s*", "", str(label).strip(), flags=re.IGNORECASE)
+
 
 class DocumentComparator:
     """Compares two documents using LLMs and provides a detailed comparison."""
 
     def __init__(self):
-        load_dotenv()
-        
-
         try:
-            self.loader = ModelLoader()
-            self.llm = self.loader.load_llm()
+            self.llm = MODEL_REGISTRY.load_llm()
             self.parser = JsonOutputParser(pydantic_object=ChangeFormat)
             self.fixing_parser = OutputFixingParser.from_llm(self.llm, self.parser)
             self.prompt = PROMPT_REGISTRY["document_comparison"]    
             self.chain = self.prompt | self.llm | self.parser
+            self.diff_chain = PROMPT_REGISTRY["document_comparison_diff"] | self.llm | self.parser
 
             log.info("DocumentComparator initialized successfully")
 
@@ -46,8 +51,63 @@ class DocumentComparator:
         except Exception as e:
             log.error(f"Error comparing documents: {e}")
             raise DocumentPortalException(f"Error comparing documents: {e}", sys)
+
+    async def acompare_documents(self, combined_docs: str) -> pd.DataFrame:
+        """Async variant of compare_documents; the LLM call does not block the event loop."""
+        try:
+            inputs = {
+                "combined_docs": combined_docs,
+                "format_instruction": self.parser.get_format_instructions()
+            }
+
+            log.info("LLM powered document comparison started (async)")
+            response = await self.chain.ainvoke(inputs)
+            log.info("Document comparison completed successfully")
+            return self._format_response(response)
+
+        except Exception as e:
+            log.error(f"Error comparing documents: {e}")
+            raise DocumentPortalException(f"Error comparing documents: {e}", sys)
         
 
+    async def acompare_pages(self, reference: Sequence[str], actual: Sequence[str]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Page-aware comparison: pages are aligned and diffed locally, unchanged pages
+        become "NO CHANGE" rows without an LLM call, and only changed, added or removed
+        pages (as line diffs) are sent to the LLM. Returns the rows in page order and
+        counts of pages matched locally and sent.
+        """
+        try:
+            settings = page_diff_settings()
+            pairs = align_pages(reference, actual, settings["min_similarity"])
+            changed = [p for p in pairs if p.status != UNCHANGED]
+            stats = {"pages_unchanged": len(pairs) - len(changed), "pages_sent": len(changed), "prompt_chars": 0}
+
+            described: Dict[str, str] = {}
+            if changed:
+                changed_pages = changed_pages_text(pairs, reference, actual, settings["context_lines"],
+                                                   settings["max_diff_chars"])
+                stats["prompt_chars"] = len(changed_pages)
+                log.info("LLM powered document comparison started (changed pages only)", **stats)
+                response = await self.diff_chain.ainvoke({
+                    "changed_pages": changed_pages,
+                    "format_instruction": self.parser.get_format_instructions(),
+                })
+                described = {_page_key(row.get("Page", "")): str(row.get("Changes", "")) for row in response or []}
+
+            rows: List[Dict[str, str]] = []
+            for pair in pairs:
+                if pair.status == UNCHANGED:
+                    rows.append({"Page": pair.label, "Changes": "NO CHANGE"})
+                else:
+                    rows.append({"Page": pair.label, "Changes": described.get(_page_key(pair.label)) or f"Page {pair.status}"})
+            log.info("Document comparison completed successfully", **stats)
+            return self._format_response(rows), stats
+
+        except Exception as e:
+            log.error(f"Error comparing documents: {e}")
+            raise DocumentPortalException(f"Error comparing documents: {e}", sys)
+
     def _format_response(self, response_parsed: list[dict]) -> pd.DataFrame:
         try:
             print("################", response_parsed)
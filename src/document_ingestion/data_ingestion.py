@@ -8,99 +8,289 @@ import shutil
 import hashlib
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Optional, Iterable, List, Optional, Any, Dict
+from typing import Optional, Iterable, List, Optional, Any, Dict, Callable
 
 
 
-import fitz
+import numpy as np
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain_community.vectorstores import FAISS
-
-from utils.model_loader import ModelLoader
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from utils.model_loader import ModelLoader, ModelRegistry, MODEL_REGISTRY
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.faiss_store import (
+    SqliteDocstore, index_exists, index_writer_lock, load_faiss, mmap_enabled, new_index, promote_index, save_faiss,
+    scoped_vectorstore, source_key, sync_tombstones, tombstone_positions, tombstone_sources,
+)
+from utils.faiss_segments import SegmentedIndex, manifest_path, read_manifest
+from utils.global_index import global_index_settings, is_valid_tag, tenant_index_dir
+from utils.lexical_index import add_lexical_batch, lexical_settings
 from custom_logging import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 
-from utils.file_io import save_uploaded_files, generate_session_id
-from utils.document_ops import load_documents, concat_for_analysis
+from utils.file_io import generate_session_id, copy_upload, UploadBudget, UploadTooLarge
+from utils.blob_store import BlobStore, UnknownBlobs
+from utils.document_ops import concat_for_analysis, document_batch_settings, iter_batches, iter_documents
+from utils.document_loaders import pdf_page_texts
 
 SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt'}
 
 
 ## FAISS Manager to handle vector store operations 
 class FAISSManager:
-    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
+    """
+    Writer for one FAISS index directory.
+
+    session_id scopes deletes and listings to one session's chunks; it is set when
+    the directory is a tenant's shared index (global index mode).
+    """
+    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader | ModelRegistry] = None,
+                 session_id: Optional[str] = None):
         self.index_dir = Path(index_dir)
+        self.session_id = session_id
         self.index_dir.mkdir(parents=True, exist_ok=True)
 
-        self.meta_path = self.index_dir / "ingested_meta.json"
-        self._meta : Dict[str, Any] = {"rows": {}}
+        # Ingestion logs of older versions, imported into the docstore's log table on load
+        self.meta_path = self.index_dir / "ingested_meta.jsonl"
+        self.legacy_meta_path = self.index_dir / "ingested_meta.json"
 
-
-        if self.meta_path.exists():
-            try:
-                self._meta = json.loads(self.meta_path.read_text(encoding="utf-8")) or {"rows": {}}
-            except Exception:
-                self._meta = {"rows": {}}
-
-        self.model_loader = model_loader or ModelLoader()
+        self.model_loader = model_loader or MODEL_REGISTRY
         self.embedder = self.model_loader.load_embeddings()
         self.vs: Optional[FAISS] = None
 
     def _exists(self) -> bool:
-        return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
+        return index_exists(self.index_dir)
 
     @staticmethod
-    def _fingerprint(text: str, md:Dict[str, Any]) -> str:
-        src = md.get("source")  or md.get("file_name")
-        rid = md.get("row_id") 
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()  
-        
-
-    def _save_metadata(self):
-        self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    def chunk_id(text: str, md: Dict[str, Any]) -> str:
+        """
+        Stable content-based chunk ID: the source file's identity, the page and the chunk
+        text, plus the session for chunks in a shared tenant index (sessions that upload
+        the same file each own their copy).
+        """
+        doc_key = md.get("file_sha256") or md.get("source") or md.get("file_name") or ""
+        page = md.get("page", md.get("row_id", ""))
+        key = f"{doc_key}\x00{page}\x00{text}"
+        if md.get("session_id"):
+            key = f"{md['session_id']}\x00{key}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _log_batch(self, ids: List[str]):
+        self.vs.docstore.log_ingested(ids, datetime.now(timezone.utc).isoformat())
+
+    def _logged_among(self, candidates: Iterable[str]) -> set:
+        """The candidate chunk IDs ever recorded as ingested (keyed lookups in the docstore's log table)."""
+        if self.vs is None or not isinstance(self.vs.docstore, SqliteDocstore):
+            return set()
+        return self.vs.docstore.logged(candidates)
+
+    def _import_log_files(self):
+        """
+        Move the JSONL log (and the JSON file before it) into the docstore's log table,
+        once; the files are removed afterwards. Caller holds the writer lock.
+        """
+        store = self.vs.docstore
+        if self.legacy_meta_path.exists():
+            try:
+                rows = (json.loads(self.legacy_meta_path.read_text(encoding="utf-8")) or {}).get("rows", {})
+                store.log_ingested(rows, datetime.now(timezone.utc).isoformat())
+            except Exception as e:
+                log.warning("Unreadable legacy ingestion log skipped", path=str(self.legacy_meta_path), error=str(e))
+            self.legacy_meta_path.unlink()
+        if self.meta_path.exists():
+            with open(self.meta_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        store.log_ingested(entry["chunk_ids"], entry.get("at") or "")
+                    except (ValueError, KeyError):
+                        continue  # torn last line after a crash
+            self.meta_path.unlink()
+            log.info("Ingestion log imported into docstore", index=str(self.index_dir))
+
+    def _known_ids(self, candidates: Iterable[str]) -> set:
+        # Docstore IDs are chunk IDs for everything ingested through ingest()
+        if self.vs is None:
+            return set()
+        if isinstance(self.vs.docstore, SqliteDocstore):
+            return self.vs.docstore.existing(candidates)  # keyed lookups, not a full scan
+        return set(self.vs.index_to_docstore_id.values())
+
+    def ingest(self, docs: List[Document]) -> Dict[str, int]:
+        """
+        Embed and index every chunk not yet in the index, each exactly once.
+
+        Returns counts of chunks added, skipped (already indexed or duplicated in
+        this batch) and re-embedded (recorded in the ingestion log but missing
+        from the index, e.g. after an interrupted write).
+
+        Persisting costs what was added: one new index segment, new docstore rows,
+        one lexical (BM25) segment and the batch's ingestion log rows. Embedding runs
+        outside the index's writer lock, so concurrent ingests into a shared tenant
+        index only serialise the write.
+        """
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        ids_by_doc = [self.chunk_id(d.page_content, d.metadata or {}) for d in docs]
+        known = self._known_ids(set(ids_by_doc))
+
+        new: Dict[str, Document] = {}
+        skipped = 0
+        for cid, d in zip(ids_by_doc, docs):
+            if cid in known or cid in new:
+                skipped += 1
+                continue
+            new[cid] = d
+        reembedded = len(self._logged_among(new.keys()))
+
+        if new:
+            vectors = dict(zip(new.keys(), self.embedder.embed_documents([d.page_content for d in new.values()])))
+
+            with index_writer_lock(self.index_dir):
+                self._refresh()
+                # Another writer may have indexed some of these while we were embedding
+                raced = self._known_ids(new.keys())
+                skipped += len(raced)
+                new = {cid: d for cid, d in new.items() if cid not in raced}
+                if new:
+                    ids = list(new.keys())
+                    texts = [d.page_content for d in new.values()]
+                    metadatas = [{**(d.metadata or {}), "chunk_id": cid} for cid, d in new.items()]
+                    text_embeddings = [(t, vectors[cid]) for t, cid in zip(texts, ids)]
+
+                    if self.vs is None:
+                        # Index type comes from faiss_db.index; small sessions stay Flat
+                        matrix = np.asarray([v for _, v in text_embeddings], dtype=np.float32)
+                        self.vs = FAISS(self.embedder, new_index(matrix.shape[1], matrix), InMemoryDocstore(), {})
+                    start = len(self.vs.index_to_docstore_id)  # positions add_embeddings assigns
+                    self.vs.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                    promote_index(self.vs)
+                    save_faiss(self.vs, self.index_dir)
+                    self._index_lexical(texts, range(start, start + len(texts)))
+
+                    self._log_batch(ids)
+                    VECTORSTORE_CACHE.invalidate(self.index_dir)
+
+        stats = {"added": len(new), "skipped": skipped, "reembedded": reembedded}
+        log.info("FAISS ingest completed", index=str(self.index_dir), **stats)
+        return stats
     
+    def _index_lexical(self, texts: List[str], positions: Iterable[int]):
+        settings = lexical_settings()
+        if not settings["enabled"]:
+            return
+        store = self.vs.docstore
+        add_lexical_batch(
+            self.index_dir, texts, list(positions), max_segments=settings["max_segments"],
+            live=store.live_positions if isinstance(store, SqliteDocstore) else None,
+        )
+
+    def delete_sources(self, sources: Iterable[str]) -> Dict[str, int]:
+        """
+        Remove every chunk of the given source documents (file names as uploaded).
+
+        Deleted vectors are tombstoned and hidden from search at once; they are
+        physically purged later by segment compaction. Returns chunk counts.
+        """
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        sources = sorted(set(sources))
+        if self.vs is None or not sources:
+            return {"chunks_deleted": 0, "tombstones": 0}
+        with index_writer_lock(self.index_dir):
+            self._refresh()
+            stats = tombstone_sources(self.vs, self.index_dir, sources, session=self.session_id)
+        VECTORSTORE_CACHE.invalidate(self.index_dir)
+        return stats
+
+    def replace_sources(self, docs: List[Document]) -> Dict[str, int]:
+        """
+        Swap in new versions of documents: docs are ingested first, then the old chunks
+        of every source present in docs are deleted, so a failed ingest leaves the old
+        versions in place. Chunk IDs include the file's SHA-256, so an uploaded revision
+        re-indexes the whole document (unchanged chunk text is served from the embedding
+        cache); only chunks whose ID is unchanged, e.g. documents keyed by name alone,
+        are kept in place.
+        """
+        sources = {source_key(d.metadata or {}) for d in docs} - {None}
+        old = self.chunk_positions(sources)
+        stats = self.ingest(docs)
+        kept = {self.chunk_id(d.page_content, d.metadata or {}) for d in docs}
+        stats["replaced"] = self.delete_positions([pos for pos, cid in old.items() if cid not in kept])["chunks_deleted"]
+        return stats
+
+    def chunk_positions(self, sources: Iterable[str]) -> Dict[int, str]:
+        """Position -> chunk ID of the indexed chunks of these sources (this session's, when scoped)."""
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        if self.vs is None or not isinstance(self.vs.docstore, SqliteDocstore):
+            return {}
+        return self.vs.docstore.source_positions(sorted(set(sources)), session=self.session_id)
+
+    def delete_positions(self, positions: Iterable[int]) -> Dict[str, int]:
+        """Remove the chunks at these positions (see delete_sources); returns chunk counts."""
+        positions = sorted(set(positions))
+        if self.vs is None or not positions:
+            return {"chunks_deleted": 0, "tombstones": 0}
+        with index_writer_lock(self.index_dir):
+            self._refresh()
+            stats = tombstone_positions(self.vs, self.index_dir, positions)
+        VECTORSTORE_CACHE.invalidate(self.index_dir)
+        return stats
+
+    def sources(self) -> Dict[str, int]:
+        """Chunk count per indexed source document."""
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        if self.vs is None or not isinstance(self.vs.docstore, SqliteDocstore):
+            return {}
+        return self.vs.docstore.sources(session=self.session_id)
+
+    def retriever(self, k: int = 5):
+        """Similarity retriever over this index (only this session's chunks when scoped)."""
+        vs = scoped_vectorstore(self.vs, [self.session_id]) if self.session_id else self.vs
+        return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+
+    def _refresh(self):
+        # Caller holds the writer lock: reload if another writer appended since we loaded
+        if self.vs is None:
+            if self._exists():
+                self.load_or_create()
+            return
+        index = self.vs.index
+        if isinstance(index, SegmentedIndex) and manifest_path(self.index_dir).exists():
+            if read_manifest(self.index_dir)["next_id"] != index.next_id:
+                self.load_or_create()
+
     def add_documents(self, docs : List[Document]):
         if self.vs is None:
             raise RuntimeError("call load_or_create() before adding documents")
-
-        new_docs: List[Document] = []
-
-        for d in docs:
-            key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
-                continue
-
-            self._meta["rows"][key] = True
-            new_docs.append(d)
-
-
-        if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_metadata()
-        
-        return len(new_docs)
+        return self.ingest(docs)["added"]
 
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.embedder,
-                allow_dangerous_deserialization=True,
-            )
+            # Repair must not see another writer's half-written batch
+            with index_writer_lock(self.index_dir):
+                # Segmented indexes stay appendable when mapped; new vectors go to a new segment
+                self.vs = load_faiss(self.index_dir, self.embedder, mmap=mmap_enabled(), for_write=True)
+                if isinstance(self.vs.docstore, SqliteDocstore):
+                    index = self.vs.index
+                    self.vs.docstore.repair(index.next_id if isinstance(index, SegmentedIndex) else index.ntotal)
+                    self._import_log_files()
+                    if isinstance(index, SegmentedIndex):
+                        sync_tombstones(self.vs, self.index_dir)
             return self.vs
         
         
         if not texts:
             raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
         
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.embedder, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        metadatas = metadatas or [{} for _ in texts]
+        self.ingest([Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)])
         return self.vs
 
 class DocHandler:
@@ -121,15 +311,13 @@ class DocHandler:
                 raise ValueError("Invalid File Type. Only pdfs are allowed")
             
             save_path = os.path.join(self.session_path, filename)
+            size, sha256 = copy_upload(uploaded_file, Path(save_path))
 
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
-
-            log.info("PDF File saved successfully", file=filename, save_path=save_path, session_id = self.session_id)
+            log.info("PDF File saved successfully", file=filename, save_path=save_path, session_id = self.session_id,
+                     bytes=size, sha256=sha256)
             return save_path
+        except UploadTooLarge:
+            raise
         except Exception as e:
             log.error("Failed to save pdf", error = str(e), session_id = self.session_id)
             raise DocumentPortalException(f"Failed to save pdf: {str(e)}", e ) from e
@@ -137,15 +325,13 @@ class DocHandler:
     
     def read_pdf(self, pdf_path:str) -> str:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n=== Page {page_num + 1} ---\n {page.get_text()}")
-
-                text = "\n".join(text_chunks)
-                log.info("PDF read successfully", pdf_path=pdf_path, session_id = self.session_id, pages=len(text_chunks))
-                return text
+            text_chunks = [
+                f"\n=== Page {page_num + 1} ---\n {text}"
+                for page_num, text in enumerate(pdf_page_texts(pdf_path))
+            ]
+            text = "\n".join(text_chunks)
+            log.info("PDF read successfully", pdf_path=pdf_path, session_id = self.session_id, pages=len(text_chunks))
+            return text
         except Exception as e:
             log.error("Failed to read pdf", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
             raise DocumentPortalException(f"Could not process the pdf:{pdf_path}", e ) from e
@@ -168,37 +354,43 @@ class DocumentComparator:
         try:
             ref_path = self.session_path / reference_file.name
             act_path = self.session_path / actual_file.name
+            budget = UploadBudget()
             for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
-            log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
+                copy_upload(fobj, out, budget=budget)
+            log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id,
+                     bytes=budget.used)
             return ref_path, act_path
+        except UploadTooLarge:
+            raise
         except Exception as e:
             log.error("Error saving PDF files", error=str(e), session=self.session_id)
             raise DocumentPortalException("Error saving files", e) from e
 
     def read_pdf(self, pdf_path: Path) -> str:
         try:
-            with fitz.open(pdf_path) as doc:
-                if doc.is_encrypted:
-                    raise ValueError(f"PDF is encrypted: {pdf_path.name}")
-                parts = []
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text = page.get_text()  # type: ignore
-                    if text.strip():
-                        parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
+            parts = [
+                f"\n --- Page {page_num + 1} --- \n{text}"
+                for page_num, text in enumerate(pdf_page_texts(pdf_path))
+                if text.strip()
+            ]
             log.info("PDF read successfully", file=str(pdf_path), pages=len(parts))
             return "\n".join(parts)
         except Exception as e:
             log.error("Error reading PDF", file=str(pdf_path), error=str(e))
             raise DocumentPortalException("Error reading PDF", e) from e
 
+    def read_pages(self, pdf_path: Path) -> List[str]:
+        """Text of each page, for the page-by-page diff in /compare."""
+        try:
+            pages = pdf_page_texts(pdf_path)
+            log.info("PDF pages read", file=str(pdf_path), pages=len(pages))
+            return pages
+        except Exception as e:
+            log.error("Error reading PDF", file=str(pdf_path), error=str(e))
+            raise DocumentPortalException("Error reading PDF", e) from e
+
     def combine_documents(self) -> str:
         try:
             doc_parts = []
@@ -231,12 +423,17 @@ class ChatIngestor:
         faiss_base: str = "faiss_index",
         use_session_dirs: bool = True,
         session_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
     ):
         try:
-            self.model_loader = ModelLoader()
+            self.model_loader = MODEL_REGISTRY
             
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
+            # Global index mode: one shared index per tenant, chunks tagged with their session
+            self.global_index = global_index_settings()["enabled"]
+            if self.global_index and not is_valid_tag(self.session_id):
+                raise ValueError(f"Invalid session id for the global index: {self.session_id!r}")
             
             self.temp_base = Path(temp_base)
             self.temp_base.mkdir(parents=True, exist_ok=True)
@@ -244,10 +441,18 @@ class ChatIngestor:
             self.faiss_base.mkdir(parents=True, exist_ok=True)
             
             self.temp_dir = self._resolve_dir(self.temp_base)
-            self.faiss_dir = self._resolve_dir(self.faiss_base)
+            if self.global_index:
+                self.tenant_id = tenant_id or global_index_settings()["default_tenant"]
+                self.faiss_dir = tenant_index_dir(self.faiss_base, self.tenant_id)
+                self.faiss_dir.mkdir(parents=True, exist_ok=True)
+            else:
+                self.tenant_id = None
+                self.faiss_dir = self._resolve_dir(self.faiss_base)
+            self._blob_store: Optional[BlobStore] = None
 
             log.info("ChatIngestor initialized",
                       session_id=self.session_id,
+                      tenant_id=self.tenant_id,
                       temp_dir=str(self.temp_dir),
                       faiss_dir=str(self.faiss_dir),
                       sessionized=self.use_session)
@@ -256,6 +461,35 @@ class ChatIngestor:
             raise DocumentPortalException("Initialization error in ChatIngestor", e) from e
             
         
+    @property
+    def blob_store(self) -> BlobStore:
+        """Content-addressed upload store shared by every session under temp_base."""
+        if self._blob_store is None:
+            self._blob_store = BlobStore(self.temp_base / "blobs")
+        return self._blob_store
+
+    def save_uploads(self, uploaded_files: Iterable, known_hashes: Iterable[str] = ()) -> List[Path]:
+        """Store uploads once per unique content and reference them (plus known hashes) from this session."""
+        return self.blob_store.save_uploads(uploaded_files, self.session_id, known_hashes)
+
+    def _annotate_sources(self, docs: List[Document], names: Optional[Dict[str, str]] = None):
+        # Blob paths are <sha256><ext>; attach the hash and the name the file was uploaded as.
+        # Streaming callers pass the session's refs (sha256 -> name) in, read once up front.
+        names = self.blob_store.refs(self.session_id) if names is None else names
+        for d in docs:
+            sha256 = Path(str(d.metadata.get("source", ""))).stem
+            if sha256 in names:
+                d.metadata["file_sha256"] = sha256
+                d.metadata["file_name"] = names[sha256]
+            if self.global_index:
+                # Tags a shared tenant index filters on
+                d.metadata["tenant_id"] = self.tenant_id
+                d.metadata["session_id"] = self.session_id
+
+    def _faiss_manager(self) -> FAISSManager:
+        return FAISSManager(self.faiss_dir, self.model_loader,
+                            session_id=self.session_id if self.global_index else None)
+
     def _resolve_dir(self, base: Path):
         if self.use_session:
             d = base / self.session_id # e.g. "faiss_index/abc123"
@@ -274,31 +508,125 @@ class ChatIngestor:
         *,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        k: int = 5,):
+        k: int = 5,
+        known_hashes: Iterable[str] = (),
+        progress: Optional[Callable[..., None]] = None,
+        replace: bool = False,):
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
-            docs = load_documents(paths)
-            if not docs:
-                raise ValueError("No valid documents loaded")
-            
-            chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            
+            paths = self.save_uploads(uploaded_files, known_hashes)
+        except (UploadTooLarge, UnknownBlobs):
+            raise
+        except Exception as e:
+            log.error("Failed to build retriever", error=str(e))
+            raise DocumentPortalException("Failed to build retriever", e) from e
+        return self.ingest_paths(paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k, progress=progress,
+                                 replace=replace)
+
+    def ingest_paths( self,
+        paths: List[Path],
+        *,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        k: int = 5,
+        progress: Optional[Callable[..., None]] = None,
+        replace: bool = False,):
+        """
+        Parse, split, embed and index already-saved files.
+
+        Pages stream out of the loaders and are split as they arrive; every
+        ingestion.batch_chunks chunks are embedded and appended to the index before
+        more pages are read, so peak memory does not grow with the upload.
+        progress(**counters) is called as each batch advances (files, pages_parsed,
+        chunks, chunks_embedded, vectors_indexed); it may raise to abort the ingestion.
+        With replace=True, a revised file supersedes the version already indexed
+        under the same file name: the old chunks are deleted once the document's last
+        batch is indexed, so an aborted ingestion never leaves it half-replaced.
+        """
+        report = progress or (lambda **_: None)
+        try:
+            report(files=len(paths))
+            fm = self._faiss_manager()
+            splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            counts = {"pages_parsed": 0, "chunks": 0}
+            totals = {"added": 0, "skipped": 0, "reembedded": 0, "replaced": 0}
+            # Revised documents being streamed: source -> (old chunk positions, chunk IDs of the new version)
+            pending: Dict[str, tuple] = {}
+            seen: set = set()
+
+            def finish(sources: List[str]):
+                # The new version is fully indexed: drop the old chunks it did not re-add
+                for source in sources:
+                    old, kept = pending.pop(source)
+                    doomed = [pos for pos, cid in old.items() if cid not in kept]
+                    totals["replaced"] += fm.delete_positions(doomed)["chunks_deleted"]
+
+            names = self.blob_store.refs(self.session_id)
+
+            def chunks():
+                # Pages flow out of the loaders one at a time and are split as they arrive
+                for doc in iter_documents(paths):
+                    self._annotate_sources([doc], names)
+                    counts["pages_parsed"] += 1
+                    yield from splitter.split_documents([doc])
+
             ## FAISS manager very very important class for the docchat
-            fm = FAISSManager(self.faiss_dir, self.model_loader)
-            
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
-            
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-                
-            added = fm.add_documents(chunks)
-            log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
+            for batch in iter_batches(chunks(), document_batch_settings()):
+                counts["chunks"] += len(batch)
+                report(**counts)
+                sources = [source_key(d.metadata or {}) for d in batch]
+                if replace:
+                    # Note each revised document's old chunks before its first batch is indexed
+                    for source in dict.fromkeys(sources):
+                        if source is not None and source not in seen:
+                            seen.add(source)
+                            pending[source] = (fm.chunk_positions([source]), set())
+                # Every new chunk is embedded exactly once, known chunks are skipped
+                stats = fm.ingest(batch)
+                for key in ("added", "skipped", "reembedded"):
+                    totals[key] += stats[key]
+                report(chunks_embedded=totals["added"], chunks_skipped=totals["skipped"])
+                if replace:
+                    for source, d in zip(sources, batch):
+                        if source in pending:
+                            pending[source][1].add(fm.chunk_id(d.page_content, d.metadata or {}))
+                    # Documents stream one after another: all but the batch's last one are complete
+                    finish([source for source in pending if source != sources[-1]])
+                    report(chunks_replaced=totals["replaced"])
+            if replace:
+                finish(list(pending))
+                report(chunks_replaced=totals["replaced"])
+
+            if not counts["pages_parsed"]:
+                raise ValueError("No valid documents loaded")
+            log.info("Documents split", chunks=counts["chunks"], chunk_size=chunk_size, overlap=chunk_overlap,
+                     pages=counts["pages_parsed"])
+            vs = fm.vs
+            if vs is None:
+                raise ValueError("No chunks to index")
+
+            if not replace:
+                totals.pop("replaced")
+            log.info("FAISS index updated", index=str(self.faiss_dir), **totals)
+            report(vectors_indexed=vs.index.ntotal)
             
-            return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+            return fm.retriever(k=k)
             
         except Exception as e:
             log.error("Failed to build retriever", error=str(e))
             raise DocumentPortalException("Failed to build retriever", e) from e
+
+    def list_documents(self) -> Dict[str, int]:
+        """Indexed documents of this session with their chunk counts."""
+        return self._faiss_manager().sources()
+
+    def delete_documents(self, sources: Iterable[str]) -> Dict[str, int]:
+        """Remove documents (by uploaded file name) from this session's index."""
+        try:
+            stats = self._faiss_manager().delete_sources(sources)
+            log.info("Documents removed from index", session_id=self.session_id, **stats)
+            return stats
+        except ValueError:
+            raise
+        except Exception as e:
+            log.error("Failed to delete documents", error=str(e), session_id=self.session_id)
+            raise DocumentPortalException("Failed to delete documents", e) from e
@@ -0,0 +1,23 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture(autouse=True)
+def isolated_parse_cache(tmp_path, monkeypatch):
+    """
+    Give every test its own parse cache file: the process-wide cache would otherwise
+    write data/parse_cache.sqlite in the working tree and serve entries across runs.
+    """
+    import utils.parse_cache as parse_cache
+
+    settings = parse_cache.parse_cache_settings
+    monkeypatch.setattr(parse_cache, "parse_cache_settings",
+                        lambda: {**settings(), "db_path": str(tmp_path / "parse_cache.sqlite")})
+    monkeypatch.setattr(parse_cache, "_cache", None)
@@ -0,0 +1,64 @@
+# tests/test_async_pipeline.py
+
+import os
+import sys
+import time
+import asyncio
+
+import httpx
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.main as api_main
+
+# =================================================================
+# Load test: /chat/query must overlap in-flight requests, not serialize them
+# =================================================================
+
+LLM_LATENCY = 0.2    # simulated network-bound LLM call (awaited)
+LOAD_LATENCY = 0.05  # simulated blocking index load (runs in the executor)
+
+
+class SlowFakeRAG:
+    """Stands in for ConversationalRAG with fixed blocking and async latencies."""
+    def __init__(self, session_id=None, retriever=None):
+        self.session_id = session_id
+
+    def load_retriever_from_faiss(self, index_path, k=5, index_name="index", **kwargs):
+        time.sleep(LOAD_LATENCY)
+
+    async def ainvoke(self, user_input, chat_history=None):
+        await asyncio.sleep(LLM_LATENCY)
+        return f"answer to {user_input}"
+
+
+@pytest.fixture(autouse=True)
+def fake_rag(monkeypatch, tmp_path):
+    (tmp_path / "s1").mkdir()
+    monkeypatch.setattr(api_main, "FAISS_BASE", str(tmp_path))
+    monkeypatch.setattr(api_main, "ConversationalRAG", SlowFakeRAG)
+
+
+async def _fire(n: int) -> float:
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/chat/query", data={"question": f"q{i}", "session_id": "s1"})
+            for i in range(n)
+        ])
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return elapsed
+
+
+@pytest.mark.parametrize("in_flight", [1, 8, 16])
+def test_latency_stays_flat_as_in_flight_requests_grow(in_flight):
+    """N concurrent requests should finish in about one request's latency, not N of them."""
+    elapsed = asyncio.run(_fire(in_flight))
+    serialized = in_flight * (LLM_LATENCY + LOAD_LATENCY)
+    assert elapsed < (LLM_LATENCY + LOAD_LATENCY) * 3
+    if in_flight > 1:
+        assert elapsed < serialized / 3
@@ -0,0 +1,52 @@
+# tests/test_blob_store.py
+
+import io
+import os
+import sys
+import hashlib
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.blob_store import BlobStore, UnknownBlobs
+
+# =================================================================
+# Tests for the content-addressed upload store (utils/blob_store.py)
+# =================================================================
+
+class NamedBytes(io.BytesIO):
+    """Streamlit-style upload: a readable buffer with a .name."""
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+PAYLOAD = b"%PDF-1.4 contract body"
+SHA = hashlib.sha256(PAYLOAD).hexdigest()
+
+def test_same_content_is_stored_once_across_sessions(tmp_path):
+    store = BlobStore(tmp_path)
+    a = store.save_uploads([NamedBytes(PAYLOAD, "contract.pdf")], "session_a")
+    b = store.save_uploads([NamedBytes(PAYLOAD, "contract-copy.pdf")], "session_b")
+
+    assert a == b
+    assert a[0].name == f"{SHA}.pdf"
+    assert store.refs("session_a") == {SHA: "contract.pdf"}
+    assert store.refs("session_b") == {SHA: "contract-copy.pdf"}
+    assert not any(store.tmp_dir.iterdir()), "temp copy of the duplicate must be removed"
+
+def test_known_hash_is_referenced_without_upload(tmp_path):
+    store = BlobStore(tmp_path)
+    store.save_uploads([NamedBytes(PAYLOAD, "contract.pdf")], "session_a")
+
+    assert store.exists(SHA)
+    paths = store.save_uploads([], "session_b", known_hashes=[SHA])
+    assert paths == [tmp_path / SHA[:2] / f"{SHA}.pdf"]
+    assert store.refs("session_b") == {SHA: "contract.pdf"}
+
+def test_unknown_hash_is_rejected(tmp_path):
+    store = BlobStore(tmp_path)
+    with pytest.raises(UnknownBlobs) as exc:
+        store.save_uploads([], "session_a", known_hashes=["0" * 64])
+    assert exc.value.hashes == ["0" * 64]
@@ -0,0 +1,132 @@
+# tests/test_chat_stream.py
+
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+import api.main as api_main
+from src.document_chat import retrieval
+from src.document_chat.retrieval import ConversationalRAG
+
+# =================================================================
+# Tests for token streaming (ConversationalRAG.astream + /chat/query/stream)
+# =================================================================
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """Fake LLM (rewrite -> answer) and deterministic embeddings instead of real providers."""
+    embeddings = DeterministicFakeEmbedding(size=16)
+    llm = FakeListChatModel(responses=["standalone question", "Clause 7 covers refunds."])
+    monkeypatch.setattr(retrieval.MODEL_REGISTRY, "load_llm", lambda: llm)
+    monkeypatch.setattr(retrieval.MODEL_REGISTRY, "load_embeddings", lambda: embeddings)
+    return embeddings
+
+
+@pytest.fixture
+def index_dir(tmp_path, fake_models):
+    path = tmp_path / "s1"
+    FAISS.from_texts(
+        ["Clause 7: refunds within 30 days.", "Clause 8: shipping."],
+        fake_models,
+        metadatas=[{"source": "terms.pdf", "page": 0}, {"source": "terms.pdf", "page": 1}],
+    ).save_local(str(path))
+    return path
+
+
+def test_astream_yields_tokens_then_sources_and_timings(index_dir):
+    rag = ConversationalRAG(session_id="s1")
+    rag.load_retriever_from_faiss(str(index_dir), k=2)
+
+    async def collect():
+        return [event async for event in rag.astream("what about refunds?")]
+
+    events = asyncio.run(collect())
+    tokens = [e["data"] for e in events if e["event"] == "token"]
+    end = events[-1]
+
+    assert "".join(tokens) == "Clause 7 covers refunds."
+    assert len(tokens) > 1, "answer should arrive incrementally"
+    assert end["event"] == "end"
+    assert {s["source"] for s in end["sources"]} == {"terms.pdf"}
+    assert {"rewrite_ms", "retrieve_ms", "ttft_ms", "generate_ms", "total_ms"} <= set(end["timings"])
+
+
+def test_stream_endpoint_emits_sse_frames(index_dir, monkeypatch):
+    monkeypatch.setattr(api_main, "FAISS_BASE", str(index_dir.parent))
+    client = TestClient(api_main.app)
+    response = client.post("/chat/query/stream", data={"question": "refunds?", "session_id": "s1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = [f for f in response.text.split("\n\n") if f]
+    assert frames[0].startswith("event: token\ndata: ")
+    assert frames[-1].startswith("event: end\n")
+    end = json.loads(frames[-1].split("data: ", 1)[1])
+    assert "timings" in end and len(end["sources"]) == 2
+
+
+def test_stream_endpoint_accepts_mmr_parameters(index_dir, monkeypatch):
+    monkeypatch.setattr(api_main, "FAISS_BASE", str(index_dir.parent))
+    client = TestClient(api_main.app)
+    data = {"question": "refunds?", "session_id": "s1", "k": 1, "search_type": "mmr", "fetch_k": 2, "lambda": 0.3}
+    response = client.post("/chat/query/stream", data=data)
+    assert response.status_code == 200
+    end = json.loads([f for f in response.text.split("\n\n") if f][-1].split("data: ", 1)[1])
+    assert len(end["sources"]) == 1
+
+    response = client.post("/chat/query/stream", data={**data, "lambda": 1.5})
+    assert response.status_code == 400
+
+# =================================================================
+# Tests for batch questions (ConversationalRAG.abatch + /chat/query/batch)
+# =================================================================
+
+def test_abatch_answers_each_question_without_rewrite(index_dir):
+    rag = ConversationalRAG(session_id="s1")
+    rag.load_retriever_from_faiss(str(index_dir), k=1)
+
+    result = asyncio.run(rag.abatch(["refunds?", "shipping?"], max_concurrency=1))
+
+    # No rewrite step: the fake LLM's two responses are the two answers, in order
+    assert [r["answer"] for r in result["results"]] == ["standalone question", "Clause 7 covers refunds."]
+    assert [r["question"] for r in result["results"]] == ["refunds?", "shipping?"]
+    assert all(len(r["sources"]) == 1 and "generate_ms" in r["timings"] for r in result["results"])
+    assert {"retrieve_ms", "generate_ms", "total_ms"} <= set(result["timings"])
+
+
+def test_batch_endpoint_validates_and_answers(index_dir, monkeypatch):
+    monkeypatch.setattr(api_main, "FAISS_BASE", str(index_dir.parent))
+    client = TestClient(api_main.app)
+    response = client.post("/chat/query/batch", data={"questions": ["refunds?", "shipping?"], "session_id": "s1", "k": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["results"]) == 2 and all("answer" in r for r in body["results"])
+    assert body["search_type"] == "similarity"
+
+    response = client.post("/chat/query/batch", data={"questions": ["a"], "session_id": "s1", "max_concurrency": 0})
+    assert response.status_code == 400
+
+
+# =================================================================
+# Request size limit
+# =================================================================
+
+def test_oversized_request_is_rejected_before_the_body_is_read(monkeypatch):
+    monkeypatch.setattr(api_main, "MAX_REQUEST_BYTES", 1024)
+    client = TestClient(api_main.app)
+
+    resp = client.post("/analyze", files={"file": ("big.pdf", b"x" * 4096, "application/pdf")})
+    assert resp.status_code == 413 and "1024 byte" in resp.json()["detail"]
+    # Small bodies reach routing (GET-only route: 405, not 413)
+    assert client.post("/health", content=b"x" * 10).status_code == 405
@@ -55,3 +55,18 @@ def test_config_malformed_yaml(tmp_path):
     
     with pytest.raises(yaml.YAMLError):
         load_config(config_path=str(malformed_path))
+
+def test_config_is_parsed_once_until_cleared(mock_config_file, monkeypatch):
+    """Tests that load_config serves repeat calls from memory and re-reads after clear_config_cache."""
+    from utils import config_loader
+
+    calls = []
+    safe_load = yaml.safe_load
+    monkeypatch.setattr(config_loader.yaml, "safe_load", lambda f: calls.append(1) or safe_load(f))
+    first = load_config(config_path=mock_config_file)
+    assert load_config(config_path=mock_config_file) is first
+    assert len(calls) == 1
+
+    config_loader.clear_config_cache()
+    load_config(config_path=mock_config_file)
+    assert len(calls) == 2
@@ -80,3 +80,359 @@ def test_document_splitting_logic():
     # Find the overlapping text by looking at the start of the second chunk
     overlapping_text = start_of_second_chunk[:50] 
     assert overlapping_text in first_chunk.page_content
+
+
+# =================================================================
+# Tests for single-pass, content-fingerprinted ingestion (FAISSManager.ingest)
+# =================================================================
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.document_ingestion.data_ingestion import FAISSManager
+
+
+class CountingLoader:
+    """Stands in for the model registry; counts texts sent to the embedder."""
+    def __init__(self):
+        self.embedded = []
+        loader = self
+
+        class _Emb(DeterministicFakeEmbedding):
+            def embed_documents(self, texts):
+                loader.embedded.extend(texts)
+                return super().embed_documents(texts)
+
+        self.embeddings = _Emb(size=8)
+
+    def load_embeddings(self):
+        return self.embeddings
+
+
+def _pdf_chunks():
+    # Two PDFs without row_id: the old source::row_id fingerprint collided on these
+    return [
+        Document(page_content="Clause 1 text", metadata={"source": "a.pdf", "page": 0}),
+        Document(page_content="Clause 2 text", metadata={"source": "a.pdf", "page": 0}),
+        Document(page_content="Clause 1 text", metadata={"source": "b.pdf", "page": 3}),
+    ]
+
+
+def test_fresh_index_embeds_each_chunk_exactly_once(tmp_path):
+    loader = CountingLoader()
+    fm = FAISSManager(tmp_path, loader)
+
+    stats = fm.ingest(_pdf_chunks())
+
+    assert stats == {"added": 3, "skipped": 0, "reembedded": 0}
+    assert len(loader.embedded) == 3
+    assert fm.vs.index.ntotal == 3
+
+
+def test_reingesting_known_chunks_is_a_no_op(tmp_path):
+    loader = CountingLoader()
+    FAISSManager(tmp_path, loader).ingest(_pdf_chunks())
+    loader.embedded.clear()
+
+    extra = Document(page_content="Clause 9 text", metadata={"source": "c.pdf", "page": 0})
+    stats = FAISSManager(tmp_path, loader).ingest(_pdf_chunks() + [extra, extra])
+
+    assert stats == {"added": 1, "skipped": 4, "reembedded": 0}
+    assert loader.embedded == ["Clause 9 text"]
+
+
+def test_append_persists_only_the_new_batch(tmp_path):
+    from utils.faiss_segments import read_manifest
+
+    loader = CountingLoader()
+    FAISSManager(tmp_path, loader).ingest(_pdf_chunks())
+    extra = Document(page_content="Clause 9 text", metadata={"source": "c.pdf", "page": 0})
+    FAISSManager(tmp_path, loader).ingest([extra])
+
+    assert [s["ntotal"] for s in read_manifest(tmp_path)["segments"]] == [3, 1]
+    store = FAISSManager(tmp_path, loader).load_or_create().docstore
+    assert len(store.logged([FAISSManager.chunk_id(d.page_content, d.metadata) for d in _pdf_chunks() + [extra]])) == 4
+
+
+def test_logged_chunks_missing_from_the_index_count_as_reembedded(tmp_path):
+    loader = CountingLoader()
+    fm = FAISSManager(tmp_path, loader)
+    fm.ingest(_pdf_chunks())
+    fm.delete_sources(["a.pdf"])
+    assert fm.ingest(_pdf_chunks()) == {"added": 2, "skipped": 1, "reembedded": 2}
+
+
+def test_jsonl_ingestion_log_is_imported_once(tmp_path):
+    import json
+
+    loader = CountingLoader()
+    FAISSManager(tmp_path, loader).ingest(_pdf_chunks())
+    (tmp_path / "ingested_meta.jsonl").write_text(
+        json.dumps({"at": "2025-01-01T00:00:00+00:00", "chunk_ids": ["lost-1", "lost-2"]}) + "\n{torn"
+    )
+    store = FAISSManager(tmp_path, loader).load_or_create().docstore
+    assert store.logged(["lost-1", "lost-2", "never"]) == {"lost-1", "lost-2"}
+    assert not (tmp_path / "ingested_meta.jsonl").exists()
+
+
+def test_replace_reembeds_only_the_revised_document(tmp_path):
+    loader = CountingLoader()
+    manual = [Document(page_content=f"Manual v1 page {i}", metadata={"file_name": "manual.pdf", "page": i})
+              for i in range(3)]
+    other = [Document(page_content="Other text", metadata={"file_name": "other.pdf", "page": 0})]
+    FAISSManager(tmp_path, loader).ingest(manual + other)
+    loader.embedded.clear()
+
+    revised = [Document(page_content=f"Manual v2 page {i}", metadata={"file_name": "manual.pdf", "page": i})
+               for i in range(2)]
+    fm = FAISSManager(tmp_path, loader)
+    stats = fm.replace_sources(revised)
+
+    assert stats["replaced"] == 3 and stats["added"] == 2
+    assert loader.embedded == ["Manual v2 page 0", "Manual v2 page 1"]
+    assert fm.sources() == {"manual.pdf": 2, "other.pdf": 1}
+    hits = fm.vs.similarity_search("Manual v1 page 0", k=5)
+    assert all("v1" not in h.page_content for h in hits)
+
+
+def test_failed_replace_keeps_the_old_version(tmp_path):
+    class _Down(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            raise RuntimeError("embedding API down")
+
+    manual = [Document(page_content=f"Manual v1 page {i}", metadata={"file_name": "manual.pdf", "page": i})
+              for i in range(3)]
+    FAISSManager(tmp_path, CountingLoader()).ingest(manual)
+
+    revised = [Document(page_content=f"Manual v2 page {i}", metadata={"file_name": "manual.pdf", "page": i})
+               for i in range(5)]
+    with pytest.raises(RuntimeError):
+        FAISSManager(tmp_path, MagicMock(load_embeddings=lambda: _Down(size=8))).replace_sources(revised)
+
+    assert FAISSManager(tmp_path, CountingLoader()).sources() == {"manual.pdf": 3}
+
+
+def test_replace_keeps_chunks_the_new_version_shares(tmp_path):
+    loader = CountingLoader()
+    pages = [Document(page_content=f"Manual page {i}", metadata={"file_name": "manual.pdf", "page": i})
+             for i in range(3)]
+    FAISSManager(tmp_path, loader).ingest(pages)
+    loader.embedded.clear()
+
+    revised = pages[:2] + [Document(page_content="Manual page 2, revised", metadata={"file_name": "manual.pdf", "page": 2})]
+    fm = FAISSManager(tmp_path, loader)
+    stats = fm.replace_sources(revised)
+
+    assert stats["replaced"] == 1 and stats["added"] == 1 and stats["skipped"] == 2
+    assert loader.embedded == ["Manual page 2, revised"]
+    assert fm.sources() == {"manual.pdf": 3}
+
+
+def test_replacing_an_uploaded_revision_reindexes_the_whole_document(tmp_path):
+    loader = CountingLoader()
+    page = lambda text, sha256: Document(page_content=text, metadata={"file_name": "manual.pdf", "file_sha256": sha256})
+    FAISSManager(tmp_path, loader).ingest([page("Intro", "v1"), page("Body", "v1")])
+
+    fm = FAISSManager(tmp_path, loader)
+    stats = fm.replace_sources([page("Intro", "v2"), page("Body, revised", "v2")])
+
+    assert stats["replaced"] == 2 and stats["added"] == 2 and stats["skipped"] == 0
+    assert fm.sources() == {"manual.pdf": 2}
+
+
+def test_sessions_sharing_a_tenant_index_are_isolated(tmp_path):
+    loader = CountingLoader()
+    doc = lambda s: Document(page_content="Same upload", metadata={"file_name": "f.txt", "session_id": s})
+    FAISSManager(tmp_path, loader, session_id="s1").ingest([doc("s1")])
+    FAISSManager(tmp_path, loader, session_id="s2").ingest([doc("s2")])
+
+    s1 = FAISSManager(tmp_path, loader, session_id="s1")
+    assert s1.sources() == {"f.txt": 1}
+    assert s1.delete_sources(["f.txt"])["chunks_deleted"] == 1
+
+    s2 = FAISSManager(tmp_path, loader, session_id="s2")
+    assert s2.sources() == {"f.txt": 1}
+    hits = s2.retriever(k=5).invoke("Same upload")
+    assert [h.metadata["session_id"] for h in hits] == ["s2"]
+
+
+def test_hybrid_retrieval_finds_exact_identifiers(tmp_path):
+    from utils.vectorstore_cache import VectorStoreCache
+
+    loader = CountingLoader()
+    parts = [Document(page_content=f"Replacement part PN-{4400 + i}-B for the pump assembly",
+                      metadata={"file_name": f"parts-{i}.pdf", "page": 0}) for i in range(20)]
+    fm = FAISSManager(tmp_path, loader)
+    fm.ingest(parts)
+
+    cache = VectorStoreCache(max_bytes=1 << 30, ttl_seconds=60)
+    hybrid = cache.get_retriever(tmp_path, loader.embeddings, search_type="hybrid", search_kwargs={"k": 3})
+    assert hybrid.invoke("which pump needs PN-4417-B?")[0].metadata["file_name"] == "parts-17.pdf"
+
+    fm.delete_sources(["parts-17.pdf"])
+    hybrid = cache.get_retriever(tmp_path, loader.embeddings, search_type="hybrid", search_kwargs={"k": 3})
+    assert all(d.metadata["file_name"] != "parts-17.pdf" for d in hybrid.invoke("which pump needs PN-4417-B?"))
+
+# =================================================================
+# Parallel page-range PDF text extraction (utils/pdf_text.py)
+# =================================================================
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import fitz
+from utils.pdf_text import extract_page_texts, page_ranges
+from src.document_ingestion.data_ingestion import DocumentComparator
+
+def _write_pdf(path, pages):
+    with fitz.open() as doc:
+        for i in range(pages):
+            doc.new_page().insert_text((72, 72), f"page {i + 1} body")
+        doc.save(str(path))
+    return path
+
+def test_page_ranges_cover_every_page_once():
+    ranges = page_ranges(10, 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 10
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert page_ranges(3, 8) == [(0, 1), (1, 2), (2, 3)]
+
+def test_parallel_extraction_keeps_page_order(tmp_path):
+    pdf = _write_pdf(tmp_path / "long.pdf", 80)
+    sequential = extract_page_texts(pdf, max_workers=1)
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        parallel = extract_page_texts(pdf, max_workers=2, pool=pool)
+    assert parallel == sequential
+    assert [t.strip() for t in parallel[:2]] == ["page 1 body", "page 2 body"]
+
+def test_comparator_reads_pages_in_order(tmp_path):
+    pdf = _write_pdf(tmp_path / "short.pdf", 3)
+    text = DocumentComparator(base_dir=str(tmp_path / "cmp"), session_id="s").read_pdf(pdf)
+    assert text.index("page 1 body") < text.index("page 2 body") < text.index("page 3 body")
+
+# =================================================================
+# Loader registry (utils/document_loaders.py)
+# =================================================================
+
+from utils.document_loaders import detect_format, get_loader
+from utils.document_ops import load_documents
+
+PAGE_KEYS = ("source", "total_pages", "page", "page_label")
+
+def test_pymupdf_loader_matches_pypdf_page_metadata(tmp_path):
+    pdf = _write_pdf(tmp_path / "doc.pdf", 3)
+    fast = list(get_loader("pdf", "pymupdf")(pdf))
+    reference = list(get_loader("pdf", "pypdf")(pdf))
+    assert [{k: d.metadata[k] for k in PAGE_KEYS} for d in fast] == \
+           [{k: d.metadata[k] for k in PAGE_KEYS} for d in reference]
+    assert [d.page_content.strip() for d in fast] == [d.page_content.strip() for d in reference]
+
+def test_format_is_sniffed_from_content(tmp_path):
+    mislabelled = _write_pdf(tmp_path / "notes.txt", 2)
+    (tmp_path / "plain.txt").write_text("hello", encoding="utf-8")
+    (tmp_path / "plain.txt.bak").write_text("hello", encoding="utf-8")
+    assert detect_format(mislabelled) == "pdf"
+    assert detect_format(tmp_path / "plain.txt") == "txt"
+    docs = load_documents([mislabelled, tmp_path / "plain.txt", tmp_path / "plain.txt.bak"])
+    assert [d.metadata.get("page") for d in docs] == [0, 1, None]
+
+def test_unknown_loader_name_is_rejected():
+    with pytest.raises(ValueError, match="pymupdf"):
+        get_loader("pdf", "nope")
+
+# =================================================================
+# Streaming, bounded-batch ingestion (ChatIngestor.ingest_paths)
+# =================================================================
+
+from src.document_ingestion import data_ingestion
+
+def _streaming_ingestor(tmp_path, monkeypatch, batch_chunks):
+    monkeypatch.setattr(data_ingestion, "document_batch_settings", lambda: batch_chunks)
+    ingestor = ChatIngestor(temp_base=str(tmp_path / "data"), faiss_base=str(tmp_path / "faiss"),
+                            use_session_dirs=True, session_id="s1")
+    ingestor.model_loader = CountingLoader()
+    return ingestor
+
+def test_ingestion_streams_pages_in_bounded_batches(tmp_path, monkeypatch):
+    pdf = _write_pdf(tmp_path / "long.pdf", 7)
+    ingestor = _streaming_ingestor(tmp_path, monkeypatch, batch_chunks=3)
+    seen = []
+    ingestor.ingest_paths([pdf], progress=lambda **c: seen.append(c))
+
+    embed_calls = ingestor.model_loader.embedded
+    assert len(embed_calls) == 7
+    # Parsing and embedding interleave: three batches, each reported before the next is read
+    assert [c["chunks"] for c in seen if "chunks" in c] == [3, 6, 7]
+    assert seen[-1] == {"vectors_indexed": 7}
+
+def test_blob_refs_are_read_once_per_ingestion(tmp_path, monkeypatch):
+    pdf = _write_pdf(tmp_path / "long.pdf", 7)
+    ingestor = _streaming_ingestor(tmp_path, monkeypatch, batch_chunks=3)
+    refs = ingestor.blob_store.refs
+    calls = []
+    monkeypatch.setattr(ingestor.blob_store, "refs", lambda session_id: calls.append(session_id) or refs(session_id))
+    ingestor.ingest_paths([pdf])
+    assert calls == ["s1"]
+
+def test_streamed_replace_deletes_each_document_once(tmp_path, monkeypatch):
+    ingestor = _streaming_ingestor(tmp_path, monkeypatch, batch_chunks=2)
+    manual = _write_pdf(tmp_path / "manual.pdf", 3)
+    ingestor.ingest_paths([manual])
+    with fitz.open() as doc:
+        for i in range(5):
+            doc.new_page().insert_text((72, 72), f"revised page {i + 1}")
+        doc.save(str(manual))
+
+    # The revision spans three batches; the old pages go once, after the last, never the new ones
+    ingestor.ingest_paths([manual], replace=True)
+    assert ingestor._faiss_manager().sources() == {str(manual): 5}
+
+def test_aborted_streamed_replace_keeps_the_old_version(tmp_path, monkeypatch):
+    from exception.custom_exception import DocumentPortalException
+
+    ingestor = _streaming_ingestor(tmp_path, monkeypatch, batch_chunks=2)
+    manual = _write_pdf(tmp_path / "manual.pdf", 3)
+    ingestor.ingest_paths([manual])
+    old = ingestor._faiss_manager().chunk_positions([str(manual)])
+    with fitz.open() as doc:
+        for i in range(5):
+            doc.new_page().insert_text((72, 72), f"revised page {i + 1}")
+        doc.save(str(manual))
+
+    def cancel(**counters):
+        if "chunks_embedded" in counters:
+            raise RuntimeError("job cancelled")
+
+    with pytest.raises(DocumentPortalException):
+        ingestor.ingest_paths([manual], replace=True, progress=cancel)
+    assert old.items() <= ingestor._faiss_manager().chunk_positions([str(manual)]).items()
+
+    # Re-running the replace completes it
+    ingestor.ingest_paths([manual], replace=True)
+    assert ingestor._faiss_manager().sources() == {str(manual): 5}
+
+
+# =================================================================
+# Concurrent writers in separate processes (uvicorn workers sharing a tenant index)
+# =================================================================
+
+def _ingest_worker(index_dir, worker, batches):
+    loader = CountingLoader()
+    for b in range(batches):
+        docs = [Document(page_content=f"worker {worker} batch {b} chunk {i}", metadata={"file_name": f"w{worker}.txt", "page": b})
+                for i in range(3)]
+        FAISSManager(index_dir, loader).ingest(docs)
+
+
+def test_writers_in_separate_processes_do_not_lose_batches(tmp_path):
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_ingest_worker, args=(str(tmp_path), w, 6)) for w in range(2)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(120)
+    assert [p.exitcode for p in workers] == [0, 0]
+
+    fm = FAISSManager(tmp_path, CountingLoader())
+    assert fm.sources() == {"w0.txt": 18, "w1.txt": 18}
+    assert fm.load_or_create().index.ntotal == 36
@@ -0,0 +1,79 @@
+# tests/test_embedding_cache.py
+
+import os
+import sys
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.embedding_cache import CachedEmbeddings
+
+# =================================================================
+# Tests for the persistent embedding cache (utils/embedding_cache.py)
+# =================================================================
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake that records how many texts reached the 'API'."""
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+@pytest.fixture
+def inner():
+    emb = CountingEmbeddings(size=8)
+    emb.calls = []
+    return emb
+
+def test_identical_text_is_embedded_once_across_instances(tmp_path, inner):
+    db = tmp_path / "emb.sqlite"
+    first = CachedEmbeddings(inner, db, model_name="m")
+    vectors = first.embed_documents(["a", "b", "a"])
+
+    second = CachedEmbeddings(inner, db, model_name="m")  # e.g. another session or a restart
+    again = second.embed_documents(["b", "a"])
+
+    assert inner.calls == [["a", "b"]]
+    assert again == [vectors[1], vectors[0]]
+    assert second.stats()["hit_rate"] == 1.0
+
+def test_key_includes_model_and_dimensions(tmp_path, inner):
+    db = tmp_path / "emb.sqlite"
+    CachedEmbeddings(inner, db, model_name="m", dimensions=8).embed_documents(["a"])
+    CachedEmbeddings(inner, db, model_name="other").embed_documents(["a"])
+    CachedEmbeddings(inner, db, model_name="m", dimensions=4).embed_documents(["a"])
+    assert len(inner.calls) == 3
+
+def test_trim_evicts_least_recently_used(tmp_path, inner):
+    cache = CachedEmbeddings(inner, tmp_path / "emb.sqlite", model_name="m", max_bytes=8 * 4 * 2)
+    cache.embed_documents(["old"])
+    cache.embed_documents(["mid"])
+    cache.embed_documents(["new"])
+    cache.trim()
+
+    inner.calls = []
+    cache.embed_documents(["new"])
+    assert inner.calls == []
+    cache.embed_documents(["old"])
+    assert inner.calls == [["old"]]
+
+def test_queries_bypass_the_cache(tmp_path, inner):
+    cache = CachedEmbeddings(inner, tmp_path / "emb.sqlite", model_name="m")
+    assert cache.embed_query("what changed?") == inner.embed_query("what changed?")
+    cache.embed_queries(["q1", "q2"])
+    cache.embed_queries(["q1"])
+    assert inner.calls == [["q1", "q2"], ["q1"]]
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
+
+def test_stats_keep_running_totals(tmp_path, inner):
+    db = tmp_path / "emb.sqlite"
+    cache = CachedEmbeddings(inner, db, model_name="m", max_bytes=8 * 4 * 2)
+    cache.embed_documents(["a", "b"])
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] == 2 * 8 * 4
+    cache.embed_documents(["c"])  # over budget: trimmed back under 90% at once
+    assert cache.stats()["entries"] == 1 and cache.stats()["evictions"] == 2
+    assert CachedEmbeddings(inner, db, model_name="m").stats()["bytes"] == 8 * 4
@@ -0,0 +1,99 @@
+# tests/test_embedding_executor.py
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.embedding_executor import BatchedEmbeddings
+
+# =================================================================
+# Tests for batched, rate-limit aware embedding (utils/embedding_executor.py)
+# =================================================================
+
+class RateLimitError(Exception):
+    """Stand-in for openai.RateLimitError (matched by class name)."""
+    status_code = 429
+
+class FlakyEmbeddings(DeterministicFakeEmbedding):
+    """Records batches and fails (429 by default) for the first `fail_first` calls."""
+    fail_first: int = 0
+    error: type = RateLimitError
+    calls: list = []
+
+    def embed_documents(self, texts):
+        with _lock:
+            self.calls.append(list(texts))
+            if len(self.calls) <= self.fail_first:
+                raise self.error("slow down")
+        return super().embed_documents(texts)
+
+_lock = threading.Lock()
+
+@pytest.fixture
+def inner():
+    emb = FlakyEmbeddings(size=8)
+    emb.calls = []
+    return emb
+
+def test_batches_respect_size_and_token_budget(inner):
+    emb = BatchedEmbeddings(inner, max_batch_size=3, max_batch_tokens=10**6)
+    assert [len(b) for b in emb.make_batches([f"t{i}" for i in range(7)])] == [3, 3, 1]
+
+    emb = BatchedEmbeddings(inner, max_batch_size=100, max_batch_tokens=emb._count_tokens("x " * 50) * 2)
+    assert [len(b) for b in emb.make_batches(["x " * 50] * 5)] == [2, 2, 1]
+
+def test_parallel_batches_preserve_input_order(inner):
+    texts = [f"chunk {i}" for i in range(50)]
+    emb = BatchedEmbeddings(inner, max_batch_size=4, max_concurrency=8)
+    assert emb.embed_documents(texts) == inner.embed_documents(texts)
+    assert len(inner.calls) == 13 + 1  # 13 batches + the direct reference call
+
+def test_rate_limit_backs_off_and_retries(inner):
+    inner.fail_first = 2
+    emb = BatchedEmbeddings(inner, max_batch_size=10, max_concurrency=4, base_delay=0.01)
+    vectors = emb.embed_documents(["a", "b", "c"])
+    assert vectors == DeterministicFakeEmbedding(size=8).embed_documents(["a", "b", "c"])
+    assert emb.rate_limited == 2
+    assert emb._limiter.limit == 1  # halved twice from 4
+
+def test_gives_up_after_max_retries(inner):
+    inner.fail_first = 100
+    emb = BatchedEmbeddings(inner, max_retries=2, base_delay=0.01)
+    with pytest.raises(RateLimitError):
+        emb.embed_documents(["a"])
+    assert len(inner.calls) == 3
+
+class APIConnectionError(Exception):
+    """Stand-in for openai.APIConnectionError (matched by class name)."""
+
+class ServerError(Exception):
+    status_code = 503
+
+class BadRequestError(Exception):
+    status_code = 400
+
+@pytest.mark.parametrize("error", [APIConnectionError, ServerError])
+def test_transient_errors_are_retried_without_shrinking_concurrency(inner, error):
+    inner.error, inner.fail_first = error, 2
+    emb = BatchedEmbeddings(inner, max_concurrency=4, base_delay=0.01)
+    assert emb.embed_documents(["a"]) == DeterministicFakeEmbedding(size=8).embed_documents(["a"])
+    assert emb.transient_errors == 2 and emb.rate_limited == 0
+    assert emb._limiter.limit == 4
+
+def test_other_errors_are_not_retried(inner):
+    inner.error, inner.fail_first = BadRequestError, 1
+    with pytest.raises(BadRequestError):
+        BatchedEmbeddings(inner, base_delay=0.01).embed_documents(["a"])
+    assert len(inner.calls) == 1
+
+def test_queries_are_retried_like_batches(inner):
+    inner.fail_first = 1
+    emb = BatchedEmbeddings(inner, base_delay=0.01)
+    assert emb.embed_query("a") == DeterministicFakeEmbedding(size=8).embed_query("a")
+    assert emb.rate_limited == 1
@@ -0,0 +1,400 @@
+# tests/test_faiss_store.py
+
+import os
+import sys
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.faiss_store import SqliteDocstore, docstore_path, index_exists, is_mmapped, load_faiss, save_faiss
+
+# =================================================================
+# Tests for the sqlite-backed FAISS docstore (utils/faiss_store.py)
+# =================================================================
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=16)
+
+TEXTS = ["alpha", "beta", "gamma", "delta"]
+
+def test_save_writes_sqlite_docstore_and_no_pickle(tmp_path, embeddings):
+    vs = FAISS.from_texts(TEXTS, embeddings, metadatas=[{"n": i} for i in range(4)])
+    save_faiss(vs, tmp_path)
+    assert docstore_path(tmp_path).exists()
+    assert not (tmp_path / "index.pkl").exists()
+    assert index_exists(tmp_path)
+
+    loaded = load_faiss(tmp_path, embeddings)
+    assert isinstance(loaded.docstore, SqliteDocstore)
+    hit = loaded.similarity_search("gamma", k=1)[0]
+    assert hit.page_content == "gamma" and hit.metadata == {"n": 2}
+
+def test_adding_to_loaded_index_persists(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(TEXTS[:2], embeddings), tmp_path)
+    vs = load_faiss(tmp_path, embeddings)
+    vs.add_texts(TEXTS[2:], ids=["c", "d"])
+    save_faiss(vs, tmp_path)
+
+    reloaded = load_faiss(tmp_path, embeddings)
+    assert reloaded.index.ntotal == 4
+    assert len(reloaded.index_to_docstore_id) == 4
+    assert reloaded.index_to_docstore_id[3] == "d"
+    assert reloaded.similarity_search("delta", k=1)[0].page_content == "delta"
+
+def test_legacy_pickle_index_is_converted_on_save(tmp_path, embeddings):
+    FAISS.from_texts(TEXTS, embeddings).save_local(str(tmp_path))
+    legacy = load_faiss(tmp_path, embeddings)
+    save_faiss(legacy, tmp_path)
+    assert not (tmp_path / "index.pkl").exists()
+    assert load_faiss(tmp_path, embeddings).similarity_search("beta", k=1)[0].page_content == "beta"
+
+def test_repair_drops_rows_past_saved_index(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(TEXTS[:2], embeddings), tmp_path)
+    vs = load_faiss(tmp_path, embeddings)
+    vs.add_texts(["orphan"])  # rows written, index.faiss never saved
+    store = load_faiss(tmp_path, embeddings).docstore
+    assert store.repair(2) == 1
+    assert len(store) == 2
+
+def test_mget_preserves_order(tmp_path):
+    store = SqliteDocstore(tmp_path / "docs.sqlite")
+    store.add({"a": Document(page_content="A"), "b": Document(page_content="B")})
+    assert [d and d.page_content for d in store.mget(["b", "x", "a"])] == ["B", None, "A"]
+
+def test_mmap_load_is_read_only_and_searchable(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(TEXTS, embeddings), tmp_path)
+    vs = load_faiss(tmp_path, embeddings, mmap=True)
+    assert is_mmapped(vs)
+    assert vs.similarity_search("beta", k=1)[0].page_content == "beta"
+
+    # A writer replacing the file must not disturb the mapped reader
+    writer = load_faiss(tmp_path, embeddings)
+    writer.add_texts(["epsilon"])
+    save_faiss(writer, tmp_path)
+    assert vs.index.ntotal == 4
+    assert vs.similarity_search("alpha", k=1)[0].page_content == "alpha"
+    assert load_faiss(tmp_path, embeddings, mmap=True).index.ntotal == 5
+
+# =================================================================
+# ANN index types (faiss_db.index)
+# =================================================================
+
+import numpy as np
+from utils.faiss_store import index_kind, index_settings, new_index, promote_index
+
+def _vectors(n, dim=32):
+    return np.random.default_rng(0).standard_normal((n, dim), dtype=np.float32)
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw", "ivf_pq"])
+def test_small_sessions_fall_back_to_flat(kind):
+    s = index_settings({"type": kind, "min_train_vectors": 1000})
+    assert index_kind(new_index(32, _vectors(100), s)) == "flat"
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw", "ivf_pq"])
+def test_ann_index_is_built_and_searchable(kind):
+    s = index_settings({"type": kind, "min_train_vectors": 1000, "nprobe": 64})
+    x = _vectors(10000)
+    index = new_index(32, x, s)
+    index.add(x)
+    assert index_kind(index) == kind
+    _, ids = index.search(x[:20], 1)
+    assert (ids[:, 0] == np.arange(20)).mean() >= 0.9
+    index.reconstruct(5)  # MMR needs reconstruct on every type
+
+def test_flat_index_is_promoted_in_place(tmp_path, embeddings):
+    s = index_settings({"type": "ivf_flat", "min_train_vectors": 50})
+    texts = [f"text {i}" for i in range(60)]
+    vs = FAISS.from_texts(texts, embeddings)
+    assert promote_index(vs, s)
+    assert index_kind(vs.index) == "ivf_flat"
+    save_faiss(vs, tmp_path)
+    loaded = load_faiss(tmp_path, embeddings, mmap=True)
+    ivf = loaded.index.segments[0].index
+    ivf.nprobe = ivf.nlist  # exhaustive, so the check is exact
+    assert loaded.similarity_search("text 42", k=1)[0].page_content == "text 42"
+
+# =================================================================
+# Segmented (append-only) persistence and compaction
+# =================================================================
+
+import faiss
+from utils.faiss_segments import Segment, SegmentedIndex, plan_merge, read_manifest, segments_dir
+from utils.faiss_store import compact_index
+
+def _append(tmp_path, embeddings, texts):
+    vs = load_faiss(tmp_path, embeddings, mmap=True, for_write=True)
+    vs.add_texts(texts)
+    save_faiss(vs, tmp_path)
+
+def test_append_writes_one_new_segment_and_leaves_old_files(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(TEXTS, embeddings), tmp_path)
+    first = segments_dir(tmp_path) / read_manifest(tmp_path)["segments"][0]["name"]
+    before = first.stat().st_mtime_ns
+
+    _append(tmp_path, embeddings, ["epsilon"])
+    manifest = read_manifest(tmp_path)
+    assert [s["ntotal"] for s in manifest["segments"]] == [4, 1]
+    assert first.stat().st_mtime_ns == before
+    assert not (tmp_path / "index.faiss").exists()
+
+    vs = load_faiss(tmp_path, embeddings, mmap=True)
+    assert isinstance(vs.index, SegmentedIndex) and vs.index.ntotal == 5
+    assert vs.similarity_search("epsilon", k=1)[0].page_content == "epsilon"
+    assert vs.similarity_search("beta", k=1)[0].page_content == "beta"
+
+def test_fan_out_matches_a_single_flat_index():
+    x = _vectors(300)
+    parts = []
+    for i, part in enumerate(np.array_split(x, 5)):
+        index = faiss.IndexFlatL2(32)
+        index.add(part)
+        parts.append(Segment(f"seg-{i}", index))
+    seg = SegmentedIndex(32, parts)
+    flat = faiss.IndexFlatL2(32)
+    flat.add(x)
+    d1, i1 = seg.search(x[:10], 7)
+    d2, i2 = flat.search(x[:10], 7)
+    assert (i1 == i2).all() and np.allclose(d1, d2, atol=1e-4)
+    assert np.allclose(seg.reconstruct(123), x[123])
+
+def test_plan_merge_is_tiered():
+    assert plan_merge([100, 5, 5], max_segments=8) is None
+    assert plan_merge([1000, 10, 10, 10], max_segments=3) == (1, 4)  # base is left alone
+    assert plan_merge([20, 10, 10, 10], max_segments=3) == (0, 4)
+
+def test_compaction_merges_segments_and_keeps_positions(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(["t0"], embeddings), tmp_path)
+    for i in range(1, 11):
+        _append(tmp_path, embeddings, [f"t{i}"])
+    compact_index(tmp_path)
+    manifest = read_manifest(tmp_path)
+    assert len(manifest["segments"]) <= 8
+    assert sum(s["ntotal"] for s in manifest["segments"]) == 11
+    on_disk = {p.name for p in segments_dir(tmp_path).glob("seg-*.faiss")}
+    assert on_disk == {s["name"] for s in manifest["segments"]}
+
+    vs = load_faiss(tmp_path, embeddings, mmap=True)
+    for i in (0, 5, 10):
+        assert vs.similarity_search(f"t{i}", k=1)[0].page_content == f"t{i}"
+
+# =================================================================
+# Document-level deletes: tombstones and purge
+# =================================================================
+
+import utils.faiss_store as faiss_store
+from utils.faiss_segments import read_tombstones, tombstones_path
+from utils.faiss_store import purge_index, tombstone_sources
+
+def _two_sources(tmp_path, embeddings):
+    texts = ["a one", "a two", "b one", "b two"]
+    metadatas = [{"file_name": "a.pdf"}] * 2 + [{"file_name": "b.pdf"}] * 2
+    save_faiss(FAISS.from_texts(texts, embeddings, metadatas=metadatas), tmp_path)
+    return load_faiss(tmp_path, embeddings, mmap=True, for_write=True)
+
+def test_deleted_source_is_hidden_until_purged(tmp_path, embeddings, monkeypatch):
+    # Purge by hand below; the background purge the delete schedules would race it
+    monkeypatch.setattr(faiss_store, "schedule_compaction", lambda *args: None)
+    vs = _two_sources(tmp_path, embeddings)
+    stats = tombstone_sources(vs, tmp_path, ["a.pdf"])
+    assert stats == {"chunks_deleted": 2, "tombstones": 2}
+    assert vs.docstore.sources() == {"b.pdf": 2}
+
+    reader = load_faiss(tmp_path, embeddings, mmap=True)
+    hits = reader.similarity_search("a one", k=4)
+    assert {h.page_content for h in hits} == {"b one", "b two"}
+
+    assert purge_index(tmp_path, min_dead_ratio=0) == 2
+    assert not tombstones_path(tmp_path).exists()
+    reader = load_faiss(tmp_path, embeddings, mmap=True)
+    assert reader.index.ntotal == 2 and len(reader.docstore) == 2
+
+    # Purged positions are never handed out again
+    _append(tmp_path, embeddings, ["c one"])
+    reader = load_faiss(tmp_path, embeddings, mmap=True)
+    assert reader.index_to_docstore_id[4] is not None
+    assert reader.similarity_search("c one", k=1)[0].page_content == "c one"
+    assert reader.similarity_search("b two", k=1)[0].page_content == "b two"
+
+@pytest.mark.parametrize("kind", ["hnsw", "ivf_flat"])
+def test_tombstones_exclude_ids_in_ann_segments(kind):
+    x = _vectors(2000)
+    s = index_settings({"type": kind, "min_train_vectors": 1000})
+    index = faiss.IndexIDMap2(new_index(32, x, s))
+    index.add_with_ids(x, np.arange(100, 2100))
+    seg = SegmentedIndex(32, [Segment("seg-1", index, 100)], next_id=2100)
+    dead = np.arange(100, 150)
+    seg.set_tombstones(dead)
+
+    _, ids = seg.search(x[:50], 5)
+    assert not np.isin(ids, dead).any()
+    assert (ids[:, 0] != -1).all()
+
+# =================================================================
+# Quantized segments with full-precision rescoring (faiss_db.quantization)
+# =================================================================
+
+from utils.faiss_segments import full_vectors_path
+from utils.faiss_store import segment_builder
+
+def _quantized(tmp_path, kind, n=600):
+    x = _vectors(n)
+    seg = SegmentedIndex.from_index(faiss.IndexFlatL2(32))
+    seg.add(x)
+    seg.flush(tmp_path, build=segment_builder(index_settings({"type": "flat"}), {"type": kind, "rescore_factor": 8}))
+    return x, seg
+
+@pytest.mark.parametrize("kind", ["fp16", "sq8", "binary"])
+def test_quantized_segments_rescore_against_full_precision(tmp_path, kind):
+    x, seg = _quantized(tmp_path, kind)
+    entry = read_manifest(tmp_path)["segments"][0]
+    assert entry["codes"] == kind
+    assert full_vectors_path(segments_dir(tmp_path), entry["name"]).exists()
+
+    loaded = SegmentedIndex.load(tmp_path, "index", lambda p: faiss.read_index(str(p)))
+    loaded.rescore_factor = 8
+    flat = faiss.IndexFlatL2(32)
+    flat.add(x)
+    d1, i1 = loaded.search(x[:20], 5)
+    d2, i2 = flat.search(x[:20], 5)
+    assert (i1[:, 0] == i2[:, 0]).all()
+    assert np.allclose(d1[:, 0], d2[:, 0], atol=1e-4)  # exact distances, not code distances
+    assert np.array_equal(loaded.reconstruct(7), x[7])
+
+    loaded.set_tombstones(np.arange(10))
+    _, ids = loaded.search(x[:10], 5)
+    assert not np.isin(ids, np.arange(10)).any()
+
+def test_index_memory_counts_binary_segments_as_heap(tmp_path):
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from utils.faiss_store import index_memory, read_index
+
+    _quantized(tmp_path, "binary")
+    seg = SegmentedIndex(32)
+    seg.add(_vectors(10))
+    seg.flush(tmp_path, build=segment_builder(index_settings({"type": "flat"}), {"type": "none"}))
+    loaded = SegmentedIndex.load(tmp_path, "index", lambda p: read_index(p, mmap=True))
+    heap, mapped = index_memory(FAISS(None, loaded, InMemoryDocstore(), {}), tmp_path)
+    sizes = [os.path.getsize(segments_dir(tmp_path) / e["name"]) for e in read_manifest(tmp_path)["segments"]]
+    assert (heap, mapped) == (sizes[0], sizes[1])  # binary codes are read into memory, flat is mapped
+
+def test_compacting_quantized_segments_keeps_full_precision(tmp_path):
+    from utils.faiss_segments import compact
+
+    x = _vectors(40)
+    seg = SegmentedIndex(32)
+    build = segment_builder(index_settings({"type": "flat"}), {"type": "sq8", "rescore_factor": 4})
+    for part in np.array_split(x, 4):
+        seg.add(part)
+        seg.flush(tmp_path, build=build)
+    assert compact(tmp_path, "index", read=lambda p: faiss.read_index(str(p)), build=build, max_segments=2)
+
+    loaded = SegmentedIndex.load(tmp_path, "index", lambda p: faiss.read_index(str(p)))
+    assert len(loaded.segments) <= 2
+    assert np.array_equal(loaded.reconstruct_n(0, 40), x)
+    on_disk = {p.name for p in segments_dir(tmp_path).iterdir()}
+    expected = {s["name"] for s in read_manifest(tmp_path)["segments"]}
+    assert on_disk == expected | {full_vectors_path(segments_dir(tmp_path), n).name for n in expected}
+
+# =================================================================
+# Shared tenant index: session-scoped (pre-filtered) search
+# =================================================================
+
+from utils.faiss_segments import ScopedIndex
+from utils.faiss_store import scoped_vectorstore
+
+def _session_docs(session, n):
+    return [f"{session} doc {i}" for i in range(n)], [{"session_id": session, "file_name": "f.txt"}] * n
+
+def test_scoped_search_only_returns_the_sessions_chunks(tmp_path, embeddings):
+    texts, metadatas = _session_docs("s1", 5)
+    save_faiss(FAISS.from_texts(texts, embeddings, metadatas=metadatas), tmp_path)
+    vs = load_faiss(tmp_path, embeddings, for_write=True)
+    texts, metadatas = _session_docs("s2", 5)
+    vs.add_texts(texts, metadatas=metadatas)
+    save_faiss(vs, tmp_path)
+
+    reader = load_faiss(tmp_path, embeddings, mmap=True)
+    scoped = scoped_vectorstore(reader, ["s2"])
+    hits = scoped.similarity_search("s1 doc 3", k=10)
+    assert len(hits) == 5 and all(h.metadata["session_id"] == "s2" for h in hits)
+    # s2 owns its segment outright, so that segment is searched without a selector
+    scope = scoped.index._scope
+    assert list(scope) == [5] and scope[5][0] is None
+
+def test_scope_spanning_a_shared_segment_uses_a_selector():
+    x = _vectors(100)
+    index = faiss.IndexFlatL2(32)
+    index.add(x)
+    seg = SegmentedIndex(32, [Segment("seg-1", index)])
+    allowed = np.arange(0, 100, 3)
+    _, ids = ScopedIndex(seg, allowed).search(x[:20], 4)
+    assert np.isin(ids, allowed).all()
+    assert (ids[::3, 0] == np.arange(0, 20, 3)).all()  # allowed queries still find themselves
+
+# =================================================================
+# Tests for the ingestion-time lexical (BM25) index (utils/lexical_index.py)
+# =================================================================
+
+from utils.lexical_index import LexicalIndex, add_lexical_batch, lexical_manifest_path, tokenize
+
+
+def test_tokenizer_keeps_identifiers_whole():
+    tokens = tokenize("See Clause 7.2(b) of the spec for part PN-4471-B.")
+    assert {"7.2", "pn-4471-b", "4471", "clause"} <= set(tokens)
+    assert "the" not in tokens and "of" not in tokens
+
+
+def test_lexical_segments_merge_and_drop_dead_positions(tmp_path):
+    batches = [["pump housing PN-4471-B", "valve seat"], ["clause 7.2 warranty"], ["gasket kit"], ["pump seal"]]
+    start = 0
+    for texts in batches:
+        add_lexical_batch(tmp_path, texts, range(start, start + len(texts)), max_segments=2,
+                          live=lambda: np.array([0, 2, 3, 4]))  # position 1 was deleted
+        start += len(texts)
+
+    assert lexical_manifest_path(tmp_path).exists()
+    lexical = LexicalIndex.load(tmp_path)
+    assert len(lexical.segments) <= 2
+    assert lexical.search("PN-4471-B", k=3)[0][0] == 0
+    assert lexical.search("clause 7.2", k=3)[0][0] == 2
+    assert lexical.search("valve", k=3) == []
+    assert [p for p, _ in lexical.search("pump", k=5)] in ([0, 4], [4, 0])
+    assert [p for p, _ in lexical.search("pump", k=5, exclude=np.array([4]))] == [0]
+
+# =================================================================
+# Vectorized maximal marginal relevance (utils/mmr.py)
+# =================================================================
+
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from utils.mmr import mmr_select
+
+def test_mmr_select_skips_near_duplicates():
+    a = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    candidates = np.stack([a, a + [0.0, 0.01, 0.0], np.array([0.6, 0.8, 0.0], dtype=np.float32)])
+    assert mmr_select(a, candidates, k=2, lambda_mult=0.3) == [0, 2]
+    assert mmr_select(a, candidates, k=2, lambda_mult=1.0) == [0, 1]
+
+def test_mmr_select_matches_langchain_reference():
+    x = _vectors(50, dim=64)
+    q = _vectors(1, dim=64)[0] + 0.1
+    for lam in (0.2, 0.5, 0.8):
+        assert mmr_select(q, x, k=8, lambda_mult=lam) == maximal_marginal_relevance(q, list(x), lambda_mult=lam, k=8)
+
+# =================================================================
+# Batched similarity search for /chat/query/batch
+# =================================================================
+
+from utils.faiss_store import similarity_search_batch
+
+def test_similarity_search_batch_matches_per_query_search(tmp_path, embeddings):
+    save_faiss(FAISS.from_texts(TEXTS, embeddings, metadatas=[{"n": i} for i in range(4)]), tmp_path)
+    vs = load_faiss(tmp_path, embeddings, mmap=True)
+    queries = ["gamma", "alpha", "zeta"]
+    batched = similarity_search_batch(vs, np.array(embeddings.embed_documents(queries)), k=2)
+    assert batched == [vs.similarity_search(q, k=2) for q in queries]
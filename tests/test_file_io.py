@@ -0,0 +1,60 @@
+# tests/test_file_io.py
+
+import os
+import sys
+import hashlib
+import tracemalloc
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.file_io import copy_upload, save_uploaded_files, UploadBudget, UploadTooLarge
+
+# =================================================================
+# Tests for streaming upload handling (utils/file_io.py)
+# =================================================================
+
+class FileUpload:
+    """Mimics FastAPIFileAdapter: .name + .open() over an on-disk spooled file."""
+    def __init__(self, path, name):
+        self._path = path
+        self.name = name
+        self._fh = None
+
+    def open(self):
+        self._fh = open(self._path, "rb")
+        return self._fh
+
+@pytest.fixture
+def big_file(tmp_path):
+    path = tmp_path / "big.bin"
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(16):
+            f.write(block)
+    return path
+
+def test_copy_hashes_on_the_fly_with_constant_memory(tmp_path, big_file):
+    out = tmp_path / "out.pdf"
+    tracemalloc.start()
+    size, sha = copy_upload(FileUpload(big_file, "big.pdf"), out, chunk_size=64 * 1024, max_bytes=10**9)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert size == 16 * 1024 * 1024
+    assert sha == hashlib.sha256(big_file.read_bytes()).hexdigest()
+    assert out.read_bytes() == big_file.read_bytes()
+    assert peak < 1024 * 1024, f"peak {peak} bytes should be ~one chunk, not the file"
+
+def test_file_limit_is_enforced_mid_stream(tmp_path, big_file):
+    out = tmp_path / "out.pdf"
+    with pytest.raises(UploadTooLarge):
+        copy_upload(FileUpload(big_file, "big.pdf"), out, chunk_size=64 * 1024, max_bytes=1024 * 1024)
+    assert not out.exists(), "partial file must be removed"
+
+def test_request_budget_spans_files(tmp_path, big_file):
+    uploads = [FileUpload(big_file, "a.pdf"), FileUpload(big_file, "b.pdf")]
+    with pytest.raises(UploadTooLarge):
+        save_uploaded_files(uploads, tmp_path / "session", budget=UploadBudget(max_bytes=20 * 1024 * 1024))
@@ -0,0 +1,76 @@
+# tests/test_job_queue.py
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from exception.custom_exception import DocumentPortalException
+from utils.job_queue import JobQueue, QueueFull
+
+# =================================================================
+# Tests for the background job queue (utils/job_queue.py)
+# =================================================================
+
+def _wait_for(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("succeeded", "failed", "cancelled"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_job_reports_progress_and_result(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_workers=1)
+
+    def work(ctx, n):
+        ctx.update(pages_parsed=n)
+        ctx.update(vectors_indexed=n * 2)
+        return {"ok": True}
+
+    job = _wait_for(queue, queue.submit("test", work, 3))
+    assert job["status"] == "succeeded"
+    assert job["progress"] == {"pages_parsed": 3, "vectors_indexed": 6}
+    assert job["result"] == {"ok": True}
+
+def test_running_job_stops_at_next_update_after_cancel(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_workers=1)
+    started = threading.Event()
+
+    def work(ctx):
+        started.set()
+        for i in range(500):
+            try:
+                ctx.update(step=i)
+            except Exception as e:
+                # Mirrors ChatIngestor, which wraps every failure
+                raise DocumentPortalException("Failed to build retriever", e) from e
+            time.sleep(0.01)
+
+    job_id = queue.submit("test", work)
+    started.wait(2)
+    assert queue.cancel(job_id)
+    job = _wait_for(queue, job_id)
+    assert job["status"] == "cancelled"
+    assert job["progress"]["step"] < 499
+
+def test_failed_job_records_error_and_pending_limit_applies(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_workers=1, max_pending=1)
+    gate = threading.Event()
+
+    def blocked(ctx):
+        gate.wait(5)
+        raise ValueError("boom")
+
+    job_id = queue.submit("test", blocked)
+    with pytest.raises(QueueFull):
+        queue.submit("test", blocked)
+    gate.set()
+    job = _wait_for(queue, job_id)
+    assert job["status"] == "failed" and "boom" in job["error"]
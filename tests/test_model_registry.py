@@ -0,0 +1,54 @@
+# tests/test_model_registry.py
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.model_loader import ModelRegistry
+
+# =================================================================
+# Tests for the process-wide model registry (utils/model_loader.py)
+# =================================================================
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    """A fresh registry with a dummy key so no real credentials are needed."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test-dummy-key")
+    monkeypatch.setenv("LLM_PROVIDER", "openai")
+    reg = ModelRegistry()
+    reg.loader.config["embedding_cache"] = {"enabled": True, "db_path": str(tmp_path / "emb.sqlite")}
+    yield reg
+    reg.clear()
+
+def test_llm_is_created_once(registry):
+    """Repeated lookups return the same client and count as hits."""
+    first = registry.load_llm()
+    second = registry.load_llm()
+    assert first is second
+    assert registry.stats() == {"hits": 1, "misses": 1, "clients": 1}
+
+def test_embeddings_and_llm_are_keyed_separately(registry):
+    """LLM and embedding clients live under different keys but share one HTTP pool."""
+    llm = registry.load_llm()
+    emb = registry.load_embeddings()
+    assert llm is not emb
+    assert registry.stats()["clients"] == 2
+    while hasattr(emb, "inner"):  # cache / batching wrappers
+        emb = emb.inner
+    assert llm.http_client is emb.http_client
+
+def test_concurrent_lookups_create_single_client(registry):
+    """Racing threads must not build duplicate clients."""
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.load_llm())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(r) for r in results}) == 1
+    assert registry.misses == 1 and registry.hits == 7
@@ -0,0 +1,86 @@
+# tests/test_page_diff.py
+
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models import FakeListChatModel
+from utils.page_diff import ADDED, CHANGED, REMOVED, UNCHANGED, align_pages, changed_pages_text
+from src.document_compare import document_comparator
+
+# =================================================================
+# Tests for the page-hash diff engine (utils/page_diff.py) and /compare's use of it
+# =================================================================
+
+def _document(n, total=None):
+    total = total or n
+    return [f"Section {i}\nThe supplier delivers item {i} within 30 days.\nWarranty {i} applies.\nPage {i + 1} of {total}"
+            for i in range(n)]
+
+def _revision():
+    reference = _document(6)
+    actual = reference[:2] + ["Annex X\nA brand new page about returns."] + reference[2:]
+    # The insert renumbers every later footer; page 5 of the reference is also edited
+    actual = [t.replace(" of 6", " of 7").replace(f"Page {i} of", f"Page {i + 1} of") if i >= 3 else t
+              for i, t in enumerate(actual)]
+    actual[5] = actual[5].replace("30 days", "45 days")
+    return reference, actual
+
+def test_insert_shifting_page_numbers_only_flags_real_changes():
+    reference, actual = _revision()
+    pairs = align_pages(reference, actual)
+    assert [(p.status, p.reference, p.actual) for p in pairs] == [
+        (UNCHANGED, 1, 1), (UNCHANGED, 2, 2), (ADDED, None, 3), (UNCHANGED, 3, 4),
+        (UNCHANGED, 4, 5), (CHANGED, 5, 6), (UNCHANGED, 6, 7),
+    ]
+    assert pairs[5].label == "5 -> 6"
+
+def test_dissimilar_pages_are_removed_and_added_not_paired():
+    pairs = align_pages(["alpha beta\ngamma"], ["completely\ndifferent"])
+    assert [p.status for p in pairs] == [REMOVED, ADDED]
+
+def test_only_changed_pages_are_sent_as_line_diffs():
+    reference, actual = _revision()
+    text = changed_pages_text(align_pages(reference, actual), reference, actual)
+    assert "--- Page new -> 3 (added) ---" in text and "--- Page 5 -> 6 (changed) ---" in text
+    assert "-The supplier delivers item 4 within 30 days." in text
+    assert "+The supplier delivers item 4 within 45 days." in text
+    assert "item 0" not in text and "Page 1 of" not in text
+
+class RecordingLLM(FakeListChatModel):
+    prompts: list = []
+
+    def _call(self, messages, *args, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return super()._call(messages, *args, **kwargs)
+
+def test_comparator_answers_unchanged_pages_locally(monkeypatch):
+    answer = [{"Page": "new -> 3", "Changes": "Returns annex added"},
+              {"Page": "Page 5 -> 6", "Changes": "Delivery time 30 -> 45 days"}]
+    llm = RecordingLLM(responses=[json.dumps(answer)])
+    llm.prompts = []
+    monkeypatch.setattr(document_comparator.MODEL_REGISTRY, "load_llm", lambda: llm)
+    reference, actual = _revision()
+
+    df, stats = asyncio.run(document_comparator.DocumentComparator().acompare_pages(reference, actual))
+
+    assert stats["pages_unchanged"] == 5 and stats["pages_sent"] == 2
+    assert len(llm.prompts) == 1 and "item 0" not in llm.prompts[0]
+    rows = df.to_dict(orient="records")
+    assert [r["Page"] for r in rows] == ["1", "2", "new -> 3", "3 -> 4", "4 -> 5", "5 -> 6", "6 -> 7"]
+    assert rows[5]["Changes"] == "Delivery time 30 -> 45 days"
+    assert sum(r["Changes"] == "NO CHANGE" for r in rows) == 5
+
+def test_identical_documents_skip_the_llm(monkeypatch):
+    llm = RecordingLLM(responses=["[]"])
+    llm.prompts = []
+    monkeypatch.setattr(document_comparator.MODEL_REGISTRY, "load_llm", lambda: llm)
+    df, stats = asyncio.run(document_comparator.DocumentComparator().acompare_pages(_document(3), _document(3)))
+    assert llm.prompts == [] and stats["pages_sent"] == 0
+    assert set(df["Changes"]) == {"NO CHANGE"}
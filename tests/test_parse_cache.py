@@ -0,0 +1,80 @@
+# tests/test_parse_cache.py
+
+import os
+import sys
+
+import fitz
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.schema import Document
+from utils import document_loaders
+from utils.parse_cache import ParseCache
+
+# =================================================================
+# Tests for the parsed-text cache (utils/parse_cache.py)
+# =================================================================
+
+def _write_pdf(path, pages, word="page"):
+    with fitz.open() as doc:
+        for i in range(pages):
+            doc.new_page().insert_text((72, 72), f"{word} {i + 1}")
+        doc.save(str(path))
+    return path
+
+class CountingParser:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        for i in range(self.pages):
+            yield Document(page_content=f"text {i}", metadata={"source": "elsewhere", "page": i})
+
+def test_same_bytes_are_parsed_once_whatever_the_path(tmp_path):
+    cache = ParseCache(tmp_path / "parse.sqlite")
+    a, b = tmp_path / "a.pdf", tmp_path / "copy.pdf"
+    a.write_bytes(b"%PDF- same bytes")
+    b.write_bytes(b"%PDF- same bytes")
+    parse = CountingParser(3)
+
+    first = list(cache.load(a, "pdf:x@1", parse))
+    second = list(cache.load(b, "pdf:x@1", parse))
+
+    assert parse.calls == 1
+    assert [d.page_content for d in second] == [d.page_content for d in first]
+    assert [d.metadata for d in second] == [{"page": i, "source": str(b)} for i in range(3)]
+    assert cache.stats()["hits"] == 1 and cache.stats()["files"] == 1
+
+def test_parser_version_and_partial_parses_are_misses(tmp_path):
+    cache = ParseCache(tmp_path / "parse.sqlite")
+    f = tmp_path / "f.txt"
+    f.write_text("hello")
+    parse = CountingParser(200)
+
+    next(iter(cache.load(f, "txt:x@1", parse)))  # abandoned after the first page
+    list(cache.load(f, "txt:x@1", parse))
+    list(cache.load(f, "txt:x@2", parse))
+    assert parse.calls == 3
+    assert len(list(cache.load(f, "txt:x@1", parse))) == 200 and parse.calls == 3
+
+def test_trim_evicts_least_recently_used_files(tmp_path):
+    cache = ParseCache(tmp_path / "parse.sqlite", max_bytes=1)
+    for name in ("old", "new"):
+        (tmp_path / name).write_text(name)
+        list(cache.load(tmp_path / name, "txt:x@1", CountingParser(1)))
+    assert cache.stats()["files"] == 0 and cache.stats()["evictions"] == 2
+
+def test_analyze_compare_and_chat_share_entries(tmp_path, monkeypatch):
+    cache = ParseCache(tmp_path / "parse.sqlite")
+    monkeypatch.setattr(document_loaders, "get_parse_cache", lambda: cache)
+    pdf = _write_pdf(tmp_path / "doc.pdf", 3)
+
+    texts = document_loaders.pdf_page_texts(pdf)              # /analyze, /compare
+    docs = list(document_loaders.load_file(pdf))              # chat ingestion (pymupdf default)
+    assert [d.page_content for d in docs] == texts
+    assert docs[1].metadata["page"] == 1 and docs[1].metadata["source"] == str(pdf)
+    assert (cache.misses, cache.hits) == (1, 1)
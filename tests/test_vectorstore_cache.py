@@ -0,0 +1,183 @@
+# tests/test_vectorstore_cache.py
+
+import os
+import sys
+import time
+
+import pytest
+
+# Add the project root to the Python path to allow for absolute imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from utils.vectorstore_cache import VectorStoreCache
+
+# =================================================================
+# Tests for the loaded-vectorstore cache (utils/vectorstore_cache.py)
+# =================================================================
+
+@pytest.fixture
+def embeddings():
+    return DeterministicFakeEmbedding(size=16)
+
+def _build_index(path, embeddings, texts):
+    FAISS.from_texts(texts, embeddings).save_local(str(path))
+
+def test_warm_lookup_is_a_hit(tmp_path, embeddings):
+    _build_index(tmp_path, embeddings, ["alpha", "beta"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60)
+    first = cache.get(tmp_path, embeddings)
+    second = cache.get(tmp_path, embeddings)
+    assert first is second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_new_version_on_disk_is_reloaded(tmp_path, embeddings):
+    _build_index(tmp_path, embeddings, ["alpha"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60)
+    assert cache.get(tmp_path, embeddings).index.ntotal == 1
+    time.sleep(0.01)
+    _build_index(tmp_path, embeddings, ["alpha", "beta", "gamma"])
+    assert cache.get(tmp_path, embeddings).index.ntotal == 3
+
+def test_memory_budget_evicts_least_recently_used(tmp_path, embeddings):
+    a, b = tmp_path / "a", tmp_path / "b"
+    _build_index(a, embeddings, ["alpha"])
+    _build_index(b, embeddings, ["beta"])
+    cache = VectorStoreCache(max_bytes=1, ttl_seconds=60)
+    cache.get(a, embeddings)
+    cache.get(b, embeddings)
+    assert cache.stats()["entries"] == 1 and cache.stats()["evictions"] == 1
+
+def test_idle_entries_expire(tmp_path, embeddings):
+    _build_index(tmp_path, embeddings, ["alpha"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=0)
+    cache.get(tmp_path, embeddings)
+    time.sleep(0.01)
+    cache.get(tmp_path, embeddings)
+    assert cache.stats()["misses"] == 2
+
+def test_mmapped_entries_do_not_count_against_budget(tmp_path, embeddings):
+    from utils.faiss_store import save_faiss
+    save_faiss(FAISS.from_texts(["alpha", "beta"], embeddings), tmp_path)
+    cache = VectorStoreCache(max_bytes=1, ttl_seconds=60, mmap=True)
+    cache.get(tmp_path, embeddings)
+    stats = cache.stats()
+    assert stats["bytes"] == 0 and stats["mapped_bytes"] > 0
+
+def test_retrievers_are_cached_by_unhashable_search_kwargs(tmp_path, embeddings):
+    _build_index(tmp_path, embeddings, ["alpha", "beta"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60)
+    kwargs = {"k": 1, "filter": {"source": "a.pdf"}}
+    first = cache.get_retriever(tmp_path, embeddings, search_kwargs=kwargs)
+    assert cache.get_retriever(tmp_path, embeddings, search_kwargs=dict(reversed(kwargs.items()))) is first
+
+def test_unmapped_fallback_counts_against_budget(tmp_path, embeddings, monkeypatch):
+    import faiss
+    from utils.faiss_store import save_faiss
+    save_faiss(FAISS.from_texts(["alpha", "beta"], embeddings), tmp_path)
+    read = faiss.read_index
+
+    def no_mmap(path, *flags):
+        if flags:
+            raise RuntimeError("mmap not supported for this index type")
+        return read(path)
+
+    monkeypatch.setattr(faiss, "read_index", no_mmap)
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60, mmap=True)
+    cache.get(tmp_path, embeddings)
+    stats = cache.stats()
+    assert stats["bytes"] > 0 and stats["mapped_bytes"] == 0
+
+def _session_index(path, embeddings, sessions):
+    import gc
+    from utils.faiss_store import save_faiss
+    texts = [f"{s} doc" for s in sessions]
+    save_faiss(FAISS.from_texts(texts, embeddings, metadatas=[{"session_id": s} for s in sessions]), path)
+    gc.collect()  # close the writer's sqlite connection now: its WAL checkpoint would change the stamp mid-test
+
+def test_scoped_retrievers_are_capped_per_entry(tmp_path, embeddings):
+    _session_index(tmp_path, embeddings, ["s1", "s2", "s3"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60, max_retrievers=2)
+    first = cache.get_retriever(tmp_path, embeddings, sessions=["s1"])
+    cache.get_retriever(tmp_path, embeddings, sessions=["s2"])
+    assert cache.get_retriever(tmp_path, embeddings, sessions=["s1"]) is first  # refreshed: s2 is now oldest
+    cache.get_retriever(tmp_path, embeddings, sessions=["s3"])
+
+    entry = next(iter(cache._entries.values()))
+    assert [k[2] for k in entry.retrievers] == [("s1",), ("s3",)]
+
+def test_scoped_retriever_is_built_outside_the_cache_lock(tmp_path, embeddings, monkeypatch):
+    import threading
+    import utils.vectorstore_cache as vectorstore_cache
+
+    _session_index(tmp_path, embeddings, ["s1"])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60)
+    building, release = threading.Event(), threading.Event()
+    scoped = vectorstore_cache.scoped_vectorstore
+
+    def slow_scope(vs, sessions):
+        building.set()
+        release.wait(5)
+        return scoped(vs, sessions)
+
+    monkeypatch.setattr(vectorstore_cache, "scoped_vectorstore", slow_scope)
+    worker = threading.Thread(target=cache.get_retriever, args=(tmp_path, embeddings), kwargs={"sessions": ["s1"]})
+    worker.start()
+    assert building.wait(5)
+    stats = {}
+    reader = threading.Thread(target=lambda: stats.update(cache.stats()))
+    reader.start()
+    reader.join(1)
+    assert stats["entries"] == 1  # served while the scope was still being built
+    release.set()
+    worker.join(5)
+
+def test_new_lexical_segment_changes_the_stamp(tmp_path, embeddings):
+    from utils.lexical_index import add_lexical_batch
+    from utils.vectorstore_cache import index_stamp
+
+    _session_index(tmp_path, embeddings, ["s1", "s2"])
+    add_lexical_batch(tmp_path, ["s1 doc", "s2 doc"], [0, 1])
+    before = index_stamp(tmp_path)
+    add_lexical_batch(tmp_path, ["s3 doc"], [2])
+    assert index_stamp(tmp_path) != before
+
+def test_lexical_index_loads_outside_the_cache_lock(tmp_path, embeddings, monkeypatch):
+    import threading
+    from utils.lexical_index import LexicalIndex, add_lexical_batch
+
+    _session_index(tmp_path, embeddings, ["s1", "s2"])
+    add_lexical_batch(tmp_path, ["s1 doc", "s2 doc"], [0, 1])
+    cache = VectorStoreCache(max_bytes=10**9, ttl_seconds=60)
+    cache.get(tmp_path, embeddings)
+    loading, release = threading.Event(), threading.Event()
+    load = LexicalIndex.load
+
+    def slow_load(*args):
+        loading.set()
+        release.wait(5)
+        return load(*args)
+
+    monkeypatch.setattr(LexicalIndex, "load", slow_load)
+    worker = threading.Thread(target=cache.get_retriever, args=(tmp_path, embeddings), kwargs={"search_type": "hybrid"})
+    worker.start()
+    assert loading.wait(5)
+    stats = {}
+    reader = threading.Thread(target=lambda: stats.update(cache.stats()))
+    reader.start()
+    reader.join(1)
+    assert stats["entries"] == 1
+    bytes_before = stats["bytes"]
+    release.set()
+    worker.join(5)
+    assert cache.stats()["bytes"] > bytes_before  # postings published into the entry's budget
+
+def test_load_locks_do_not_grow_with_the_number_of_indexes(tmp_path, embeddings):
+    cache = VectorStoreCache(max_bytes=1, ttl_seconds=60)
+    stripes = len(cache._load_locks)
+    for i in range(stripes + 8):
+        _build_index(tmp_path / str(i), embeddings, [f"doc {i}"])
+        cache.get(tmp_path / str(i), embeddings)
+    assert len(cache._load_locks) == stripes
+    assert cache._load_lock(cache._key(tmp_path / "0", "index")) is cache._load_lock(cache._key(tmp_path / "0", "index"))
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import os
+import re
+import time
+import uuid
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from exception.custom_exception import DocumentPortalException
+from utils.file_io import SUPPORTED_EXTENSIONS, UploadBudget, UploadTooLarge, copy_upload
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UnknownBlobs(LookupError):
+    """Hashes a client referenced that the store does not hold."""
+    def __init__(self, hashes: List[str]):
+        self.hashes = hashes
+        super().__init__(f"Unknown blob hashes: {hashes}")
+
+
+def is_sha256(value: str) -> bool:
+    return bool(_SHA256_RE.match(value or ""))
+
+
+class BlobStore:
+    """
+    Content-addressed upload store shared by all sessions.
+
+    Each unique file is stored once as <root>/<sha[:2]>/<sha><ext>; sessions only hold
+    references (sha256 + original file name) in <root>/blobs.sqlite. Identical uploads
+    therefore resolve to the same path, which downstream caches key on.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "blobs.sqlite"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS refs (
+                    session_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, sha256)
+                )"""
+            )
+
+    # ---------- Public API ----------
+
+    def put(self, uploaded_file, budget: Optional[UploadBudget] = None) -> Dict[str, Any]:
+        """Stream an upload into the store; an already-known blob is not written twice."""
+        name = getattr(uploaded_file, "name", "file")
+        ext = Path(name).suffix.lower()
+        tmp = self.tmp_dir / f"{uuid.uuid4().hex}{ext}"
+        size, sha256 = copy_upload(uploaded_file, tmp, budget=budget)
+
+        path = self._blob_path(sha256, ext)
+        deduped = path.exists()
+        if deduped:
+            os.remove(tmp)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)  # atomic: readers never see a partial blob
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, ext, size, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, ext, size, time.time()),
+            )
+        log.info("Blob stored", sha256=sha256, uploaded=name, bytes=size, deduped=deduped)
+        return {"sha256": sha256, "path": path, "name": name, "size": size, "deduped": deduped}
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Blob info for a hash, or None if the store does not have it."""
+        if not is_sha256(sha256):
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT sha256, ext, size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        path = self._blob_path(row["sha256"], row["ext"])
+        if not path.exists():
+            return None
+        return {"sha256": row["sha256"], "path": path, "size": row["size"]}
+
+    def exists(self, sha256: str) -> bool:
+        return self.get(sha256) is not None
+
+    def add_ref(self, session_id: str, sha256: str, name: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO refs (session_id, sha256, name, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, sha256, name, time.time()),
+            )
+
+    def refs(self, session_id: str) -> Dict[str, str]:
+        """sha256 -> original file name for every blob the session references."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT sha256, name FROM refs WHERE session_id = ?", (session_id,)).fetchall()
+        return {r["sha256"]: r["name"] for r in rows}
+
+    def save_uploads(
+        self,
+        uploaded_files: Iterable,
+        session_id: str,
+        known_hashes: Iterable[str] = (),
+        budget: Optional[UploadBudget] = None,
+    ) -> List[Path]:
+        """
+        Store uploads (and reference already-known blobs by hash) for a session.
+
+        Returns blob paths in input order. Unsupported extensions are skipped;
+        unknown hashes raise UnknownBlobs.
+        """
+        budget = budget or UploadBudget()
+        try:
+            paths: List[Path] = []
+            for uf in uploaded_files:
+                name = getattr(uf, "name", "file")
+                if Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    log.warning("Unsupported file skipped", filename=name)
+                    continue
+                blob = self.put(uf, budget=budget)
+                self.add_ref(session_id, blob["sha256"], name)
+                paths.append(blob["path"])
+
+            missing = []
+            for sha256 in known_hashes:
+                blob = self.get(sha256)
+                if blob is None:
+                    missing.append(sha256)
+                    continue
+                self.add_ref(session_id, sha256, self._any_name(sha256) or blob["path"].name)
+                paths.append(blob["path"])
+            if missing:
+                raise UnknownBlobs(missing)
+
+            log.info("Uploads stored", session_id=session_id, files=len(paths))
+            return paths
+        except (UploadTooLarge, UnknownBlobs):
+            raise
+        except Exception as e:
+            log.error("Failed to store uploads", error=str(e), session_id=session_id)
+            raise DocumentPortalException("Failed to store uploads", e) from e
+
+    # ---------- Internals ----------
+
+    def _blob_path(self, sha256: str, ext: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}{ext}"
+
+    def _any_name(self, sha256: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT name FROM refs WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        return row["name"] if row else None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
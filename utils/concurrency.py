@@ -0,0 +1,86 @@
+from __future__ import annotations
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from utils.config_loader import load_config
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks stay process-local
+    fcntl = None
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """Bounded thread pool for disk/CPU-bound steps that must stay off the event loop."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            cfg = load_config().get("concurrency", {}) or {}
+            workers = int(cfg.get("blocking_workers") or min(32, (os.cpu_count() or 1) + 4))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="blocking")
+            log.info("Blocking executor created", max_workers=workers)
+        return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable in the bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), functools.partial(func, *args, **kwargs))
+
+
+class InterProcessLock:
+    """
+    Reentrant lock shared by this process's threads and, through flock() on path, by
+    every process on the host (uvicorn workers writing one shared index). Only the
+    outermost acquire in this process holds the file lock.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = os.fspath(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._lock.release()
+
+    def __enter__(self) -> "InterProcessLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
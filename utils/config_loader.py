@@ -1,9 +1,30 @@
+import os
+import threading
+
 import yaml
 
+_configs: dict = {}
+_configs_lock = threading.Lock()
+
+
 def load_config(config_path: str = "config/config.yaml") -> dict:
-    with open(config_path, "r") as file:
-        config=yaml.safe_load(file)
-    return config
+    """
+    Parsed config, read from disk once per process (per path). Every *_settings()
+    helper calls this on the request path, so it must not re-parse the file; callers
+    treat the returned dict as read-only. clear_config_cache() makes the next call
+    re-read the file (ModelRegistry.clear() calls it).
+    """
+    key = os.path.abspath(config_path)
+    with _configs_lock:
+        if key not in _configs:
+            with open(config_path, "r") as file:
+                _configs[key] = yaml.safe_load(file)
+        return _configs[key]
+
+
+def clear_config_cache():
+    with _configs_lock:
+        _configs.clear()
 
 
-load_config("config/config.yaml")
\ No newline at end of file
+load_config("config/config.yaml")
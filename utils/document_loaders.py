@@ -0,0 +1,152 @@
+from __future__ import annotations
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import fitz
+import pypdf
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+
+from utils.config_loader import load_config
+from utils.pdf_text import iter_page_texts
+from utils.parse_cache import get_parse_cache
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+# Loaders yield Documents (one per page for PDFs) so callers can stream them
+Loader = Callable[[Path], Iterator[Document]]
+
+# format -> {loader name -> loader}; the first loader registered for a format is its default
+LOADERS: Dict[str, Dict[str, Loader]] = {}
+EXTENSIONS: Dict[str, str] = {}  # ".pdf" -> "pdf"
+MIME_TYPES: Dict[str, str] = {}  # "application/pdf" -> "pdf"
+# (format, loader name) -> version; bump it (or the library it wraps changes it) when output changes,
+# which retires that loader's parse cache entries
+VERSIONS: Dict[tuple, str] = {}
+
+TEXT_BLOCK_CHARS = 1 << 20
+
+
+def register_loader(fmt: str, name: str, extensions: tuple = (), mime_types: tuple = (), version: str = "1"):
+    """Decorator adding a loader for fmt, selectable as document_loaders.<fmt>: <name> in config."""
+    def wrap(fn: Loader) -> Loader:
+        LOADERS.setdefault(fmt, {})[name] = fn
+        VERSIONS[(fmt, name)] = version
+        for ext in extensions:
+            EXTENSIONS[ext] = fmt
+        for mime in mime_types:
+            MIME_TYPES[mime] = fmt
+        return fn
+    return wrap
+
+
+def loader_settings() -> Dict[str, str]:
+    """document_loaders from config: loader name per format (unset formats use the default loader)."""
+    cfg = load_config().get("document_loaders", {}) or {}
+    return {fmt: str(cfg.get(fmt) or next(iter(loaders))) for fmt, loaders in LOADERS.items()}
+
+
+def sniff_mime(path: Path) -> Optional[str]:
+    """MIME type from the file's leading bytes, for the binary formats that have a signature."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(path) as zf:
+                if "word/document.xml" in zf.namelist():
+                    return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        except zipfile.BadZipFile:
+            pass
+    return None
+
+
+def detect_format(path: Path) -> Optional[str]:
+    """Registered format of a file: its content signature wins over its extension."""
+    return MIME_TYPES.get(sniff_mime(path) or "") or EXTENSIONS.get(path.suffix.lower())
+
+
+def get_loader(fmt: str, name: Optional[str] = None) -> Loader:
+    name = name or loader_settings()[fmt]
+    try:
+        return LOADERS[fmt][name]
+    except KeyError:
+        raise ValueError(f"Unknown {fmt} loader {name!r}; available: {', '.join(LOADERS.get(fmt, {}))}") from None
+
+
+@register_loader("pdf", "pymupdf", extensions=(".pdf",), mime_types=("application/pdf",),
+                 version=f"1+mupdf{fitz.VersionBind}")
+def load_pdf_pymupdf(path: Path) -> Iterator[Document]:
+    """
+    One Document per page via PyMuPDF, with PyPDFLoader's page-level metadata
+    (source, total_pages, page, page_label and the document info fields it sets).
+    Long PDFs are extracted over page ranges in the process pool.
+    """
+    with fitz.open(str(path)) as doc:
+        info = {k: v for k, v in (doc.metadata or {}).items() if k in ("producer", "creator", "title", "author") and v}
+        labels = [doc[i].get_label() or str(i + 1) for i in range(doc.page_count)]
+    base = {**info, "source": str(path), "total_pages": len(labels)}
+    for i, text in enumerate(iter_page_texts(path)):
+        yield Document(page_content=text, metadata={**base, "page": i, "page_label": labels[i]})
+
+
+@register_loader("pdf", "pypdf", version=f"1+pypdf{pypdf.__version__}")
+def load_pdf_pypdf(path: Path) -> Iterator[Document]:
+    return PyPDFLoader(str(path)).lazy_load()
+
+
+@register_loader("docx", "docx2txt", extensions=(".docx",),
+                 mime_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",))
+def load_docx(path: Path) -> Iterator[Document]:
+    return Docx2txtLoader(str(path)).lazy_load()
+
+
+@register_loader("txt", "text", extensions=(".txt",), mime_types=("text/plain",))
+def load_text(path: Path) -> Iterator[Document]:
+    """
+    UTF-8 text as Documents of about TEXT_BLOCK_CHARS characters, cut at line ends,
+    so a large file is never held in memory whole (a small one is a single Document).
+    """
+    metadata = {"source": str(path)}
+    with open(path, encoding="utf-8") as f:
+        block, size, blocks = [], 0, 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS:
+                yield Document(page_content="".join(block), metadata=dict(metadata))
+                block, size, blocks = [], 0, blocks + 1
+        if block or not blocks:
+            yield Document(page_content="".join(block), metadata=dict(metadata))
+
+
+@register_loader("txt", "langchain")
+def load_text_langchain(path: Path) -> Iterator[Document]:
+    return TextLoader(str(path), encoding="utf-8").lazy_load()
+
+
+def cached_load(path: Path, fmt: str, name: Optional[str] = None) -> Iterator[Document]:
+    """Documents of path from the named loader, through the parse cache when it is enabled."""
+    name = name or loader_settings()[fmt]
+    loader = get_loader(fmt, name)
+    cache = get_parse_cache()
+    if cache is None:
+        return loader(path)
+    return cache.load(path, f"{fmt}:{name}@{VERSIONS[(fmt, name)]}", lambda: loader(path))
+
+
+def pdf_page_texts(path: str | Path) -> List[str]:
+    """Page texts of a PDF for /analyze and /compare (PyMuPDF, sharing chat ingestion's cache entries)."""
+    return [d.page_content for d in cached_load(Path(path), "pdf", "pymupdf")]
+
+
+def load_file(path: Path) -> Optional[Iterator[Document]]:
+    """Documents of one file (lazily) with its format's configured loader; None when no loader handles it."""
+    fmt = detect_format(path)
+    if fmt is None:
+        return None
+    if fmt != EXTENSIONS.get(path.suffix.lower()):
+        log.info("Format sniffed from content", path=str(path), format=fmt)
+    return cached_load(path, fmt)
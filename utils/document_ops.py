@@ -1,31 +1,46 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Iterable, List
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, TypeVar
 from fastapi import UploadFile
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from utils.config_loader import load_config
+from utils.document_loaders import load_file
 #from logger import GLOBAL_LOGGER as log
 from custom_logging import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
+T = TypeVar("T")
+
+
+def document_batch_settings() -> int:
+    """ingestion.batch_chunks from config: chunks embedded and indexed per streamed batch."""
+    cfg = load_config().get("ingestion", {}) or {}
+    return max(1, int(cfg.get("batch_chunks", 512)))
+
+
+def iter_documents(paths: Iterable[Path]) -> Iterator[Document]:
+    """Documents of every file as its loader produces them (pages flow out one at a time)."""
+    for p in paths:
+        loaded = load_file(Path(p))
+        if loaded is None:
+            log.warning("Unsupported extension skipped", path=str(p))
+            continue
+        yield from loaded
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Consecutive lists of at most size items."""
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
 
 def load_documents(paths: Iterable[Path]) -> List[Document]:
-    """Load docs using appropriate loader based on extension."""
-    docs: List[Document] = []
+    """Load docs using the configured loader for each file's format (see utils.document_loaders)."""
     try:
-        for p in paths:
-            ext = p.suffix.lower()
-            if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
-            elif ext == ".docx":
-                loader = Docx2txtLoader(str(p))
-            elif ext == ".txt":
-                loader = TextLoader(str(p), encoding="utf-8")
-            else:
-                log.warning("Unsupported extension skipped", path=str(p))
-                continue
-            docs.extend(loader.load())
+        docs = list(iter_documents(paths))
         log.info("Documents loaded", count=len(docs))
         return docs
     except Exception as e:
@@ -54,6 +69,11 @@ class FastAPIFileAdapter:
         self._uf.file.seek(0)
         return self._uf.file.read()
 
+    def open(self) -> BinaryIO:
+        """Rewound underlying (spooled) file, for chunked copies."""
+        self._uf.file.seek(0)
+        return self._uf.file
+
 def read_pdf_via_handler(handler, path: str) -> str:
     if hasattr(handler, "read_pdf"):
         return handler.read_pdf(path)  # type: ignore
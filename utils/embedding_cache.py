@@ -0,0 +1,200 @@
+from __future__ import annotations
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+_SQL_BATCH = 500  # stay well below sqlite's bound-parameter limit
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with a persistent sqlite cache.
+
+    Vectors are stored as float32 blobs keyed by (model name, dimensions, sha256(text)),
+    so identical chunk text is embedded once across sessions and restarts. Only cache
+    misses reach the wrapped embedder. The cache is trimmed least-recently-used first
+    once it grows past max_bytes.
+
+    Queries bypass the cache: they rarely repeat and would evict chunk vectors.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        db_path: str | Path,
+        model_name: str,
+        dimensions: Optional[int] = None,
+        max_bytes: int = 2 * 1024 ** 3,
+    ):
+        self.inner = inner
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.dimensions = int(dimensions or 0)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inserts_since_trim = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    dims INTEGER NOT NULL,
+                    text_sha256 TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (model, dims, text_sha256)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+            # Running totals for stats() and trim(); only counted in full here and when trimming
+            self._entries, self._bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+
+    # ---------- Embeddings API ----------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(t) for t in texts]
+        cached = self._lookup(set(keys))
+
+        # Embed each distinct missing text once, in input order
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.inner.embed_documents(list(missing.values()))
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing.keys(), vectors)}
+            self._store(fresh)
+            cached.update(fresh)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        log.info("Embedding cache lookup", texts=len(texts), hits=len(texts) - len(missing), misses=len(missing))
+        return [cached[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one call to the wrapped embedder, bypassing the cache like embed_query."""
+        return self.inner.embed_documents(texts)
+
+    # ---------- Metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, nbytes = self._entries, self._bytes
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    # ---------- Internals ----------
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _lookup(self, keys: set) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        keys_list = list(keys)
+        now = time.time()
+        with self._connect() as conn:
+            for i in range(0, len(keys_list), _SQL_BATCH):
+                batch = keys_list[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT text_sha256, vector FROM embeddings "
+                    f"WHERE model = ? AND dims = ? AND text_sha256 IN ({marks})",
+                    (self.model_name, self.dimensions, *batch),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    conn.execute(
+                        f"UPDATE embeddings SET last_access = ? "
+                        f"WHERE model = ? AND dims = ? AND text_sha256 IN ({','.join('?' * len(rows))})",
+                        (now, self.model_name, self.dimensions, *[r[0] for r in rows]),
+                    )
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        now = time.time()
+        rows = [
+            (self.model_name, self.dimensions, key, vec.tobytes(), now)
+            for key, vec in vectors.items()
+        ]
+        with self._connect() as conn:
+            # A vector another process stored meanwhile is identical; keep it and count only new rows
+            inserted = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, dims, text_sha256, vector, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+        with self._lock:
+            self._entries += inserted
+            self._bytes += inserted * len(rows[0][3]) if rows else 0
+            self._inserts_since_trim += len(rows)
+            due = self._inserts_since_trim >= 1000 or self._bytes > self.max_bytes
+            if due:
+                self._inserts_since_trim = 0
+        if due:
+            self.trim()
+
+    def trim(self):
+        """Evict least-recently-used vectors until the cache is back under 90% of max_bytes."""
+        with self._connect() as conn:
+            # Exact count (other processes share the file); it resyncs the running totals
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+            if total <= self.max_bytes:
+                with self._lock:
+                    self._entries, self._bytes = entries, total
+                return
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            cur = conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access")
+            doomed = []
+            for rowid, size in cur:
+                if total <= target:
+                    break
+                doomed.append((rowid,))
+                total -= size
+                removed += 1
+            conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+        with self._lock:
+            self.evictions += removed
+            self._entries, self._bytes = entries - removed, total
+        log.info("Embedding cache trimmed", removed=removed, bytes=total)
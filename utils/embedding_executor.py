@@ -0,0 +1,198 @@
+from __future__ import annotations
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+
+def _token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(enc.encode(text, disallowed_special=()))
+    except Exception:
+        # ~4 chars per token for English; round up so batches stay under the budget
+        return lambda text: len(text) // 3 + 1
+
+
+def _is_rate_limit(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def _is_transient(exc: BaseException) -> bool:
+    # 5xx, timeouts and dropped connections (openai.APITimeoutError subclasses APIConnectionError)
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return any(cls.__name__ in ("APIConnectionError", "APITimeoutError", "InternalServerError")
+               for cls in type(exc).__mro__)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _AdaptiveLimiter:
+    """
+    AIMD concurrency limit: halve on a 429 (and pause every sender), grow by one
+    after a run of successes, never above the configured maximum.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.active = 0
+        self.resume_at = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+        pause = self.resume_at - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_concurrency and self._successes >= self.limit * 2:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self, delay: float):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that packs texts into token-budgeted batches and sends several
+    batches concurrently.
+
+    Rate limits (HTTP 429) shrink the concurrency limit and pause all senders for the
+    provider's Retry-After (or an exponential backoff with jitter); the limit grows back
+    as requests succeed. Transient failures (5xx, timeouts, connection errors) retry the
+    batch with the same backoff but leave the concurrency limit alone. Vectors are
+    returned in input order.
+    """
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        max_batch_tokens: int = 100_000,
+        max_batch_size: int = 512,
+        max_concurrency: int = 4,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.inner = inner
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limited = 0
+        self.transient_errors = 0
+        self._count_tokens = _token_counter()
+        self._limiter = _AdaptiveLimiter(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+
+    # ---------- Embeddings API ----------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = self.make_batches(texts)
+        start = time.perf_counter()
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            results = list(self._executor.map(self._embed_batch, batches))
+        vectors = [v for batch in results for v in batch]
+        log.info(
+            "Texts embedded",
+            texts=len(texts),
+            batches=len(batches),
+            concurrency=self._limiter.limit,
+            seconds=round(time.perf_counter() - start, 3),
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Same retry/backoff path as batches: the client's own retries are disabled
+        return self._embed_batch([text])[0]
+
+    # ---------- Internals ----------
+
+    def make_batches(self, texts: List[str]) -> List[List[str]]:
+        """Greedy packing in input order; a batch closes at max_batch_size texts or max_batch_tokens."""
+        batches: List[List[str]] = []
+        current: List[str] = []
+        tokens = 0
+        for text in texts:
+            n = self._count_tokens(text)
+            if current and (len(current) >= self.max_batch_size or tokens + n > self.max_batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(text)
+            tokens += n
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self._limiter.acquire()
+            try:
+                vectors = self.inner.embed_documents(batch)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self._limiter.release()
+            if error is None:
+                self._limiter.on_success()
+                return vectors
+
+            rate_limited = _is_rate_limit(error)
+            if not (rate_limited or _is_transient(error)) or attempt == self.max_retries:
+                raise error
+            delay = _retry_after(error) or min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay *= 1 + random.random() * 0.25  # jitter so workers don't retry in lockstep
+            if rate_limited:
+                self.rate_limited += 1
+                self._limiter.on_rate_limit(delay)
+                log.warning("Embedding rate limited, backing off", attempt=attempt + 1,
+                            delay=round(delay, 2), concurrency=self._limiter.limit)
+            else:
+                # Only this batch waits; the provider is not asking everyone to slow down
+                self.transient_errors += 1
+                log.warning("Embedding request failed, retrying", attempt=attempt + 1,
+                            delay=round(delay, 2), error=str(error))
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
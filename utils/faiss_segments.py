@@ -0,0 +1,679 @@
+from __future__ import annotations
+import os
+import json
+import bisect
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from utils.concurrency import InterProcessLock
+from utils.quantization import BinaryIndex, codes_kind
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+MANIFEST_FORMAT = 2
+
+_manifest_locks: Dict[str, InterProcessLock] = {}
+_manifest_locks_guard = threading.Lock()
+
+
+def manifest_path(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.manifest.json"
+
+
+def segments_dir(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.segments"
+
+
+def tombstones_path(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.tombstones.npy"
+
+
+def full_vectors_path(seg_dir: Path, name: str) -> Path:
+    """Full-precision (float32) rows of a quantized segment, in storage order."""
+    return seg_dir / f"{Path(name).stem}.f32.npy"
+
+
+def manifest_lock(index_dir: str | Path, index_name: str = "index") -> InterProcessLock:
+    """
+    Serialises manifest and tombstone updates (appends, deletes, compaction) for one
+    index, across threads and worker processes (flock on <index>.manifest.lock).
+    """
+    key = os.path.realpath(manifest_path(index_dir, index_name))
+    with _manifest_locks_guard:
+        if key not in _manifest_locks:
+            _manifest_locks[key] = InterProcessLock(Path(index_dir) / f"{index_name}.manifest.lock")
+        return _manifest_locks[key]
+
+
+def read_manifest(index_dir: str | Path, index_name: str = "index") -> Dict[str, Any]:
+    manifest = json.loads(manifest_path(index_dir, index_name).read_text(encoding="utf-8"))
+    # Format 1 had no IDs: segment i implicitly started where segment i-1 ended
+    first = 0
+    for s in manifest["segments"]:
+        s.setdefault("first_id", first)
+        first = s["first_id"] + s["ntotal"]
+    manifest.setdefault("next_id", first)
+    return manifest
+
+
+def write_manifest(index_dir: str | Path, manifest: Dict[str, Any], index_name: str = "index"):
+    path = manifest_path(index_dir, index_name)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps({**manifest, "format": MANIFEST_FORMAT}), encoding="utf-8")
+    os.replace(tmp, path)  # readers see the old or the new manifest, never a partial one
+
+
+def read_tombstones(index_dir: str | Path, index_name: str = "index") -> np.ndarray:
+    """Sorted IDs of deleted vectors that are still physically present in some segment."""
+    path = tombstones_path(index_dir, index_name)
+    if not path.exists():
+        return np.zeros(0, dtype=np.int64)
+    return np.load(path).astype(np.int64)
+
+
+def write_tombstones(index_dir: str | Path, ids: np.ndarray, index_name: str = "index"):
+    path = tombstones_path(index_dir, index_name)
+    ids = np.unique(np.asarray(ids, dtype=np.int64))
+    if not ids.size:
+        if path.exists():
+            os.remove(path)
+        return
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, ids)
+    os.replace(tmp, path)
+
+
+def _write_segment(index, index_dir: Path, index_name: str, name: str,
+                   vectors: Optional[np.ndarray] = None) -> int:
+    """Write a segment file; quantized segments also get their full-precision rows (written first)."""
+    seg_dir = segments_dir(index_dir, index_name)
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    nbytes = 0
+    if codes_kind(index) is not None:
+        full = full_vectors_path(seg_dir, name)
+        tmp = full.with_name(f".{full.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        os.replace(tmp, full)
+        nbytes += os.path.getsize(full)
+    tmp = seg_dir / f".{name}.tmp"
+    if isinstance(index, BinaryIndex):
+        index.write(tmp)
+    else:
+        faiss.write_index(index, str(tmp))
+    os.replace(tmp, seg_dir / name)
+    return nbytes + os.path.getsize(seg_dir / name)
+
+
+def _read_segment(seg_dir: Path, entry: Dict[str, Any], d: int, read: Callable[[Path], Any]) -> "Segment":
+    path = seg_dir / entry["name"]
+    index = BinaryIndex.read(path, d) if entry.get("codes") == "binary" else read(path)
+    full = np.load(full_vectors_path(seg_dir, entry["name"]), mmap_mode="r") if entry.get("codes") else None
+    return Segment(entry["name"], index, entry["first_id"], full)
+
+
+def _remove_segment_files(seg_dir: Path, name: str):
+    for path in (seg_dir / name, full_vectors_path(seg_dir, name)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _entry(name: str, index, first_id: int) -> Dict[str, Any]:
+    entry = {"name": name, "ntotal": index.ntotal, "first_id": first_id}
+    kind = codes_kind(index)
+    if kind is not None:
+        entry["codes"] = kind
+    return entry
+
+
+def _has_ids(index) -> bool:
+    # ID-mapped segments (and binary ones, always ID-mapped) return global IDs from search
+    return isinstance(index, (faiss.IndexIDMap, BinaryIndex))
+
+
+def _inner(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def _contents(index, first_id: int, full: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(vectors, ids) of one segment, in storage order; quantized segments read their full-precision rows."""
+    if _has_ids(index):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    else:
+        ids = np.arange(first_id, first_id + index.ntotal, dtype=np.int64)
+    if full is not None:
+        return np.asarray(full, dtype=np.float32), ids
+    return _inner(index).reconstruct_n(0, index.ntotal), ids
+
+
+def _with_ids(built, vectors: np.ndarray, ids: np.ndarray):
+    index = built if isinstance(built, BinaryIndex) else faiss.IndexIDMap2(built)
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def _id_mapped(vectors: np.ndarray, ids: np.ndarray, build: Optional[Callable[[np.ndarray], Any]]):
+    return _with_ids(build(vectors) if build is not None else faiss.IndexFlatL2(vectors.shape[1]), vectors, ids)
+
+
+def _search_params(index, sel):
+    # Each index family only accepts its own parameter type, and those carry the
+    # query-time knobs too, so copy the tuned nprobe / efSearch across
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = inner.hnsw.efSearch
+    elif isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = inner.nprobe
+    else:
+        params = faiss.SearchParameters()
+    params.sel = sel
+    return params
+
+
+@dataclass
+class Segment:
+    name: str
+    index: Any
+    first_id: Optional[int] = None  # None: starts where the previous segment ends
+    full: Optional[np.ndarray] = None  # quantized segments: float32 rows in storage order (memory-mapped)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """Storage rows of these IDs (for reading full-precision vectors)."""
+        if not _has_ids(self.index):
+            return np.asarray(ids, dtype=np.int64) - self.first_id
+        if not hasattr(self, "_order"):
+            stored = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+            self._order = np.argsort(stored, kind="stable")
+            self._sorted = stored[self._order]
+        return self._order[np.searchsorted(self._sorted, ids)]
+
+
+class SegmentedIndex:
+    """
+    Read-mostly index made of immutable segment files, searched as one.
+
+    Quacks like the parts of faiss.Index that langchain's FAISS uses (search, add,
+    reconstruct, ntotal, d). Vector IDs are global and never reused: segments are
+    IndexIDMap2-wrapped and hold ascending, non-overlapping ID ranges starting at
+    first_id, so the docstore's positions stay valid when segments are merged or
+    purged. (Segments written before IDs existed are unwrapped and cover the
+    contiguous range first_id..first_id+ntotal.)
+
+    add() goes to an in-memory pending segment; flush() writes it as one new file and
+    appends it to the manifest, so persisting a batch costs only that batch. Existing
+    segment files are never rewritten, only replaced wholesale by compaction or purge.
+    Deleted IDs (tombstones) are excluded from search with a faiss IDSelector until a
+    purge drops them physically.
+
+    Quantized segments (fp16, int8 or binary codes) fetch rescore_factor * k candidates
+    from their codes and re-rank them by exact L2 distance against the segment's
+    memory-mapped float32 rows, so only the codes have to stay resident.
+    """
+
+    def __init__(self, d: int, segments: Optional[List[Segment]] = None, next_segment: int = 1,
+                 next_id: Optional[int] = None):
+        self.d = d
+        self.segments: List[Segment] = list(segments or [])
+        first = 0
+        for s in self.segments:
+            if s.first_id is None:
+                s.first_id = first
+            first = s.first_id + s.ntotal
+        self.next_segment = next_segment
+        self.next_id = next_id if next_id is not None else first
+        self.pending: Optional[Any] = None
+        self.pending_first = self.next_id
+        self.metric_type = faiss.METRIC_L2
+        self.tombstones = np.zeros(0, dtype=np.int64)
+        self.rescore_factor = 10
+        self._params: Dict[int, Tuple[Any, list]] = {}
+        self._full: Dict[int, Segment] = {s.first_id: s for s in self.segments if s.full is not None}
+
+    # ---------- faiss.Index surface ----------
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.segments) + (self.pending.ntotal if self.pending is not None else 0)
+
+    def add(self, x: np.ndarray):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if self.pending is None:
+            self.pending = faiss.IndexIDMap2(faiss.IndexFlatL2(self.d))
+            self.pending_first = self.next_id
+        if isinstance(self.pending, faiss.IndexIDMap):
+            self.pending.add_with_ids(x, np.arange(self.next_id, self.next_id + len(x), dtype=np.int64))
+        else:
+            self.pending.add(x)  # a wrapped single index: IDs continue contiguously
+        self.next_id += len(x)
+
+    def search(self, x: np.ndarray, k: int, scope: Optional[Dict[int, Tuple[Any, list]]] = None
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every segment and keep the k nearest live vectors overall (ascending L2 distance).
+
+        scope (from scope_params) restricts the search to an allow-list of IDs:
+        segments holding none of them are skipped, the others are searched with an
+        ID selector, so results are filtered before ranking rather than after.
+        """
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        all_d, all_i = [], []
+        for first, index in self._parts():
+            if index.ntotal == 0 or (scope is not None and first not in scope):
+                continue
+            quantized = self._full.get(first)
+            kk = min(k * self.rescore_factor if quantized is not None else k, index.ntotal)
+            params = (scope if scope is not None else self._params).get(first)
+            if params is not None and params[0] is None:
+                params = None
+            if params is None:
+                dist, ids = index.search(x, kk)
+            else:
+                dist, ids = index.search(x, kk, params=params[0])
+            if not _has_ids(index):
+                ids = np.where(ids >= 0, ids + first, -1)
+            if quantized is not None:
+                dist = self._rescore(x, ids, quantized)
+            all_d.append(dist)
+            all_i.append(ids)
+        if not all_d:
+            return np.full((len(x), k), np.inf, dtype=np.float32), np.full((len(x), k), -1, dtype=np.int64)
+
+        dist = np.hstack(all_d)
+        ids = np.hstack(all_i)
+        dist = np.where(ids >= 0, dist, np.inf)
+        order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        dist = np.take_along_axis(dist, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+        if ids.shape[1] < k:  # fewer vectors than k: pad like faiss does
+            pad = k - ids.shape[1]
+            dist = np.pad(dist, ((0, 0), (0, pad)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        return dist.astype(np.float32), ids.astype(np.int64)
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        parts = self._parts()
+        firsts = [first for first, _ in parts]
+        first, index = parts[bisect.bisect_right(firsts, int(i)) - 1]
+        if first in self._full:
+            segment = self._full[first]
+            return np.asarray(segment.full[segment.rows(np.array([int(i)]))[0]], dtype=np.float32)
+        if _has_ids(index):
+            return index.reconstruct(int(i))
+        return index.reconstruct(int(i) - first)
+
+    def reconstruct_n(self, i0: int, n: int) -> np.ndarray:
+        return np.vstack([self.reconstruct(i) for i in range(i0, i0 + n)]) if n else np.zeros((0, self.d), np.float32)
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors of these IDs (e.g. a search's candidates), one call per segment rather than per ID."""
+        ids = np.asarray(ids, dtype=np.int64)
+        out = np.zeros((len(ids), self.d), dtype=np.float32)
+        parts = self._parts()
+        which = np.searchsorted([first for first, _ in parts], ids, side="right") - 1
+        for p in np.unique(which):
+            first, index = parts[p]
+            hit = which == p
+            if first in self._full:
+                segment = self._full[first]
+                out[hit] = segment.full[segment.rows(ids[hit])]
+            elif _has_ids(index):
+                out[hit] = index.reconstruct_batch(ids[hit])
+            else:
+                out[hit] = index.reconstruct_batch(ids[hit] - first)
+        return out
+
+    @staticmethod
+    def _rescore(x: np.ndarray, ids: np.ndarray, segment: Segment) -> np.ndarray:
+        """Exact squared L2 distances of the candidate ids (inf where there is none)."""
+        dist = np.full(ids.shape, np.inf, dtype=np.float32)
+        for q in range(len(x)):
+            hit = ids[q] >= 0
+            if hit.any():
+                diff = np.asarray(segment.full[segment.rows(ids[q][hit])], dtype=np.float32) - x[q]
+                dist[q, hit] = np.einsum("ij,ij->i", diff, diff)
+        return dist
+
+    # ---------- Tombstones ----------
+
+    def set_tombstones(self, ids: np.ndarray):
+        """Exclude these IDs from search; selectors are built once per segment, not per query."""
+        self.tombstones = np.unique(np.asarray(ids, dtype=np.int64))
+        self._params = {}
+        for first, end, index in self._ranges():
+            lo, hi = np.searchsorted(self.tombstones, [first, end])
+            dead = self.tombstones[lo:hi]
+            if not dead.size:
+                continue
+            if not _has_ids(index):
+                dead = dead - first  # unwrapped segments are searched by local position
+            batch = faiss.IDSelectorBatch(len(dead), faiss.swig_ptr(dead))
+            sel = faiss.IDSelectorNot(batch)
+            # SWIG does not keep the selectors alive for us
+            self._params[first] = (_search_params(index, sel), [batch, sel])
+
+    def scope_params(self, allowed: np.ndarray) -> Dict[int, Tuple[Any, list]]:
+        """
+        Per-segment search parameters restricting search to the live IDs in allowed.
+
+        Segments without allowed IDs are left out, and a segment whose live vectors
+        are all allowed keeps its plain (tombstone-only) parameters, so a scope that
+        owns its segments searches exactly as fast as an unscoped index.
+        """
+        allowed = np.unique(np.asarray(allowed, dtype=np.int64))
+        scope: Dict[int, Tuple[Any, list]] = {}
+        for first, end, index in self._ranges():
+            lo, hi = np.searchsorted(allowed, [first, end])
+            ids = allowed[lo:hi]
+            if not ids.size:
+                continue
+            dlo, dhi = np.searchsorted(self.tombstones, [first, end])
+            if dhi > dlo:
+                ids = np.setdiff1d(ids, self.tombstones[dlo:dhi])
+            if len(ids) >= index.ntotal - (dhi - dlo):
+                scope[first] = self._params.get(first, (None, []))
+                continue
+            if not _has_ids(index):
+                ids = ids - first
+            sel = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+            scope[first] = (_search_params(index, sel), [sel])
+        return scope
+
+    # ---------- Persistence ----------
+
+    @classmethod
+    def load(cls, index_dir: str | Path, index_name: str, read: Callable[[Path], Any]) -> "SegmentedIndex":
+        """Open every segment in the manifest with read(path) (e.g. memory-mapped), tombstones applied."""
+        seg_dir = segments_dir(index_dir, index_name)
+        for attempt in range(3):
+            # Tombstones first: a purge commits the manifest before it drops tombstones,
+            # so this order never pairs a purged ID's old segment with a pruned tombstone list
+            tombstones = read_tombstones(index_dir, index_name)
+            manifest = read_manifest(index_dir, index_name)
+            try:
+                segments = [_read_segment(seg_dir, s, manifest["dim"], read) for s in manifest["segments"]]
+            except (FileNotFoundError, RuntimeError) as e:
+                # A compaction swapped the manifest and removed merged files; read it again
+                if attempt == 2:
+                    raise
+                log.info("Segment vanished during load, retrying", index_dir=str(index_dir), error=str(e))
+                continue
+            seg = cls(manifest["dim"], segments, manifest.get("next_segment", len(segments) + 1), manifest["next_id"])
+            seg.set_tombstones(tombstones)
+            return seg
+
+    @classmethod
+    def from_index(cls, index) -> "SegmentedIndex":
+        """Wrap a single in-memory index as the pending segment (written on the next flush)."""
+        seg = cls(index.d)
+        seg.pending = index
+        seg.pending_first = 0
+        seg.next_id = index.ntotal
+        return seg
+
+    def flush(self, index_dir: str | Path, index_name: str = "index",
+              build: Optional[Callable[[np.ndarray], Any]] = None,
+              reopen: Optional[Callable[[Path], Any]] = None) -> Optional[str]:
+        """
+        Write the pending segment and append it to the manifest.
+
+        build(vectors) may turn a large pending batch into an ANN segment; small
+        batches are written as-is (Flat). With reopen (e.g. a memory-mapped read),
+        the written file replaces the in-memory segment, so a long-running writer
+        does not keep every vector it has flushed on its heap. Returns the new
+        segment's file name.
+        """
+        if self.pending is None or self.pending.ntotal == 0:
+            if not manifest_path(index_dir, index_name).exists():
+                with manifest_lock(index_dir, index_name):
+                    write_manifest(index_dir, self._manifest(), index_name)
+            return None
+
+        index = self.pending
+        vectors = None
+        if build is not None and isinstance(_inner(index), faiss.IndexFlat):
+            vectors, ids = _contents(index, self.pending_first)
+            built = build(vectors)
+            if not isinstance(built, faiss.IndexFlat):
+                index = _with_ids(built, vectors, ids)
+
+        with manifest_lock(index_dir, index_name):
+            on_disk = read_manifest(index_dir, index_name) if manifest_path(index_dir, index_name).exists() else None
+            if on_disk is not None:
+                # Another writer (or a compaction) may have moved things on; append to what is on disk
+                self.next_segment = max(self.next_segment, on_disk.get("next_segment", 1))
+                self.next_id = max(self.next_id, on_disk["next_id"])
+            name = f"seg-{self.next_segment:06d}.faiss"
+            nbytes = _write_segment(index, Path(index_dir), index_name, name, vectors)
+            self.next_segment += 1
+
+            entries = (on_disk or {}).get("segments", [])
+            if on_disk is None:
+                entries = self._manifest()["segments"]
+            entries = entries + [_entry(name, index, self.pending_first)]
+            write_manifest(index_dir, {**self._manifest(), "segments": entries}, index_name)
+
+        entry = entries[-1]
+        if reopen is not None:
+            segment = _read_segment(segments_dir(index_dir, index_name), entry, self.d, reopen)
+        else:
+            full = None
+            if codes_kind(index) is not None:
+                full = np.load(full_vectors_path(segments_dir(index_dir, index_name), name), mmap_mode="r")
+            segment = Segment(name, index, self.pending_first, full)
+        self.segments.append(segment)
+        if segment.full is not None:
+            self._full[segment.first_id] = segment
+        self.pending = None
+        self.pending_first = self.next_id
+        log.info("Segment written", index_dir=str(index_dir), segment=name, vectors=index.ntotal,
+                 bytes=nbytes, segments=len(entries))
+        return name
+
+    def _manifest(self) -> Dict[str, Any]:
+        return {
+            "format": MANIFEST_FORMAT,
+            "dim": self.d,
+            "next_segment": self.next_segment,
+            "next_id": self.next_id,
+            "segments": [_entry(s.name, s.index, s.first_id) for s in self.segments],
+        }
+
+    def _parts(self) -> List[Tuple[int, Any]]:
+        parts = [(s.first_id, s.index) for s in self.segments]
+        if self.pending is not None:
+            parts.append((self.pending_first, self.pending))
+        return parts
+
+    def _ranges(self) -> List[Tuple[int, int, Any]]:
+        """(first_id, end_id, index) per part; a part's IDs all fall in [first_id, end_id)."""
+        parts = self._parts()
+        ends = [first for first, _ in parts[1:]] + [self.next_id]
+        return [(first, end, index) for (first, index), end in zip(parts, ends)]
+
+
+class ScopedIndex:
+    """
+    View of a SegmentedIndex that only returns the given IDs (e.g. one session's
+    vectors in a shared tenant index). The selectors are built once per view, so a
+    cached view costs nothing extra per query.
+    """
+
+    def __init__(self, base: SegmentedIndex, allowed: np.ndarray):
+        self.base = base
+        self.d = base.d
+        self.metric_type = base.metric_type
+        self.allowed = np.unique(np.asarray(allowed, dtype=np.int64))
+        self._scope = base.scope_params(self.allowed)
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.allowed)
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.base.search(x, k, scope=self._scope)
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return self.base.reconstruct(i)
+
+    def reconstruct_n(self, i0: int, n: int) -> np.ndarray:
+        return self.base.reconstruct_n(i0, n)
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        return self.base.reconstruct_batch(ids)
+
+
+def add_tombstones(index_dir: str | Path, ids: np.ndarray, index_name: str = "index") -> np.ndarray:
+    """Merge ids into the tombstone file (caller holds manifest_lock); returns the full list."""
+    merged = np.union1d(read_tombstones(index_dir, index_name), np.asarray(ids, dtype=np.int64))
+    write_tombstones(index_dir, merged, index_name)
+    return merged
+
+
+def plan_merge(sizes: List[int], max_segments: int) -> Optional[Tuple[int, int]]:
+    """
+    Pick a run of adjacent segments to merge, or None while there are few enough.
+
+    Tiered: take the newest segments and keep extending the run backwards while the
+    preceding segment is at most 4x the run's size, so a large base segment is only
+    rewritten once the small ones behind it have grown comparable. Each vector is
+    therefore rewritten O(log n) times rather than on every compaction.
+    """
+    if len(sizes) <= max_segments:
+        return None
+    start = len(sizes) - 2
+    total = sizes[-1] + sizes[-2]
+    while start > 0 and sizes[start - 1] <= 4 * total:
+        start -= 1
+        total += sizes[start]
+    return start, len(sizes)
+
+
+def _rewrite_run(
+    base: Path,
+    index_name: str,
+    run: List[Dict[str, Any]],
+    tombstones: np.ndarray,
+    read: Callable[[Path], Any],
+    build: Callable[[np.ndarray], Any],
+) -> Optional[Tuple[str, int, int]]:
+    """
+    Replace a run of adjacent segments with one segment holding their live vectors.
+
+    Tombstoned vectors are dropped and their IDs leave the tombstone file. The work
+    happens without the manifest lock; the swap is only committed if the run is still
+    in place, otherwise it is discarded and None returned. Otherwise returns
+    (new segment name or "" if nothing survived, vectors kept, vectors dropped).
+    """
+    seg_dir = segments_dir(base, index_name)
+    dim = read_manifest(base, index_name)["dim"]
+    vectors, ids = [], []
+    for entry in run:
+        segment = _read_segment(seg_dir, entry, dim, read)
+        v, i = _contents(segment.index, entry["first_id"], segment.full)
+        vectors.append(v)
+        ids.append(i)
+    vectors = np.vstack(vectors)
+    ids = np.concatenate(ids)
+    dead = np.isin(ids, tombstones)
+    dropped = ids[dead]
+    vectors, ids = vectors[~dead], ids[~dead]
+    merged = _id_mapped(vectors, ids, build) if len(ids) else None
+
+    old_names = [e["name"] for e in run]
+    with manifest_lock(base, index_name):
+        current = read_manifest(base, index_name)
+        names = [e["name"] for e in current["segments"]]
+        start = names.index(old_names[0]) if old_names[0] in names else -1
+        if start < 0 or names[start:start + len(old_names)] != old_names:
+            log.info("Segment rewrite superseded, discarding", index_dir=str(base))
+            return None
+        next_segment = current.get("next_segment", 1)
+        replacement, name = [], ""
+        if merged is not None:
+            name = f"seg-{next_segment:06d}.faiss"
+            _write_segment(merged, base, index_name, name, vectors)
+            replacement = [_entry(name, merged, run[0]["first_id"])]
+        segments = current["segments"][:start] + replacement + current["segments"][start + len(old_names):]
+        write_manifest(base, {**current, "next_segment": next_segment + 1, "segments": segments}, index_name)
+        if dropped.size:
+            # After the manifest: a reader that sees the pruned list also sees the new segments
+            write_tombstones(base, np.setdiff1d(read_tombstones(base, index_name), dropped), index_name)
+
+    # Workers that still map the old files keep their inodes; new loads use the new manifest
+    for old in old_names:
+        _remove_segment_files(seg_dir, old)
+    return name, len(ids), int(dropped.size)
+
+
+def compact(
+    index_dir: str | Path,
+    index_name: str,
+    read: Callable[[Path], Any],
+    build: Callable[[np.ndarray], Any],
+    max_segments: int,
+) -> bool:
+    """
+    Merge a run of segments (see plan_merge) into one new segment built by build(),
+    dropping tombstoned vectors on the way. Returns True if the manifest changed.
+    """
+    base = Path(index_dir)
+    with manifest_lock(base, index_name):
+        manifest = read_manifest(base, index_name)
+        tombstones = read_tombstones(base, index_name)
+    entries = manifest["segments"]
+    plan = plan_merge([e["ntotal"] for e in entries], max_segments)
+    if plan is None:
+        return False
+    start, end = plan
+    result = _rewrite_run(base, index_name, entries[start:end], tombstones, read, build)
+    if result is None:
+        return False
+    name, kept, dropped = result
+    log.info("Segments compacted", index_dir=str(base), merged=end - start, into=name,
+             vectors=kept, purged=dropped)
+    return True
+
+
+def purge(
+    index_dir: str | Path,
+    index_name: str,
+    read: Callable[[Path], Any],
+    build: Callable[[np.ndarray], Any],
+    min_dead_ratio: float = 0.0,
+) -> int:
+    """
+    Physically remove tombstoned vectors: every segment whose dead share is at least
+    min_dead_ratio is rewritten without them. Returns the number of vectors removed.
+    """
+    base = Path(index_dir)
+    with manifest_lock(base, index_name):
+        manifest = read_manifest(base, index_name)
+        tombstones = read_tombstones(base, index_name)
+    if not tombstones.size:
+        return 0
+    entries = manifest["segments"]
+    ends = [e["first_id"] for e in entries[1:]] + [manifest["next_id"]]
+    removed = 0
+    for entry, end in zip(entries, ends):
+        lo, hi = np.searchsorted(tombstones, [entry["first_id"], end])
+        if hi == lo or (hi - lo) < min_dead_ratio * max(1, entry["ntotal"]):
+            continue
+        result = _rewrite_run(base, index_name, [entry], tombstones, read, build)
+        if result is not None:
+            removed += result[2]
+    log.info("Tombstoned vectors purged", index_dir=str(base), removed=removed)
+    return removed
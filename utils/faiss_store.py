@@ -0,0 +1,880 @@
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional, Sequence, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+from utils.config_loader import load_config
+from utils.concurrency import InterProcessLock
+from utils.faiss_segments import (
+    ScopedIndex, SegmentedIndex, add_tombstones, compact, manifest_lock, manifest_path, purge, read_manifest, read_tombstones,
+    segments_dir, tombstones_path,
+)
+from utils.lexical_index import lexical_manifest_path
+from utils.quantization import QUANTIZATION_TYPES, quantized_index
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+_SQL_BATCH = 500  # stay well below sqlite's bound-parameter limit
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def docstore_path(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.docstore.sqlite"
+
+
+def index_files(index_dir: str | Path, index_name: str = "index") -> List[Path]:
+    """
+    The segment manifest (or single .faiss file) plus whichever docstore (sqlite or
+    legacy pickle) backs it, the tombstone file once anything was deleted and the
+    lexical (BM25) manifest when there is one. All are replaced atomically on every
+    write, so their stat is a cheap version stamp.
+    """
+    base = Path(index_dir)
+    store = docstore_path(base, index_name)
+    if not store.exists():
+        store = base / f"{index_name}.pkl"
+    vectors = manifest_path(base, index_name)
+    if not vectors.exists():
+        vectors = base / f"{index_name}.faiss"
+    optional = [tombstones_path(base, index_name), lexical_manifest_path(base, index_name)]
+    return [vectors, store] + [p for p in optional if p.exists()]
+
+
+def index_exists(index_dir: str | Path, index_name: str = "index") -> bool:
+    return all(p.exists() for p in index_files(index_dir, index_name))
+
+
+def index_memory(vs: FAISS, index_dir: str | Path, index_name: str = "index") -> Tuple[int, int]:
+    """
+    (heap bytes, memory-mapped bytes) of a loaded index's vector data: the size of each
+    segment file (or the single .faiss file), split by whether read_index actually
+    mapped it. Binary segments and mapped reads that fell back to the heap count as
+    heap. Quantized segments' full-precision rows are memory-mapped on demand for
+    rescoring and not counted.
+    """
+    base = Path(index_dir)
+    if isinstance(vs.index, SegmentedIndex):
+        seg_dir = segments_dir(base, index_name)
+        parts = []
+        for segment in vs.index.segments:
+            try:
+                parts.append((os.path.getsize(seg_dir / segment.name), _is_mapped(segment.index)))
+            except FileNotFoundError:  # compacted away since it was loaded
+                pass
+    else:
+        parts = [(os.path.getsize(base / f"{index_name}.faiss"), _is_mapped(vs.index))]
+    return sum(n for n, mapped in parts if not mapped), sum(n for n, mapped in parts if mapped)
+
+
+class SqliteDocstore(Docstore, AddableMixin):
+    """
+    Chunk text and metadata in a sqlite table, fetched one row at a time.
+
+    Each row also holds its position (vector ID) in the FAISS index, so the index ->
+    docstore ID map (SqliteIndexMap) is read lazily from the same table. Opening an
+    index therefore costs nothing beyond the .faiss file; a search reads only the
+    rows it returns, and no pickle is ever loaded.
+
+    Rows are also keyed by source document (see source_key), which is what
+    document-level deletes go through, and by session in a shared tenant index.
+    Deleted rows are only flagged until the vectors they point at have been purged
+    from the index.
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS docs (
+                    id TEXT PRIMARY KEY,
+                    pos INTEGER UNIQUE,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    source TEXT,
+                    session TEXT,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(docs)")}
+            if "source" not in columns:
+                # Docstores written before document-level deletes: backfill from the metadata
+                conn.execute("ALTER TABLE docs ADD COLUMN source TEXT")
+                conn.execute("ALTER TABLE docs ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0")
+                conn.execute(
+                    "UPDATE docs SET source = COALESCE(json_extract(metadata, '$.file_name'), "
+                    "json_extract(metadata, '$.source'))"
+                )
+            if "session" not in columns:
+                conn.execute("ALTER TABLE docs ADD COLUMN session TEXT")
+                conn.execute("UPDATE docs SET session = json_extract(metadata, '$.session_id')")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_source ON docs (source)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_session ON docs (session, pos)")
+            # Ingestion log: every chunk ID ever indexed, kept through deletes and repairs
+            conn.execute("CREATE TABLE IF NOT EXISTS ingested (id TEXT PRIMARY KEY, at TEXT NOT NULL)")
+            # Positions are never reused, so the next one is kept rather than derived from MAX(pos)
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                "INSERT OR IGNORE INTO counters (name, value) "
+                "SELECT 'next_pos', COALESCE(MAX(pos) + 1, 0) FROM docs"
+            )
+        self.id_map = SqliteIndexMap(self)
+
+    # ---------- Docstore API ----------
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, text, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return _to_document(row)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        # Positions are assigned afterwards through id_map.update(), mirroring FAISS.__add
+        rows = [
+            (id_, d.page_content, json.dumps(d.metadata or {}, default=str), source_key(d.metadata or {}),
+             (d.metadata or {}).get("session_id"))
+            for id_, d in texts.items()
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO docs (id, text, metadata, source, session) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def delete(self, ids: List) -> None:
+        with self._connect() as conn:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                conn.execute(f"DELETE FROM docs WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+    def mget(self, ids: Sequence[str]) -> List[Optional[Document]]:
+        """Fetch several documents in one query, in the order given (None for unknown IDs)."""
+        found: Dict[str, Document] = {}
+        ids = list(ids)
+        with self._connect() as conn:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT id, text, metadata FROM docs WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((r[0], _to_document(r)) for r in rows)
+        return [found.get(i) for i in ids]
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM docs WHERE deleted = 0").fetchone()[0]
+
+    def existing(self, ids: Sequence[str]) -> set:
+        """The subset of ids that are indexed (have a position, not deleted), looked up by key."""
+        ids = list(ids)
+        found = set()
+        with self._connect() as conn:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT id FROM docs WHERE pos IS NOT NULL AND deleted = 0 AND id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def log_ingested(self, ids: Iterable[str], at: str):
+        """Record chunk IDs in the ingestion log (IDs already there keep their first time)."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO ingested (id, at) VALUES (?, ?)", [(i, at) for i in ids])
+
+    def logged(self, ids: Sequence[str]) -> set:
+        """The subset of ids ever recorded in the ingestion log, looked up by key."""
+        ids = list(ids)
+        found = set()
+        with self._connect() as conn:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                rows = conn.execute(
+                    f"SELECT id FROM ingested WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def sources(self, session: Optional[str] = None) -> Dict[str, int]:
+        """Live chunk count per source document (of one session, if given)."""
+        where, args = ("AND session = ?", (session,)) if session is not None else ("", ())
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT source, COUNT(*) FROM docs WHERE deleted = 0 AND pos IS NOT NULL {where} "
+                f"GROUP BY source ORDER BY source",
+                args,
+            ).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def positions(self, sessions: Sequence[str]) -> np.ndarray:
+        """Sorted positions of the live chunks tagged with any of these sessions."""
+        sessions = list(sessions)
+        found = []
+        with self._connect() as conn:
+            for i in range(0, len(sessions), _SQL_BATCH):
+                batch = sessions[i:i + _SQL_BATCH]
+                found.extend(r[0] for r in conn.execute(
+                    f"SELECT pos FROM docs WHERE deleted = 0 AND pos IS NOT NULL "
+                    f"AND session IN ({','.join('?' * len(batch))})",
+                    batch,
+                ))
+        return np.unique(np.asarray(found, dtype=np.int64))
+
+    def mark_deleted(self, sources: Sequence[str], session: Optional[str] = None) -> int:
+        """Flag every chunk of these sources (in one session, if given) as deleted; returns the count."""
+        sources = list(sources)
+        where, extra = ("AND session = ?", [session]) if session is not None else ("", [])
+        flagged = 0
+        with self._connect() as conn:
+            for i in range(0, len(sources), _SQL_BATCH):
+                batch = sources[i:i + _SQL_BATCH]
+                cur = conn.execute(
+                    f"UPDATE docs SET deleted = 1 WHERE deleted = 0 {where} "
+                    f"AND source IN ({','.join('?' * len(batch))})",
+                    extra + batch,
+                )
+                flagged += cur.rowcount
+        return flagged
+
+    def source_positions(self, sources: Sequence[str], session: Optional[str] = None) -> Dict[int, str]:
+        """Position -> ID of the live chunks of these sources (in one session, if given)."""
+        sources = list(sources)
+        where, extra = ("AND session = ?", [session]) if session is not None else ("", [])
+        found: Dict[int, str] = {}
+        with self._connect() as conn:
+            for i in range(0, len(sources), _SQL_BATCH):
+                batch = sources[i:i + _SQL_BATCH]
+                found.update(conn.execute(
+                    f"SELECT pos, id FROM docs WHERE deleted = 0 AND pos IS NOT NULL {where} "
+                    f"AND source IN ({','.join('?' * len(batch))})",
+                    extra + batch,
+                ).fetchall())
+        return found
+
+    def mark_deleted_positions(self, positions: Sequence[int]) -> int:
+        """Flag the chunks at these positions as deleted; returns how many were still live."""
+        positions = [int(p) for p in positions]
+        flagged = 0
+        with self._connect() as conn:
+            for i in range(0, len(positions), _SQL_BATCH):
+                batch = positions[i:i + _SQL_BATCH]
+                cur = conn.execute(
+                    f"UPDATE docs SET deleted = 1 WHERE deleted = 0 AND pos IN ({','.join('?' * len(batch))})", batch
+                )
+                flagged += cur.rowcount
+        return flagged
+
+    def live_positions(self) -> np.ndarray:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT pos FROM docs WHERE deleted = 0 AND pos IS NOT NULL").fetchall()
+        return np.asarray([r[0] for r in rows], dtype=np.int64)
+
+    def deleted_positions(self) -> np.ndarray:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT pos FROM docs WHERE deleted = 1 AND pos IS NOT NULL").fetchall()
+        return np.asarray([r[0] for r in rows], dtype=np.int64)
+
+    def drop_purged(self, tombstones: np.ndarray) -> int:
+        """Remove deleted rows whose vectors are gone from the index (no longer tombstoned)."""
+        gone = np.setdiff1d(self.deleted_positions(), tombstones).tolist()
+        with self._connect() as conn:
+            for i in range(0, len(gone), _SQL_BATCH):
+                batch = gone[i:i + _SQL_BATCH]
+                conn.execute(f"DELETE FROM docs WHERE deleted = 1 AND pos IN ({','.join('?' * len(batch))})", batch)
+        return len(gone)
+
+    def next_pos(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM counters WHERE name = 'next_pos'").fetchone()[0]
+
+    def repair(self, next_pos: int) -> int:
+        """
+        Drop rows the saved index does not cover (a write interrupted before the index
+        was saved) and rewind the position counter to the index's. Writer-side only:
+        readers simply never see positions the index does not hold.
+        """
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM docs WHERE pos IS NULL OR pos >= ?", (next_pos,))
+            conn.execute("UPDATE counters SET value = ? WHERE name = 'next_pos'", (next_pos,))
+        if cur.rowcount:
+            log.warning("Orphaned docstore rows removed", db_path=self.db_path, rows=cur.rowcount)
+        return cur.rowcount
+
+    # ---------- Internals ----------
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One connection per thread: lookups happen per search hit, reconnecting each time adds up
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        with conn:  # commit on success, rollback on error
+            yield conn
+
+    def __getstate__(self):
+        return {"db_path": self.db_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_path"])
+
+
+class SqliteIndexMap(MutableMapping):
+    """
+    FAISS position -> docstore ID, read from the docstore table on demand.
+
+    len() is the next free position rather than the number of rows: langchain's
+    FAISS numbers new vectors from len(index_to_docstore_id), and positions of
+    purged vectors must never be handed out again.
+    """
+
+    def __init__(self, store: SqliteDocstore):
+        self._store = store
+
+    def __getitem__(self, pos: int) -> str:
+        with self._store._connect() as conn:
+            row = conn.execute("SELECT id FROM docs WHERE pos = ?", (int(pos),)).fetchone()
+        if row is None:
+            raise KeyError(pos)
+        return row[0]
+
+    def __setitem__(self, pos: int, id_: str):
+        self.update({pos: id_})
+
+    def lookup(self, positions: Sequence[int]) -> Dict[int, str]:
+        """Docstore IDs of several positions in one query per batch (unknown positions are left out)."""
+        positions = sorted({int(p) for p in positions})
+        found: Dict[int, str] = {}
+        with self._store._connect() as conn:
+            for i in range(0, len(positions), _SQL_BATCH):
+                batch = positions[i:i + _SQL_BATCH]
+                found.update(conn.execute(
+                    f"SELECT pos, id FROM docs WHERE pos IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+        return found
+
+    def __delitem__(self, pos: int):
+        with self._store._connect() as conn:
+            conn.execute("UPDATE docs SET pos = NULL WHERE pos = ?", (int(pos),))
+
+    def update(self, other=(), **kwargs):
+        items = dict(other, **kwargs)
+        with self._store._connect() as conn:
+            conn.executemany("UPDATE docs SET pos = ? WHERE id = ?", [(int(p), i) for p, i in items.items()])
+            if items:
+                conn.execute(
+                    "UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_pos'", (max(map(int, items)) + 1,)
+                )
+
+    def __iter__(self) -> Iterator[int]:
+        with self._store._connect() as conn:
+            rows = conn.execute("SELECT pos FROM docs WHERE pos IS NOT NULL ORDER BY pos").fetchall()
+        return iter([r[0] for r in rows])
+
+    def __len__(self) -> int:
+        return self._store.next_pos()
+
+    def values(self):
+        with self._store._connect() as conn:
+            rows = conn.execute("SELECT id FROM docs WHERE pos IS NOT NULL ORDER BY pos").fetchall()
+        return [r[0] for r in rows]
+
+    def items(self):
+        with self._store._connect() as conn:
+            rows = conn.execute("SELECT pos, id FROM docs WHERE pos IS NOT NULL ORDER BY pos").fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+
+def source_key(metadata: Dict[str, Any]) -> Optional[str]:
+    """The document a chunk belongs to: the name it was uploaded as, else its source path."""
+    value = metadata.get("file_name") or metadata.get("source")
+    return str(value) if value is not None else None
+
+
+def _to_document(row) -> Document:
+    return Document(id=row[0], page_content=row[1], metadata=json.loads(row[2]))
+
+
+def _faiss_cfg() -> Dict[str, Any]:
+    return load_config().get("faiss_db", {}) or {}
+
+
+def _docstore_backend() -> str:
+    return str(_faiss_cfg().get("docstore", "sqlite")).lower()
+
+
+def mmap_enabled() -> bool:
+    return bool(_faiss_cfg().get("mmap", True))
+
+
+def segment_settings() -> Dict[str, Any]:
+    cfg = _faiss_cfg().get("segments", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", True)) and _docstore_backend() == "sqlite",
+        "max_segments": int(cfg.get("max_segments", 8)),
+        "purge_ratio": float(cfg.get("purge_ratio", 0.2)),
+    }
+
+
+def read_index(path: str | Path, mmap: bool = False):
+    """
+    Read a .faiss file, memory-mapped and read-only when mmap is set.
+
+    Mapped indexes keep their vectors in the OS page cache, shared by every worker
+    process that maps the same file, instead of a private heap copy per worker. They
+    cannot be added to, so only readers should ask for one. Index types (or faiss
+    builds) that cannot be mapped fall back to a normal in-memory read.
+    """
+    if mmap:
+        # MMAP_IFC (faiss >= 1.10) maps code arrays in place for Flat, HNSW, PQ and IVF lists;
+        # older builds only offer MMAP, which maps IVF inverted lists
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) or getattr(faiss, "IO_FLAG_MMAP", 0)
+        if flags:
+            try:
+                index = faiss.read_index(str(path), flags | faiss.IO_FLAG_READ_ONLY)
+                index._mmapped = True  # what index_memory checks; a fallback read below is not mapped
+                return index
+            except RuntimeError as e:
+                log.warning("Memory-mapped index read failed, loading into memory", path=str(path), error=str(e))
+    return faiss.read_index(str(path))
+
+
+def index_settings(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """faiss_db.index from config with defaults filled in (overrides win)."""
+    settings = {
+        "type": "flat",
+        "min_train_vectors": 20000,
+        "nlist": None,  # None: 4 * sqrt(n)
+        "nprobe": 16,
+        "hnsw_m": 32,
+        "ef_construction": 80,
+        "ef_search": 64,
+        "pq_m": 32,
+    }
+    settings.update({k: v for k, v in (_faiss_cfg().get("index", {}) or {}).items() if v is not None})
+    settings.update(overrides or {})
+    settings["type"] = str(settings["type"]).lower()
+    if settings["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown faiss_db.index.type {settings['type']!r}; expected one of {INDEX_TYPES}")
+    return settings
+
+
+def quantization_settings() -> Dict[str, Any]:
+    """
+    faiss_db.quantization from config. type stores flat segments as fp16, int8 scalar
+    codes (sq8) or sign bits (binary) instead of float32; rescore_factor * k candidates
+    from the codes are re-ranked against the full-precision rows kept on disk.
+    """
+    cfg = _faiss_cfg().get("quantization", {}) or {}
+    settings = {
+        "type": str(cfg.get("type", "none")).lower(),
+        "rescore_factor": max(1, int(cfg.get("rescore_factor", 10))),
+    }
+    if settings["type"] not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown faiss_db.quantization.type {settings['type']!r}; expected one of {QUANTIZATION_TYPES}")
+    return settings
+
+
+def index_kind(index) -> str:
+    """Which of INDEX_TYPES an index is (anything unrecognised counts as flat)."""
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+_PQ_MIN_TRAIN = 256 * 39  # 8-bit PQ codebooks: 256 centroids per sub-quantizer
+
+
+def _pq_m(dim: int, wanted: int) -> int:
+    # Sub-quantizers must split the dimension evenly; keep at least 4 dims each
+    return max(m for m in range(1, max(1, min(wanted, dim // 4)) + 1) if dim % m == 0)
+
+
+def new_index(dim: int, vectors: Optional[np.ndarray] = None, settings: Optional[Dict[str, Any]] = None,
+              quantization: Optional[Dict[str, Any]] = None):
+    """
+    Empty index of the configured type, trained on vectors when the type needs it.
+
+    Sessions with fewer than min_train_vectors vectors get an exact Flat index: too
+    few points to train IVF centroids or PQ codebooks well, and flat search is cheap
+    at that size anyway. With quantization (segment builds only), that flat index
+    stores fp16 / int8 / binary codes instead.
+    """
+    s = settings or index_settings()
+    n = 0 if vectors is None else len(vectors)
+    kind = s["type"]
+    needed = max(int(s["min_train_vectors"]), _PQ_MIN_TRAIN if kind == "ivf_pq" else 0)
+    if kind == "flat" or n < needed:
+        if quantization is not None and quantization["type"] != "none" and n:
+            return quantized_index(vectors, quantization["type"])
+        return faiss.IndexFlatL2(dim)
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(s["hnsw_m"]))
+        index.hnsw.efConstruction = int(s["ef_construction"])
+    else:
+        nlist = int(s["nlist"] or 4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))  # faiss wants ~39 training points per centroid
+        spec = f"IVF{nlist},Flat" if kind == "ivf_flat" else f"IVF{nlist},PQ{_pq_m(dim, int(s['pq_m']))}"
+        index = faiss.index_factory(dim, spec)
+        if kind == "ivf_pq":
+            # The factory turns on polysemous code training; it is slow and only helps
+            # Hamming-thresholded search, which is never used here
+            index.do_polysemous_training = False
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+        index.make_direct_map()  # reconstruct() is needed by MMR search
+    tune_index(index, s)
+    log.info("ANN index created", type=kind, dim=dim, trained_on=n)
+    return index
+
+
+def tune_index(index, settings: Optional[Dict[str, Any]] = None):
+    """Apply query-time knobs (nprobe, efSearch); these are not stored in the .faiss file."""
+    s = settings or index_settings()
+    kind = index_kind(index)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if kind == "hnsw":
+        inner.hnsw.efSearch = int(s["ef_search"])
+    elif kind in ("ivf_flat", "ivf_pq"):
+        inner.nprobe = int(s["nprobe"])
+    return index
+
+
+def segment_builder(settings: Optional[Dict[str, Any]] = None, quantization: Optional[Dict[str, Any]] = None):
+    """build(vectors) for segment writes: the configured index type, quantized when flat."""
+    s = settings or index_settings()
+    q = quantization or quantization_settings()
+    return lambda vectors: new_index(vectors.shape[1], vectors, s, q)
+
+
+def promote_index(vs: FAISS, settings: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Rebuild a Flat index as the configured ANN type once it holds enough vectors.
+
+    Vectors are re-added in position order, so the docstore's positions stay valid.
+    Returns True if the index was replaced.
+    """
+    s = settings or index_settings()
+    index = vs.index
+    if isinstance(index, SegmentedIndex):
+        return False  # segment compaction builds the ANN type instead
+    if s["type"] == "flat" or index_kind(index) != "flat" or index.ntotal < int(s["min_train_vectors"]):
+        return False
+    if s["type"] == "ivf_pq" and index.ntotal < _PQ_MIN_TRAIN:
+        return False
+    vectors = index.reconstruct_n(0, index.ntotal)
+    promoted = new_index(index.d, vectors, s)
+    promoted.add(vectors)
+    vs.index = promoted
+    log.info("Flat index promoted", type=s["type"], vectors=index.ntotal)
+    return True
+
+
+_writer_locks: Dict[str, InterProcessLock] = {}
+_writer_locks_guard = threading.Lock()
+
+
+def index_writer_lock(index_dir: str | Path) -> InterProcessLock:
+    """
+    One writer at a time per index directory, across threads and worker processes
+    (flock on writer.lock): a shared tenant index is appended to by every worker.
+    """
+    key = os.path.realpath(index_dir)
+    with _writer_locks_guard:
+        if key not in _writer_locks:
+            _writer_locks[key] = InterProcessLock(Path(key) / "writer.lock")
+        return _writer_locks[key]
+
+
+def scoped_vectorstore(vs: FAISS, sessions: Sequence[str]) -> FAISS:
+    """
+    A FAISS vectorstore over the same index and docstore that only finds chunks
+    tagged with the given sessions. Filtering is done inside the index search
+    (see ScopedIndex), not by over-fetching and discarding hits.
+    """
+    if not (isinstance(vs.docstore, SqliteDocstore) and isinstance(vs.index, SegmentedIndex)):
+        raise ValueError("Session-scoped search needs a segmented index with a sqlite docstore")
+    index = ScopedIndex(vs.index, vs.docstore.positions(sessions))
+    return FAISS(vs.embedding_function, index, vs.docstore, vs.index_to_docstore_id)
+
+
+def similarity_search_batch(vs: FAISS, embeddings: np.ndarray, k: int) -> List[List[Document]]:
+    """
+    The k nearest chunks for each row of embeddings: one index search over the whole
+    query matrix, one position lookup and one docstore read for all hits.
+    """
+    x = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if vs._normalize_L2:
+        faiss.normalize_L2(x)
+    _, positions = vs.index.search(x, k)
+    hits = {int(p) for p in positions.ravel() if p >= 0}
+    id_map = vs.index_to_docstore_id
+    if isinstance(id_map, SqliteIndexMap):
+        ids = id_map.lookup(hits)
+    else:
+        ids = {p: id_map[p] for p in hits if p in id_map}
+    unique = list(dict.fromkeys(ids.values()))
+    if hasattr(vs.docstore, "mget"):
+        docs = dict(zip(unique, vs.docstore.mget(unique)))
+    else:
+        docs = {i: vs.docstore.search(i) for i in unique}
+    return [
+        [docs[ids[int(p)]] for p in row if p >= 0 and int(p) in ids and isinstance(docs[ids[int(p)]], Document)]
+        for row in positions
+    ]
+
+
+def _is_mapped(index) -> bool:
+    return bool(getattr(index, "_mmapped", False))
+
+
+def is_mmapped(vs: FAISS) -> bool:
+    """True when any of vs's vector files was actually memory-mapped."""
+    return bool(getattr(vs, "_mmapped", False))
+
+
+def load_faiss(index_dir: str | Path, embeddings, index_name: str = "index", mmap: bool = False,
+               for_write: bool = False) -> FAISS:
+    """
+    Open a saved index. The sqlite docstore is used when present; a legacy pickle
+    docstore (index.pkl) is only unpickled if faiss_db.allow_pickle is set.
+
+    mmap=True opens the vector files memory-mapped and read-only (see read_index).
+    Segmented indexes stay appendable that way, since adds go to a new in-memory
+    segment; a single-file index opened for_write is always read into memory.
+    Legacy pickle indexes are always read into memory.
+    """
+    base = Path(index_dir)
+    store_path = docstore_path(base, index_name)
+    if store_path.exists():
+        if manifest_path(base, index_name).exists():
+            index = SegmentedIndex.load(base, index_name, lambda p: tune_index(read_index(p, mmap=mmap)))
+            index.rescore_factor = quantization_settings()["rescore_factor"]
+        else:
+            mmap = mmap and not for_write
+            index = tune_index(read_index(base / f"{index_name}.faiss", mmap=mmap))
+        store = SqliteDocstore(store_path)
+        vs = FAISS(embeddings, index, store, store.id_map)
+        if isinstance(index, SegmentedIndex):
+            vs._mmapped = any(_is_mapped(segment.index) for segment in index.segments)
+        else:
+            vs._mmapped = _is_mapped(index)
+        return vs
+
+    if not _faiss_cfg().get("allow_pickle", True):
+        raise ValueError(f"Refusing to unpickle legacy docstore in {base}; re-index or enable faiss_db.allow_pickle")
+    log.warning("Loading legacy pickle docstore", index_dir=str(base), index_name=index_name)
+    vs = FAISS.load_local(str(base), embeddings, index_name=index_name, allow_dangerous_deserialization=True)
+    tune_index(vs.index)
+    return vs
+
+
+def save_faiss(vs: FAISS, index_dir: str | Path, index_name: str = "index"):
+    """
+    Persist vs. With the sqlite backend the docstore rows are already on disk when
+    it is bound to this directory's docstore; otherwise (a fresh in-memory or legacy
+    pickle store) the documents are copied over once and vs is rebound to it.
+    """
+    base = Path(index_dir)
+    base.mkdir(parents=True, exist_ok=True)
+    if _docstore_backend() == "pickle":
+        vs.save_local(str(base), index_name=index_name)
+        return
+
+    store_path = docstore_path(base, index_name)
+    store = vs.docstore
+    if not (isinstance(store, SqliteDocstore) and os.path.realpath(store.db_path) == os.path.realpath(store_path)):
+        for stale in (store_path, Path(f"{store_path}-wal"), Path(f"{store_path}-shm")):
+            if stale.exists():
+                os.remove(stale)
+        sqlite_store = SqliteDocstore(store_path)
+        id_map = dict(vs.index_to_docstore_id)
+        ids = list(id_map.values())
+        for i in range(0, len(ids), _SQL_BATCH):
+            batch = ids[i:i + _SQL_BATCH]
+            sqlite_store.add({id_: _lookup(store, id_) for id_ in batch})
+        sqlite_store.id_map.update(id_map)
+        vs.docstore = sqlite_store
+        vs.index_to_docstore_id = sqlite_store.id_map
+        log.info("Docstore written to sqlite", db_path=str(store_path), documents=len(ids))
+
+    # Docstore rows land first; vector files are replaced atomically so readers and
+    # repair() only ever see positions the saved index covers. A new inode also keeps
+    # workers that have the previous file memory-mapped safe (no truncation under them).
+    seg = segment_settings()
+    if seg["enabled"]:
+        if not isinstance(vs.index, SegmentedIndex):
+            vs.index = SegmentedIndex.from_index(vs.index)  # one-time conversion: whole index -> first segment
+        # Flushed segments are immutable; mapping them keeps a writer's heap to its pending batch
+        reopen = (lambda p: tune_index(read_index(p, mmap=True))) if mmap_enabled() else None
+        vs.index.flush(base, index_name, build=segment_builder(), reopen=reopen)
+        stale = [base / f"{index_name}.faiss"]
+        if len(vs.index.segments) > seg["max_segments"]:
+            schedule_compaction(base, index_name)
+    else:
+        tmp = base / f".{index_name}.faiss.tmp"
+        faiss.write_index(vs.index, str(tmp))
+        os.replace(tmp, base / f"{index_name}.faiss")
+        stale = []
+
+    for path in stale + [base / f"{index_name}.pkl"]:
+        if path.exists():
+            os.remove(path)
+
+
+def _require_segmented(vs: FAISS):
+    if not (isinstance(vs.docstore, SqliteDocstore) and isinstance(vs.index, SegmentedIndex)):
+        raise ValueError("Document deletes need a segmented index with a sqlite docstore (faiss_db.segments.enabled)")
+
+
+def sync_tombstones(vs: FAISS, index_dir: str | Path, index_name: str = "index") -> np.ndarray:
+    """
+    Make sure every deleted docstore row's vector is tombstoned and apply the list to
+    vs. Covers a delete interrupted between flagging rows and writing the tombstones.
+    """
+    _require_segmented(vs)
+    with manifest_lock(index_dir, index_name):
+        tombstones = read_tombstones(index_dir, index_name)
+        missing = np.setdiff1d(vs.docstore.deleted_positions(), tombstones)
+        if missing.size:
+            tombstones = add_tombstones(index_dir, missing, index_name)
+    vs.index.set_tombstones(tombstones)
+    return tombstones
+
+
+def _tombstone(vs: FAISS, index_dir: str | Path, index_name: str, flag: Callable[[], int],
+               **context) -> Dict[str, int]:
+    _require_segmented(vs)
+    with manifest_lock(index_dir, index_name):
+        # Flag rows first: the tombstone file can always be rebuilt from them (sync_tombstones)
+        chunks = flag()
+        tombstones = add_tombstones(index_dir, vs.docstore.deleted_positions(), index_name)
+    vs.index.set_tombstones(tombstones)
+
+    ratio = len(tombstones) / max(1, vs.index.ntotal)
+    if chunks and ratio >= segment_settings()["purge_ratio"]:
+        schedule_compaction(index_dir, index_name)
+    log.info("Documents deleted", index_dir=str(index_dir), chunks=chunks,
+             tombstones=len(tombstones), dead_ratio=round(ratio, 4), **context)
+    return {"chunks_deleted": chunks, "tombstones": len(tombstones)}
+
+
+def tombstone_sources(vs: FAISS, index_dir: str | Path, sources: Sequence[str],
+                      index_name: str = "index", session: Optional[str] = None) -> Dict[str, int]:
+    """
+    Delete every chunk of the given source documents from a segmented index.
+
+    Rows are flagged in the docstore and their vector IDs written to the tombstone
+    file, which searches exclude straight away. The vectors themselves stay in their
+    segments until compaction or purge_index() rewrites them; a purge is scheduled
+    once the tombstoned share of the index reaches faiss_db.segments.purge_ratio.
+    In a shared tenant index, session limits the delete to that session's chunks.
+    """
+    return _tombstone(vs, index_dir, index_name, lambda: vs.docstore.mark_deleted(list(sources), session=session),
+                      sources=len(sources))
+
+
+def tombstone_positions(vs: FAISS, index_dir: str | Path, positions: Sequence[int],
+                        index_name: str = "index") -> Dict[str, int]:
+    """Delete the chunks at these positions (vector IDs), as tombstone_sources does for whole documents."""
+    return _tombstone(vs, index_dir, index_name, lambda: vs.docstore.mark_deleted_positions(positions))
+
+
+_compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compact")
+_compacting: set = set()
+_compacting_lock = threading.Lock()
+
+
+def _drop_purged_rows(index_dir: str | Path, index_name: str):
+    store_path = docstore_path(index_dir, index_name)
+    if not store_path.exists():
+        return
+    with manifest_lock(index_dir, index_name):
+        dropped = SqliteDocstore(store_path).drop_purged(read_tombstones(index_dir, index_name))
+    if dropped:
+        log.info("Purged docstore rows removed", index_dir=str(index_dir), rows=dropped)
+
+
+def compact_index(index_dir: str | Path, index_name: str = "index") -> bool:
+    """Merge small segments now (see faiss_segments.plan_merge); returns True if anything changed."""
+    changed = False
+    # A merge can leave the index still over the limit (e.g. many small tail segments)
+    while compact(
+        index_dir,
+        index_name,
+        read=lambda p: read_index(p, mmap=mmap_enabled()),
+        build=segment_builder(),
+        max_segments=segment_settings()["max_segments"],
+    ):
+        changed = True
+    if changed:
+        _drop_purged_rows(index_dir, index_name)
+    return changed
+
+
+def purge_index(index_dir: str | Path, index_name: str = "index", min_dead_ratio: Optional[float] = None) -> int:
+    """
+    Rewrite segments without their tombstoned vectors (those whose dead share is at
+    least min_dead_ratio, default faiss_db.segments.purge_ratio; 0 purges every one).
+    Returns the number of vectors removed.
+    """
+    if not manifest_path(index_dir, index_name).exists():
+        return 0
+    ratio = segment_settings()["purge_ratio"] if min_dead_ratio is None else min_dead_ratio
+    removed = purge(
+        index_dir,
+        index_name,
+        read=lambda p: read_index(p, mmap=mmap_enabled()),
+        build=segment_builder(),
+        min_dead_ratio=ratio,
+    )
+    if removed:
+        _drop_purged_rows(index_dir, index_name)
+    return removed
+
+
+def schedule_compaction(index_dir: str | Path, index_name: str = "index"):
+    """Compact and purge on the background compaction thread; at most one pending run per index."""
+    key = (os.path.realpath(index_dir), index_name)
+    with _compacting_lock:
+        if key in _compacting:
+            return
+        _compacting.add(key)
+
+    def run():
+        try:
+            compact_index(index_dir, index_name)
+            purge_index(index_dir, index_name)
+        except Exception as e:
+            log.error("Segment compaction failed", index_dir=str(index_dir), error=str(e))
+        finally:
+            with _compacting_lock:
+                _compacting.discard(key)
+
+    _compactor.submit(run)
+
+
+def _lookup(store: Any, id_: str) -> Document:
+    doc = store.search(id_)
+    if not isinstance(doc, Document):
+        raise ValueError(f"Could not find document for id {id_}, got {doc}")
+    return doc
@@ -1,11 +1,14 @@
 from __future__ import annotations
+import os
 import re
 import uuid
+import hashlib
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from typing import Iterable, List
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
 from exception.custom_exception import DocumentPortalException
+from utils.config_loader import load_config
 
 #from logger import GLOBAL_LOGGER as log
 from custom_logging import GLOBAL_LOGGER as log
@@ -14,6 +17,27 @@ from custom_logging import GLOBAL_LOGGER as log
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
+_UPLOAD_CFG = load_config().get("uploads", {}) or {}
+UPLOAD_CHUNK_SIZE = int(_UPLOAD_CFG.get("chunk_size_kb", 1024)) * 1024
+MAX_FILE_BYTES = int(_UPLOAD_CFG.get("max_file_mb", 200)) * 1024 * 1024
+MAX_REQUEST_BYTES = int(_UPLOAD_CFG.get("max_request_mb", 500)) * 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """An upload crossed the per-file or per-request size limit."""
+
+
+class UploadBudget:
+    """Running byte count shared by all files of one request."""
+    def __init__(self, max_bytes: int = MAX_REQUEST_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    def consume(self, n: int):
+        self.used += n
+        if self.used > self.max_bytes:
+            raise UploadTooLarge(f"Request exceeds the {self.max_bytes} byte upload limit")
+
 # ----------------------------- #
 # Helpers (file I/O + loading)  #
 # ----------------------------- #
@@ -21,8 +45,62 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
+def _iter_upload_chunks(uf, chunk_size: int) -> Iterator[bytes]:
+    if hasattr(uf, "open"):          # FastAPIFileAdapter: stream the spooled temp file
+        src: BinaryIO = uf.open()
+    elif hasattr(uf, "read"):        # Streamlit UploadedFile / plain file objects
+        src = uf
+    else:                            # fallback: anything exposing getbuffer()
+        view = memoryview(uf.getbuffer())
+        for i in range(0, len(view), chunk_size):
+            yield bytes(view[i:i + chunk_size])
+        return
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def copy_upload(
+    uf,
+    out: Path,
+    *,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_bytes: int = MAX_FILE_BYTES,
+    budget: Optional[UploadBudget] = None,
+) -> Tuple[int, str]:
+    """
+    Copy an upload to `out` in fixed-size chunks, hashing as it goes.
+
+    Memory stays at one chunk regardless of file size. Size limits are enforced
+    mid-copy; on violation the partial file is removed and UploadTooLarge raised.
+    (FastAPI has spooled the request body by then; the API rejects an oversized
+    Content-Length before that.)
+    Returns (bytes_written, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(out, "wb") as f:
+            for chunk in _iter_upload_chunks(uf, chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{getattr(uf, 'name', 'file')} exceeds the {max_bytes} byte file limit")
+                if budget is not None:
+                    budget.consume(len(chunk))
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(out):
+            os.remove(out)
+        raise
+    return size, digest.hexdigest()
+
+
+def save_uploaded_files(uploaded_files: Iterable, target_dir: Path, budget: Optional[UploadBudget] = None) -> List[Path]:
     """Save uploaded files (Streamlit-like) and return local paths."""
+    budget = budget or UploadBudget()
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
         saved: List[Path] = []
@@ -37,14 +115,12 @@ def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path
             fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
             fname = f"{uuid.uuid4().hex[:8]}{ext}"
             out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
+            size, sha256 = copy_upload(uf, out, budget=budget)
             saved.append(out)
-            log.info("File saved for ingestion", uploaded=name, saved_as=str(out))
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), bytes=size, sha256=sha256)
         return saved
+    except UploadTooLarge:
+        raise
     except Exception as e:
         log.error("Failed to save uploaded files", error=str(e), dir=str(target_dir))
         raise DocumentPortalException("Failed to save uploaded files", e) from e
\ No newline at end of file
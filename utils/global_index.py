@@ -0,0 +1,41 @@
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.config_loader import load_config
+
+_TAG_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+
+def global_index_settings() -> Dict[str, Any]:
+    """
+    faiss_db.global_index from config.
+
+    When enabled, sessions no longer get an index directory each: every tenant has
+    one shared (segmented) index, its chunks tagged with tenant, session and
+    document, and queries are scoped to sessions by pre-filtering on those tags.
+    """
+    cfg = (load_config().get("faiss_db", {}) or {}).get("global_index", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "default_tenant": str(cfg.get("default_tenant", "default")),
+        "dir_name": str(cfg.get("dir_name", "_tenants")),
+    }
+
+
+def is_valid_tag(value: Optional[str]) -> bool:
+    """Tenant and session IDs become path components and tags: keep them plain."""
+    return bool(value) and bool(_TAG_RE.match(value))
+
+
+def resolve_tenant(tenant_id: Optional[str]) -> str:
+    tenant = tenant_id or global_index_settings()["default_tenant"]
+    if not is_valid_tag(tenant):
+        raise ValueError(f"Invalid tenant id: {tenant!r}")
+    return tenant
+
+
+def tenant_index_dir(faiss_base: str | Path, tenant_id: Optional[str] = None) -> Path:
+    """Directory of a tenant's shared index: <faiss_base>/<dir_name>/<tenant>."""
+    return Path(faiss_base) / global_index_settings()["dir_name"] / resolve_tenant(tenant_id)
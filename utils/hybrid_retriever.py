@@ -0,0 +1,127 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+from pydantic import ConfigDict
+
+from utils.config_loader import load_config
+from utils.faiss_segments import ScopedIndex, SegmentedIndex
+from utils.lexical_index import LexicalIndex
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+# BM25 is numpy-bound and releases the GIL for most of its work; a small pool is enough
+_LEXICAL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+
+SEARCH_TYPES = ("similarity", "mmr", "hybrid")
+
+
+def default_search_type() -> str:
+    """retriever.search_type from config ("similarity" unless set)."""
+    return str((load_config().get("retriever", {}) or {}).get("search_type", "similarity"))
+
+
+def hybrid_settings() -> Dict[str, Any]:
+    """retriever.hybrid from config: candidates fetched per ranker and the RRF constant."""
+    cfg = (load_config().get("retriever", {}) or {}).get("hybrid", {}) or {}
+    return {
+        "fetch_k": int(cfg.get("fetch_k", 20)),
+        "rrf_k": int(cfg.get("rrf_k", 60)),
+    }
+
+
+def rrf_fuse(rankings: List[List[Tuple[str, Document]]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Reciprocal rank fusion: score(d) = sum over rankings of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, (key, doc) in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 over the index's lexical segments and dense similarity search, run
+    concurrently and fused with reciprocal rank fusion.
+
+    Lexical hits are FAISS positions, so they go through the same docstore,
+    tombstones and session scope as the vector hits. Without a lexical index
+    (built before BM25 existed) this is plain similarity search.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    lexical: Optional[LexicalIndex] = None
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        pending = _LEXICAL_POOL.submit(self._lexical_hits, query)
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        return self._fuse(dense, pending.result())
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        lexical = asyncio.get_running_loop().run_in_executor(_LEXICAL_POOL, self._lexical_hits, query)
+        dense, hits = await asyncio.gather(self.vectorstore.asimilarity_search(query, k=self.fetch_k), lexical)
+        return self._fuse(dense, hits)
+
+    # ---------- Internals ----------
+
+    def _fuse(self, dense: List[Document], lexical: List[Tuple[str, Document]]) -> List[Document]:
+        ranked_dense = [(self._key(d), d) for d in dense]
+        return rrf_fuse([ranked_dense, lexical], self.k, self.rrf_k)
+
+    @staticmethod
+    def _key(doc: Document) -> str:
+        return doc.id or (doc.metadata or {}).get("chunk_id") or doc.page_content
+
+    def _lexical_hits(self, query: str) -> List[Tuple[str, Document]]:
+        if self.lexical is None:
+            return []
+        index = self.vectorstore.index
+        allowed, exclude = None, None
+        if isinstance(index, ScopedIndex):
+            allowed, index = index.allowed, index.base
+        if isinstance(index, SegmentedIndex):
+            exclude = index.tombstones
+        hits = self.lexical.search(query, self.fetch_k, exclude=exclude, allowed=allowed)
+
+        ids = []
+        for pos, _ in hits:
+            try:
+                ids.append(self.vectorstore.index_to_docstore_id[pos])
+            except KeyError:
+                continue  # purged since the lexical segment was written
+        store = self.vectorstore.docstore
+        if hasattr(store, "mget"):
+            found = store.mget(ids)
+        else:
+            found = [store.search(i) for i in ids]
+        return [(self._key(doc), doc) for doc in found if isinstance(doc, Document)]
+
+
+def hybrid_retriever(vectorstore: FAISS, lexical: Optional[LexicalIndex], search_kwargs: Dict[str, Any]) -> HybridRetriever:
+    settings = hybrid_settings()
+    k = int(search_kwargs.get("k", 4))
+    if lexical is None:
+        log.warning("No lexical index, hybrid retrieval falls back to vector search only")
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        lexical=lexical,
+        k=k,
+        fetch_k=max(k, int(search_kwargs.get("fetch_k", settings["fetch_k"]))),
+        rrf_k=int(search_kwargs.get("rrf_k", settings["rrf_k"])),
+    )
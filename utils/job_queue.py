@@ -0,0 +1,190 @@
+from __future__ import annotations
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.config_loader import load_config
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested."""
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the pending-job limit is reached."""
+
+
+class JobContext:
+    """Handle passed to a running job for progress reporting and cooperative cancellation."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self._queue = queue
+        self.job_id = job_id
+        self._progress: Dict[str, Any] = {}
+
+    def update(self, **progress: Any):
+        """Merge progress counters into the job record; raises JobCancelled if a cancel is pending."""
+        self._progress.update(progress)
+        self._queue._write(self.job_id, progress=self._progress)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._queue._cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+
+class JobQueue:
+    """
+    Bounded in-process job runner with a sqlite-backed status table.
+
+    Jobs run on a fixed-size thread pool; their status, progress and result live in sqlite
+    so any worker process sharing the database file can report on or cancel a job.
+    No external broker is needed.
+    """
+
+    def __init__(self, db_path: str | Path, max_workers: int = 2, max_pending: int = 32):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._pending = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def submit(self, kind: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> str:
+        """Queue func(ctx, *args, **kwargs) and return its job ID immediately."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Too many pending jobs (limit {self.max_pending})")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, now, now),
+            )
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        log.info("Job queued", job_id=job_id, kind=kind)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"] or "{}")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; queued jobs never start, running jobs stop at their next progress update."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                f"UPDATE jobs SET cancel_requested = 1, updated_at = ? "
+                f"WHERE id = ? AND status NOT IN ({','.join('?' * len(TERMINAL_STATES))})",
+                (time.time(), job_id, *TERMINAL_STATES),
+            )
+        if cur.rowcount:
+            log.info("Job cancellation requested", job_id=job_id)
+        return bool(cur.rowcount)
+
+    # ---------- Internals ----------
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _write(self, job_id: str, **fields: Any):
+        for key in ("progress", "result"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def _run(self, job_id: str, func: Callable[..., Any], args: tuple, kwargs: dict):
+        ctx = JobContext(self, job_id)
+        try:
+            ctx.check_cancelled()
+            self._write(job_id, status=RUNNING)
+            result = func(ctx, *args, **kwargs)
+            self._write(job_id, status=SUCCEEDED, result=result)
+            log.info("Job succeeded", job_id=job_id)
+        except Exception as e:
+            if _caused_by_cancel(e):
+                self._write(job_id, status=CANCELLED)
+                log.info("Job cancelled", job_id=job_id)
+                return
+            self._write(job_id, status=FAILED, error=str(e))
+            log.error("Job failed", job_id=job_id, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+def _caused_by_cancel(exc: Optional[BaseException]) -> bool:
+    # Callers often wrap errors (DocumentPortalException(...) from e), so walk the chain
+    while exc is not None:
+        if isinstance(exc, JobCancelled):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide ingestion job queue, created on first use from config."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            cfg = load_config().get("ingestion_jobs", {}) or {}
+            _job_queue = JobQueue(
+                db_path=cfg.get("db_path", "data/jobs.sqlite"),
+                max_workers=int(cfg.get("max_workers", 2)),
+                max_pending=int(cfg.get("max_pending", 32)),
+            )
+        return _job_queue
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.config_loader import load_config
+from utils.faiss_segments import plan_merge
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+TOKENIZER_VERSION = 1
+
+# Words plus identifiers that keep their inner separators: "7.2", "pn-4471-b", "iso/iec"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/\-][a-z0-9]+)*")
+_PART_RE = re.compile(r"[._/\-]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+_MAX_LEN = np.iinfo(np.uint16).max
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def lexical_settings() -> Dict[str, Any]:
+    """retriever.lexical from config: whether ingestion builds BM25 segments, and how many to keep."""
+    cfg = (load_config().get("retriever", {}) or {}).get("lexical", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "max_segments": int(cfg.get("max_segments", 8)),
+    }
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased terms for BM25. Identifiers are kept whole ("7.2", "a-113") and also
+    split into their parts, so "clause 7.2" matches exactly and "7" still matches loosely.
+    """
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if _PART_RE.search(token):
+            tokens.extend(p for p in _PART_RE.split(token) if p and p not in _STOPWORDS)
+    return tokens
+
+
+def lexical_manifest_path(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.lexical.json"
+
+
+def lexical_dir(index_dir: str | Path, index_name: str = "index") -> Path:
+    return Path(index_dir) / f"{index_name}.lexical"
+
+
+def _lock(index_dir: str | Path, index_name: str) -> threading.Lock:
+    key = os.path.realpath(lexical_manifest_path(index_dir, index_name))
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _read_manifest(index_dir: str | Path, index_name: str) -> Dict[str, Any]:
+    path = lexical_manifest_path(index_dir, index_name)
+    if not path.exists():
+        return {"format": 1, "tokenizer": TOKENIZER_VERSION, "next_segment": 1, "segments": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_manifest(index_dir: str | Path, manifest: Dict[str, Any], index_name: str):
+    path = lexical_manifest_path(index_dir, index_name)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class LexicalSegment:
+    """
+    Inverted index over one batch of chunks, all in flat numpy arrays.
+
+    terms is the sorted term dictionary; the postings of terms[i] are
+    postings[offsets[i]:offsets[i+1]] (FAISS positions, ascending) with their term
+    frequencies and document lengths alongside.
+    """
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                 lengths: np.ndarray, doc_positions: np.ndarray, doc_lengths: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.lengths = lengths
+        self.doc_positions = doc_positions
+        self.doc_lengths = doc_lengths
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_positions)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.terms, self.offsets, self.postings, self.tfs, self.lengths,
+                                      self.doc_positions, self.doc_lengths))
+
+    @classmethod
+    def build(cls, texts: Sequence[str], positions: Sequence[int]) -> "LexicalSegment":
+        term_ids: Dict[str, int] = {}
+        rows_term, rows_pos, rows_tf, rows_len = [], [], [], []
+        doc_lengths = []
+        for text, pos in zip(texts, positions):
+            counts = Counter(tokenize(text))
+            length = min(sum(counts.values()), _MAX_LEN)
+            doc_lengths.append(length)
+            for term, tf in counts.items():
+                rows_term.append(term_ids.setdefault(term, len(term_ids)))
+                rows_pos.append(pos)
+                rows_tf.append(min(tf, _MAX_LEN))
+                rows_len.append(length)
+
+        vocab = np.array(list(term_ids), dtype=str) if term_ids else np.zeros(0, dtype="<U1")
+        # Renumber term ids in sorted-term order, then group postings by term, positions ascending
+        order = np.argsort(vocab, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        term_rank = rank[np.asarray(rows_term, dtype=np.int64)] if rows_term else np.zeros(0, np.int64)
+        pos = np.asarray(rows_pos, dtype=np.uint32)
+        sort = np.lexsort((pos, term_rank))
+        counts = np.bincount(term_rank, minlength=len(vocab))
+        return cls(
+            terms=vocab[order],
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            postings=pos[sort],
+            tfs=np.asarray(rows_tf, dtype=np.uint16)[sort],
+            lengths=np.asarray(rows_len, dtype=np.uint16)[sort],
+            doc_positions=np.asarray(positions, dtype=np.uint32),
+            doc_lengths=np.asarray(doc_lengths, dtype=np.uint16),
+        )
+
+    @classmethod
+    def merge(cls, segments: List["LexicalSegment"], live: Optional[np.ndarray] = None) -> "LexicalSegment":
+        """One segment holding all postings of segments, minus positions not in live (if given)."""
+        vocab = np.unique(np.concatenate([s.terms for s in segments]))
+        # Integer term ids into the merged dictionary, one per posting
+        term_rank = np.concatenate([np.repeat(np.searchsorted(vocab, s.terms), np.diff(s.offsets)) for s in segments])
+        postings = np.concatenate([s.postings for s in segments])
+        tfs = np.concatenate([s.tfs for s in segments])
+        lengths = np.concatenate([s.lengths for s in segments])
+        doc_positions = np.concatenate([s.doc_positions for s in segments])
+        doc_lengths = np.concatenate([s.doc_lengths for s in segments])
+        if live is not None:
+            keep = np.isin(postings, live)
+            term_rank, postings, tfs, lengths = term_rank[keep], postings[keep], tfs[keep], lengths[keep]
+            keep_docs = np.isin(doc_positions, live)
+            doc_positions, doc_lengths = doc_positions[keep_docs], doc_lengths[keep_docs]
+
+            used = np.bincount(term_rank, minlength=len(vocab)) > 0
+            vocab, term_rank = vocab[used], (np.cumsum(used) - 1)[term_rank]
+        # Segments are in position order, so a stable sort by term keeps each postings list ascending
+        sort = np.argsort(term_rank, kind="stable")
+        counts = np.bincount(term_rank, minlength=len(vocab))
+        return cls(vocab, np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), postings[sort], tfs[sort],
+                   lengths[sort], doc_positions, doc_lengths)
+
+    def save(self, path: Path):
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, terms=self.terms, offsets=self.offsets, postings=self.postings, tfs=self.tfs,
+                     lengths=self.lengths, doc_positions=self.doc_positions, doc_lengths=self.doc_lengths)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalSegment":
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def lookup(self, term: str) -> Tuple[int, int]:
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return int(self.offsets[i]), int(self.offsets[i + 1])
+        return 0, 0
+
+
+class LexicalIndex:
+    """
+    BM25 over every lexical segment of an index. Document ids are FAISS positions,
+    so hits resolve through the same docstore, tombstones and session scopes as
+    vector hits.
+    """
+
+    def __init__(self, segments: List[LexicalSegment], k1: float = 1.2, b: float = 0.75):
+        self.segments = segments
+        self.k1 = k1
+        self.b = b
+        self.n_docs = sum(s.n_docs for s in segments)
+        total = sum(int(s.doc_lengths.sum()) for s in segments)
+        self.avgdl = total / self.n_docs if self.n_docs else 1.0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self.segments)
+
+    @classmethod
+    def load(cls, index_dir: str | Path, index_name: str = "index") -> Optional["LexicalIndex"]:
+        """The index's lexical segments, or None if it has none (built before BM25 existed)."""
+        if not lexical_manifest_path(index_dir, index_name).exists():
+            return None
+        seg_dir = lexical_dir(index_dir, index_name)
+        for attempt in range(3):
+            manifest = _read_manifest(index_dir, index_name)
+            if manifest.get("tokenizer") != TOKENIZER_VERSION:
+                log.warning("Lexical index built with another tokenizer, ignoring", index_dir=str(index_dir))
+                return None
+            try:
+                return cls([LexicalSegment.load(seg_dir / s["name"]) for s in manifest["segments"]])
+            except FileNotFoundError:
+                if attempt == 2:  # merged away between reading the manifest and the files
+                    raise
+
+    def search(self, query: str, k: int, exclude: Optional[np.ndarray] = None,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (position, BM25 score), skipping excluded positions and, if given, anything not allowed."""
+        terms = set(tokenize(query))
+        if not terms or not self.n_docs:
+            return []
+        positions, weights = [], []
+        for term in terms:
+            spans = [(seg, *seg.lookup(term)) for seg in self.segments]
+            df = sum(end - start for _, start, end in spans)
+            if not df:
+                continue
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            for seg, start, end in spans:
+                if end == start:
+                    continue
+                tf = seg.tfs[start:end].astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * seg.lengths[start:end] / self.avgdl)
+                positions.append(seg.postings[start:end])
+                weights.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not positions:
+            return []
+
+        candidates = np.concatenate(positions).astype(np.int64)
+        weights = np.concatenate(weights)
+        base = int(candidates.min())
+        span = int(candidates.max()) - base + 1
+        if span <= 4 * len(candidates) + 65536:
+            # Dense accumulation (no sort) while the positions hit are not spread too thinly
+            scores = np.bincount(candidates - base, weights=weights)
+            ids = np.flatnonzero(scores)
+            scores = scores[ids]
+            ids += base
+        else:
+            ids, inverse = np.unique(candidates, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+        keep = np.ones(len(ids), dtype=bool)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(ids, exclude)
+        if allowed is not None:
+            keep &= np.isin(ids, allowed)
+        ids, scores = ids[keep], scores[keep]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def add_lexical_batch(
+    index_dir: str | Path,
+    texts: Sequence[str],
+    positions: Sequence[int],
+    index_name: str = "index",
+    max_segments: int = 8,
+    live: Optional[Callable[[], np.ndarray]] = None,
+) -> str:
+    """
+    Index one ingest batch as a new lexical segment (existing files are not rewritten).
+
+    Once there are more than max_segments, a tiered run of the newest segments is
+    merged (faiss_segments.plan_merge); live() supplies the positions still in the
+    vector index so deleted chunks drop out of the merged postings.
+    """
+    seg_dir = lexical_dir(index_dir, index_name)
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    segment = LexicalSegment.build(texts, positions)
+    with _lock(index_dir, index_name):
+        manifest = _read_manifest(index_dir, index_name)
+        if manifest.get("tokenizer") != TOKENIZER_VERSION:
+            manifest = {"format": 1, "tokenizer": TOKENIZER_VERSION, "next_segment": manifest.get("next_segment", 1),
+                        "segments": []}
+        name = f"lex-{manifest['next_segment']:06d}.npz"
+        segment.save(seg_dir / name)
+        entries = manifest["segments"] + [{"name": name, "docs": segment.n_docs}]
+        manifest = {**manifest, "next_segment": manifest["next_segment"] + 1, "segments": entries}
+
+        plan = plan_merge([e["docs"] for e in entries], max_segments)
+        merged_away: List[str] = []
+        if plan is not None:
+            start, end = plan
+            run = entries[start:end]
+            merged = LexicalSegment.merge([LexicalSegment.load(seg_dir / e["name"]) for e in run],
+                                          live() if live is not None else None)
+            merged_name = f"lex-{manifest['next_segment']:06d}.npz"
+            merged.save(seg_dir / merged_name)
+            entries = entries[:start] + [{"name": merged_name, "docs": merged.n_docs}] + entries[end:]
+            manifest = {**manifest, "next_segment": manifest["next_segment"] + 1, "segments": entries}
+            merged_away = [e["name"] for e in run]
+        _write_manifest(index_dir, manifest, index_name)
+
+    for old in merged_away:
+        try:
+            os.remove(seg_dir / old)
+        except FileNotFoundError:
+            pass
+    log.info("Lexical segment written", index_dir=str(index_dir), segment=name, docs=segment.n_docs,
+             terms=len(segment.terms), postings=len(segment.postings), segments=len(entries),
+             merged=len(merged_away))
+    return name
@@ -0,0 +1,103 @@
+from __future__ import annotations
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+from pydantic import ConfigDict
+
+from utils.config_loader import load_config
+
+
+def mmr_settings() -> Dict[str, Any]:
+    """retriever.mmr from config: candidate pool size and relevance/diversity trade-off."""
+    cfg = (load_config().get("retriever", {}) or {}).get("mmr", {}) or {}
+    return {
+        "fetch_k": int(cfg.get("fetch_k", 50)),
+        "lambda_mult": float(cfg.get("lambda_mult", 0.5)),
+    }
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Maximal marginal relevance over a candidate matrix: indices of k rows, each
+    maximising lambda * sim(query, row) - (1 - lambda) * max sim(row, already picked).
+
+    Cosine similarities to the query come from one matrix-vector product; each greedy
+    step adds one more (the new pick against every candidate) to a running-max
+    redundancy vector, so the full candidate Gram matrix is never built.
+    """
+    n = len(candidates)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    rows = np.asarray(candidates, dtype=np.float32)
+    rows = rows / np.maximum(np.sqrt(np.einsum("ij,ij->i", rows, rows)), 1e-12)[:, None]
+    q = np.asarray(query, dtype=np.float32).ravel()
+    relevance = rows @ (q / max(float(np.linalg.norm(q)), 1e-12))
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = rows @ rows[picked[0]]
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < k:
+        score = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, rows @ rows[best], out=redundancy)
+    return picked
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Diversity-aware retrieval: the fetch_k nearest chunks are re-ranked with
+    maximal marginal relevance, so overlapping neighbouring chunks do not fill the
+    top-k. Candidate vectors are read back in one batch and only the k chosen
+    chunks are fetched from the docstore.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: FAISS
+    k: int = 5
+    fetch_k: int = 50
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vs = self.vectorstore
+        embedding = np.asarray([vs.embedding_function.embed_query(query)], dtype=np.float32)
+        if vs._normalize_L2:
+            faiss.normalize_L2(embedding)
+        _, ids = vs.index.search(embedding, self.fetch_k)
+        ids = ids[0][ids[0] >= 0]
+        if not len(ids):
+            return []
+        index = vs.index
+        if hasattr(index, "reconstruct_batch"):
+            vectors = index.reconstruct_batch(ids)
+        else:
+            vectors = np.vstack([index.reconstruct(int(i)) for i in ids])
+        chosen = [int(ids[i]) for i in mmr_select(embedding[0], vectors, self.k, self.lambda_mult)]
+
+        doc_ids = [vs.index_to_docstore_id[pos] for pos in chosen]
+        if hasattr(vs.docstore, "mget"):
+            docs = vs.docstore.mget(doc_ids)
+        else:
+            docs = [vs.docstore.search(i) for i in doc_ids]
+        return [d for d in docs if isinstance(d, Document)]
+
+
+def mmr_retriever(vectorstore: FAISS, search_kwargs: Dict[str, Any]) -> MMRRetriever:
+    settings = mmr_settings()
+    k = int(search_kwargs.get("k", 4))
+    return MMRRetriever(
+        vectorstore=vectorstore,
+        k=k,
+        fetch_k=max(k, int(search_kwargs.get("fetch_k", settings["fetch_k"]))),
+        lambda_mult=float(search_kwargs.get("lambda_mult", settings["lambda_mult"])),
+    )
@@ -1,13 +1,18 @@
 import os
 import sys
 import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+import httpx
 from dotenv import load_dotenv
-from utils.config_loader import load_config
+from utils.config_loader import clear_config_cache, load_config
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
 from custom_logging import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
+from utils.embedding_cache import CachedEmbeddings
+from utils.embedding_executor import BatchedEmbeddings
 
 class ApiKeyManager:
     REQUIRED_KEYS = ["OPENAI_API_KEY"]
@@ -67,22 +72,19 @@ class ModelLoader:
         self.config = load_config()
         log.info("YAML config loaded", config_keys=list(self.config.keys()))
 
-    def load_embeddings(self):
+    def embedding_settings(self) -> Dict[str, Any]:
         """
-        Load and return embedding model from Google Generative AI.
+        Resolve the embedding provider/model from config (no client is created).
         """
-        try:
-            model_name = self.config["embedding_model"]["model_name"]
-            log.info("Loading embedding model", model=model_name)
-            return OpenAIEmbeddings(model=model_name,
-                                                api_key=self.api_key_mgr.get("OPENAI_API_KEY")) #type: ignore
-        except Exception as e:
-            log.error("Error loading embedding model", error=str(e))
-            raise DocumentPortalException("Failed to load embedding model", sys)
+        emb_block = self.config["embedding_model"]
+        return {
+            "provider": emb_block.get("provider", "openai"),
+            "model_name": emb_block["model_name"],
+        }
 
-    def load_llm(self):
+    def llm_settings(self) -> Dict[str, Any]:
         """
-        Load and return the configured LLM model.
+        Resolve the active LLM provider block from config and LLM_PROVIDER (no client is created).
         """
         llm_block = self.config["llm"]
         provider_key = os.getenv("LLM_PROVIDER", "openai")
@@ -92,10 +94,42 @@ class ModelLoader:
             raise ValueError(f"LLM provider '{provider_key}' not found in config")
 
         llm_config = llm_block[provider_key]
-        provider = llm_config.get("provider")
-        model_name = llm_config.get("model_name")
-        temperature = llm_config.get("temperature", 0.2)
-        max_tokens = llm_config.get("max_output_tokens", 2048)
+        return {
+            "provider": llm_config.get("provider"),
+            "model_name": llm_config.get("model_name"),
+            "temperature": llm_config.get("temperature", 0.2),
+            "max_tokens": llm_config.get("max_output_tokens", 2048),
+        }
+
+    def load_embeddings(self, http_client: Optional[httpx.Client] = None,
+                        http_async_client: Optional[httpx.AsyncClient] = None,
+                        max_retries: Optional[int] = None):
+        """
+        Load and return embedding model from Google Generative AI.
+        """
+        try:
+            model_name = self.embedding_settings()["model_name"]
+            log.info("Loading embedding model", model=model_name)
+            extra = {} if max_retries is None else {"max_retries": max_retries}
+            return OpenAIEmbeddings(model=model_name,
+                                    api_key=self.api_key_mgr.get("OPENAI_API_KEY"), #type: ignore
+                                    http_client=http_client,
+                                    http_async_client=http_async_client,
+                                    **extra)
+        except Exception as e:
+            log.error("Error loading embedding model", error=str(e))
+            raise DocumentPortalException("Failed to load embedding model", sys)
+
+    def load_llm(self, http_client: Optional[httpx.Client] = None,
+                 http_async_client: Optional[httpx.AsyncClient] = None):
+        """
+        Load and return the configured LLM model.
+        """
+        settings = self.llm_settings()
+        provider = settings["provider"]
+        model_name = settings["model_name"]
+        temperature = settings["temperature"]
+        max_tokens = settings["max_tokens"]
 
         log.info("Loading LLM", provider=provider, model=model_name)
 
@@ -112,6 +146,8 @@ class ModelLoader:
                 model=model_name,
                 api_key=self.api_key_mgr.get("GROQ_API_KEY"), #type: ignore
                 temperature=temperature,
+                http_client=http_client,
+                http_async_client=http_async_client,
             )
 
         elif provider == "openai":
@@ -119,7 +155,9 @@ class ModelLoader:
                 model=model_name,
                 api_key=self.api_key_mgr.get("OPENAI_API_KEY"),
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                http_client=http_client,
+                http_async_client=http_async_client,
             )
 
         else:
@@ -127,6 +165,133 @@ class ModelLoader:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
 
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of LLM and embedding clients.
+
+    The underlying ModelLoader (dotenv, YAML config, API keys) is built once, and each
+    client is created once per (kind, provider, model, params) key. OpenAI/Groq clients
+    share one keep-alive HTTP connection pool, so warm requests skip the TCP/TLS handshake.
+    Exposes the same load_llm()/load_embeddings() interface as ModelLoader.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loader: Optional[ModelLoader] = None
+        self._clients: Dict[Tuple, Any] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loader(self) -> ModelLoader:
+        with self._lock:
+            if self._loader is None:
+                self._loader = ModelLoader()
+            return self._loader
+
+    def _http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        with self._lock:
+            if self._http_client is None or self._http_async_client is None:
+                cfg = self.loader.config.get("http_client", {}) or {}
+                limits = httpx.Limits(
+                    max_connections=cfg.get("max_connections", 100),
+                    max_keepalive_connections=cfg.get("max_keepalive_connections", 20),
+                    keepalive_expiry=cfg.get("keepalive_expiry", 30),
+                )
+                timeout = httpx.Timeout(cfg.get("timeout", 60))
+                self._http_client = httpx.Client(limits=limits, timeout=timeout)
+                self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+                log.info("Shared HTTP connection pool created", **cfg)
+            return self._http_client, self._http_async_client
+
+    def _get_or_create(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            client = factory()
+            self._clients[key] = client
+            log.info("Model client cached", key=list(key), cached_clients=len(self._clients))
+            return client
+
+    def load_llm(self):
+        """
+        Return the shared client for the active LLM provider, creating it on first use.
+        """
+        settings = self.loader.llm_settings()
+        key = ("llm", settings["provider"], settings["model_name"],
+               settings["temperature"], settings["max_tokens"])
+        return self._get_or_create(key, lambda: self.loader.load_llm(*self._http_clients()))
+
+    def load_embeddings(self):
+        """
+        Return the shared embedding client, creating it on first use.
+
+        The provider client is wrapped in BatchedEmbeddings (token-budgeted concurrent
+        batches, adaptive 429 backoff) and, when embedding_cache.enabled is set, in a
+        persistent CachedEmbeddings so only cache misses are batched out.
+        """
+        settings = self.loader.embedding_settings()
+        key = ("embeddings", settings["provider"], settings["model_name"])
+        return self._get_or_create(key, self._build_embeddings)
+
+    def _build_embeddings(self):
+        exec_cfg = self.loader.config.get("embedding_executor", {}) or {}
+        client = self.loader.load_embeddings(
+            *self._http_clients(), max_retries=exec_cfg.get("client_max_retries")
+        )
+        embeddings = BatchedEmbeddings(
+            client,
+            max_batch_tokens=int(exec_cfg.get("max_batch_tokens", 100_000)),
+            max_batch_size=int(exec_cfg.get("max_batch_size", 512)),
+            max_concurrency=int(exec_cfg.get("max_concurrency", 4)),
+            max_retries=int(exec_cfg.get("max_retries", 8)),
+        )
+
+        cache_cfg = self.loader.config.get("embedding_cache", {}) or {}
+        if not cache_cfg.get("enabled", False):
+            return embeddings
+        return CachedEmbeddings(
+            embeddings,
+            db_path=cache_cfg.get("db_path", "data/embedding_cache.sqlite"),
+            model_name=self.loader.embedding_settings()["model_name"],
+            dimensions=getattr(client, "dimensions", None),
+            max_bytes=int(cache_cfg.get("max_mb", 2048)) * 1024 * 1024,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {"hits": self.hits, "misses": self.misses, "clients": len(self._clients)}
+            caches = [c for c in self._clients.values() if isinstance(c, CachedEmbeddings)]
+        if caches:
+            stats["embedding_cache"] = caches[0].stats()
+        return stats
+
+    def clear(self):
+        """
+        Drop cached clients and the loader (e.g. after rotating keys or editing config);
+        the config file is re-read on next use.
+        """
+        with self._lock:
+            clear_config_cache()
+            if self._http_client is not None:
+                self._http_client.close()
+            # The async pool is left to the GC: closing it needs the loop that opened it.
+            self._clients.clear()
+            self._loader = None
+            self._http_client = None
+            self._http_async_client = None
+            self.hits = 0
+            self.misses = 0
+
+
+# Single shared registry per process
+MODEL_REGISTRY = ModelRegistry()
+
 if __name__ == "__main__":
     loader = ModelLoader()
 
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import re
+import difflib
+import hashlib
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.config_loader import load_config
+
+# Running headers/footers like "5", "Page 5", "Page 5 of 100" or "5/100": an inserted page
+# renumbers every page after it, which must not make them all look changed
+_PAGE_NUMBER_RE = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+UNCHANGED, CHANGED, ADDED, REMOVED = "unchanged", "changed", "added", "removed"
+
+
+def page_diff_settings() -> Dict[str, Any]:
+    """compare.page_diff from config: local pre-diff before the LLM sees any page."""
+    cfg = ((load_config().get("compare", {}) or {}).get("page_diff", {}) or {})
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "min_similarity": float(cfg.get("min_similarity", 0.5)),
+        "context_lines": int(cfg.get("context_lines", 1)),
+        "max_diff_chars": int(cfg.get("max_diff_chars", 6000)),
+    }
+
+
+def normalize_lines(text: str) -> List[str]:
+    """Page text as comparable lines: NFKC, whitespace collapsed, blank and page-number lines dropped."""
+    lines = []
+    for line in unicodedata.normalize("NFKC", text or "").splitlines():
+        line = _SPACE_RE.sub(" ", line).strip()
+        if line and not _PAGE_NUMBER_RE.match(line):
+            lines.append(line)
+    return lines
+
+
+def page_hash(lines: Sequence[str]) -> str:
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def similarity(a: Sequence[str], b: Sequence[str]) -> float:
+    """Share of lines two normalised pages have in common (difflib ratio over lines)."""
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+@dataclass
+class PagePair:
+    """One row of the alignment; page numbers are 1-based, None on the side a page is missing from."""
+    status: str
+    reference: Optional[int]
+    actual: Optional[int]
+    similarity: float = 1.0
+
+    @property
+    def label(self) -> str:
+        ref = str(self.reference) if self.reference is not None else "new"
+        act = str(self.actual) if self.actual is not None else "removed"
+        return ref if ref == act else f"{ref} -> {act}"
+
+
+def _align_block(ref: List[List[str]], act: List[List[str]], ref_start: int, act_start: int,
+                 min_similarity: float) -> List[PagePair]:
+    """
+    Pair the pages of a block that differ on both sides, keeping order: a DP that
+    maximises total similarity, where pages below min_similarity stay unpaired
+    (removed/added). Only a diagonal band is scored, so long blocks stay cheap.
+    """
+    n, m = len(ref), len(act)
+    band = abs(n - m) + 3
+    sims: Dict[tuple, float] = {}
+    for i in range(n):
+        for j in range(max(0, i - band), min(m, i + band + 1)):
+            s = similarity(ref[i], act[j])
+            if s >= min_similarity:
+                sims[i, j] = s
+    # best[i][j]: best total similarity aligning ref[i:] with act[j:]
+    best = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n - 1, -1, -1):
+        for j in range(m - 1, -1, -1):
+            options = [best[i + 1][j], best[i][j + 1]]
+            if (i, j) in sims:
+                options.append(sims[i, j] + best[i + 1][j + 1])
+            best[i][j] = max(options)
+
+    pairs: List[PagePair] = []
+    i = j = 0
+    while i < n or j < m:
+        if i < n and j < m and (i, j) in sims and best[i][j] == sims[i, j] + best[i + 1][j + 1]:
+            pairs.append(PagePair(CHANGED, ref_start + i + 1, act_start + j + 1, round(sims[i, j], 4)))
+            i, j = i + 1, j + 1
+        elif i < n and (j == m or best[i][j] == best[i + 1][j]):
+            pairs.append(PagePair(REMOVED, ref_start + i + 1, None, 0.0))
+            i += 1
+        else:
+            pairs.append(PagePair(ADDED, None, act_start + j + 1, 0.0))
+            j += 1
+    return pairs
+
+
+def align_pages(reference: Sequence[str], actual: Sequence[str], min_similarity: float = 0.5) -> List[PagePair]:
+    """
+    Align two documents page by page. Identical pages (after normalisation) are
+    matched by hash even when inserted or removed pages shift the numbering; the
+    remaining pages are paired by similarity or reported as added/removed.
+    """
+    ref = [normalize_lines(t) for t in reference]
+    act = [normalize_lines(t) for t in actual]
+    matcher = difflib.SequenceMatcher(None, [page_hash(p) for p in ref], [page_hash(p) for p in act], autojunk=False)
+    pairs: List[PagePair] = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            pairs.extend(PagePair(UNCHANGED, i + 1, j + 1) for i, j in zip(range(i1, i2), range(j1, j2)))
+        elif op == "delete":
+            pairs.extend(PagePair(REMOVED, i + 1, None, 0.0) for i in range(i1, i2))
+        elif op == "insert":
+            pairs.extend(PagePair(ADDED, None, j + 1, 0.0) for j in range(j1, j2))
+        else:
+            pairs.extend(_align_block(ref[i1:i2], act[j1:j2], i1, j1, min_similarity))
+    return pairs
+
+
+def line_diff(reference: str, actual: str, context_lines: int = 1) -> str:
+    """Unified line diff of two pages' normalised text, without the file header."""
+    diff = difflib.unified_diff(normalize_lines(reference), normalize_lines(actual), lineterm="", n=context_lines)
+    return "\n".join(line for line in diff if not line.startswith(("---", "+++")))
+
+
+def changed_pages_text(pairs: Sequence[PagePair], reference: Sequence[str], actual: Sequence[str],
+                       context_lines: int = 1, max_diff_chars: int = 6000) -> str:
+    """
+    The LLM's input: one section per changed, added or removed page. Changed pages
+    are given as line diffs; added and removed pages as their text.
+    """
+    sections = []
+    for pair in pairs:
+        if pair.status == UNCHANGED:
+            continue
+        if pair.status == CHANGED:
+            body = line_diff(reference[pair.reference - 1], actual[pair.actual - 1], context_lines)
+        elif pair.status == ADDED:
+            body = "\n".join(normalize_lines(actual[pair.actual - 1]))
+        else:
+            body = "\n".join(normalize_lines(reference[pair.reference - 1]))
+        if len(body) > max_diff_chars:
+            body = body[:max_diff_chars] + "\n[... truncated]"
+        sections.append(f"--- Page {pair.label} ({pair.status}) ---\n{body}")
+    return "\n\n".join(sections)
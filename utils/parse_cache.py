@@ -0,0 +1,206 @@
+from __future__ import annotations
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain.schema import Document
+
+from utils.config_loader import load_config
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+_WRITE_BATCH = 64  # pages buffered before they are written
+
+
+def parse_cache_settings() -> Dict[str, Any]:
+    """parse_cache from config: where extracted page text is kept and how large it may grow."""
+    cfg = load_config().get("parse_cache", {}) or {}
+    return {
+        "enabled": bool(cfg.get("enabled", True)),
+        "db_path": str(cfg.get("db_path", "data/parse_cache.sqlite")),
+        "max_bytes": int(float(cfg.get("max_mb", 1024)) * 1024 * 1024),
+    }
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Persistent sqlite cache of parsed documents (page text plus page metadata).
+
+    Entries are keyed by (sha256 of the file's bytes, parser), where parser names the
+    loader and its version, so the same file uploaded to /analyze, /compare or chat
+    ingestion is parsed once until the parser changes. Pages are written while the
+    loader streams them and served back in page order; only a fully parsed file is
+    ever a hit. The cache is trimmed least-recently-used first past max_bytes.
+    """
+
+    def __init__(self, db_path: str | Path, max_bytes: int = 1024 ** 3):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    file_sha256 TEXT NOT NULL,
+                    parser TEXT NOT NULL,
+                    pages INTEGER NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (file_sha256, parser)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    file_sha256 TEXT NOT NULL,
+                    parser TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    PRIMARY KEY (file_sha256, parser, page)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_last_access ON files (last_access)")
+
+    # ---------- Public API ----------
+
+    def load(self, path: str | Path, parser: str, parse: Callable[[], Iterable[Document]]) -> Iterator[Document]:
+        """
+        Documents of path as parse() would produce them, from the cache when this file
+        was already parsed by parser. The "source" metadata is always the given path.
+        """
+        key = file_sha256(path)
+        source = str(path)
+        if self._touch(key, parser):
+            with self._lock:
+                self.hits += 1
+            log.info("Parse cache hit", file=source, parser=parser)
+            yield from self._read(key, parser, source)
+            return
+
+        with self._lock:
+            self.misses += 1
+        with self._connect() as conn:
+            # Rows of an earlier parse that never finished
+            conn.execute("DELETE FROM pages WHERE file_sha256 = ? AND parser = ?", (key, parser))
+        pages, nbytes, buffered = 0, 0, []
+        for doc in parse():
+            metadata = {k: v for k, v in (doc.metadata or {}).items() if k != "source"}
+            row = (key, parser, pages, doc.page_content, json.dumps(metadata, default=str))
+            buffered.append(row)
+            pages += 1
+            nbytes += len(row[3].encode("utf-8")) + len(row[4])
+            if len(buffered) >= _WRITE_BATCH:
+                self._write_pages(buffered)
+                buffered = []
+            yield doc
+        self._write_pages(buffered)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (file_sha256, parser, pages, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, parser, pages, nbytes, time.time()),
+            )
+        log.info("Parse cache stored", file=source, parser=parser, pages=pages, bytes=nbytes)
+        self.trim()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            files, nbytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM files").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "files": files,
+            "bytes": nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def trim(self):
+        """Evict least-recently-used files until the cache is back under 90% of max_bytes."""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM files").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            doomed: List[tuple] = []
+            for key, parser, size in conn.execute("SELECT file_sha256, parser, nbytes FROM files ORDER BY last_access"):
+                if total <= target:
+                    break
+                doomed.append((key, parser))
+                total -= size
+            conn.executemany("DELETE FROM files WHERE file_sha256 = ? AND parser = ?", doomed)
+            conn.executemany("DELETE FROM pages WHERE file_sha256 = ? AND parser = ?", doomed)
+        with self._lock:
+            self.evictions += len(doomed)
+        log.info("Parse cache trimmed", removed=len(doomed), bytes=total)
+
+    # ---------- Internals ----------
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _touch(self, key: str, parser: str) -> bool:
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE files SET last_access = ? WHERE file_sha256 = ? AND parser = ?", (time.time(), key, parser)
+            )
+            return cur.rowcount > 0
+
+    def _read(self, key: str, parser: str, source: str) -> Iterator[Document]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            rows = conn.execute(
+                "SELECT text, metadata FROM pages WHERE file_sha256 = ? AND parser = ? ORDER BY page", (key, parser)
+            )
+            for text, metadata in rows:  # streamed by the cursor, not fetched whole
+                yield Document(page_content=text, metadata={**json.loads(metadata), "source": source})
+        finally:
+            conn.close()
+
+    def _write_pages(self, rows: List[tuple]):
+        if rows:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pages (file_sha256, parser, page, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+
+_cache: Optional[ParseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """Process-wide ParseCache from config, or None when parse_cache.enabled is off."""
+    global _cache
+    settings = parse_cache_settings()
+    if not settings["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.db_path != settings["db_path"]:
+            _cache = ParseCache(settings["db_path"], settings["max_bytes"])
+        return _cache
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import fitz
+
+from utils.config_loader import load_config
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def pdf_extraction_settings() -> Dict[str, Any]:
+    """pdf_extraction from config: when to fan pages out to the process pool, and its size."""
+    cfg = load_config().get("pdf_extraction", {}) or {}
+    return {
+        "parallel_min_pages": int(cfg.get("parallel_min_pages", 64)),
+        "max_workers": int(cfg.get("max_workers") or os.cpu_count() or 1),
+        "ranges_per_worker": max(1, int(cfg.get("ranges_per_worker", 2))),
+        "max_range_pages": max(1, int(cfg.get("max_range_pages", 256))),
+    }
+
+
+def get_extraction_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool shared by every extraction. Workers are spawned, not forked, so they
+    never inherit the API's threads and locks; they are started once and reused.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            log.info("PDF extraction pool created", max_workers=max_workers)
+        return _pool
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker: each opens its own document, fitz objects cannot cross processes
+    with fitz.open(path) as doc:
+        return [doc.load_page(i).get_text() for i in range(start, stop)]
+
+
+def page_ranges(page_count: int, parts: int) -> List[tuple]:
+    """Split [0, page_count) into at most parts contiguous, near-equal (start, stop) ranges."""
+    parts = max(1, min(parts, page_count))
+    bounds = [page_count * i // parts for i in range(parts + 1)]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+def iter_page_texts(pdf_path: str | Path, max_workers: Optional[int] = None,
+                    pool: Optional[ProcessPoolExecutor] = None) -> Iterator[str]:
+    """
+    Text of every page of a PDF, yielded in page order.
+
+    Documents shorter than pdf_extraction.parallel_min_pages (or a single worker) are
+    read sequentially in this process. Longer ones are split into contiguous ranges of
+    at most max_range_pages pages that pool workers extract independently; only a few
+    ranges per worker are in flight, so memory stays bounded however long the PDF is.
+    Encrypted PDFs raise ValueError. max_workers and pool override the config-sized
+    shared pool (benchmarks).
+    """
+    settings = pdf_extraction_settings()
+    workers = max_workers or settings["max_workers"]
+    path = str(pdf_path)
+    with fitz.open(path) as doc:
+        if doc.is_encrypted:
+            raise ValueError(f"PDF is encrypted: {Path(path).name}")
+        page_count = doc.page_count
+        if workers <= 1 or page_count < settings["parallel_min_pages"]:
+            for i in range(page_count):
+                yield doc.load_page(i).get_text()
+            return
+
+    # A few ranges per worker keeps cores busy when some pages are much heavier than others
+    in_flight = workers * settings["ranges_per_worker"]
+    ranges = page_ranges(page_count, max(in_flight, -(-page_count // settings["max_range_pages"])))
+    pool = pool or get_extraction_pool(settings["max_workers"])
+    pending: deque = deque()
+    for lo, hi in ranges:
+        pending.append(pool.submit(_extract_range, path, lo, hi))
+        if len(pending) >= in_flight:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+    log.info("PDF pages extracted in parallel", file=path, pages=page_count, ranges=len(ranges))
+
+
+def extract_page_texts(pdf_path: str | Path, max_workers: Optional[int] = None,
+                       pool: Optional[ProcessPoolExecutor] = None) -> List[str]:
+    """Text of every page of a PDF, in page order (see iter_page_texts)."""
+    return list(iter_page_texts(pdf_path, max_workers=max_workers, pool=pool))
@@ -0,0 +1,94 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+QUANTIZATION_TYPES = ("none", "fp16", "sq8", "binary")
+
+_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+class BinaryIndex:
+    """
+    Float-vector view of a faiss binary index: one bit per dimension (set when the
+    value is positive), searched by Hamming distance.
+
+    Quacks like the IndexIDMap2-wrapped float indexes SegmentedIndex holds (d, ntotal,
+    add_with_ids, search with ID-selector params). Hamming distances are not on the L2
+    scale of other segments, so binary segments are only searched with full-precision
+    rescoring.
+    """
+
+    def __init__(self, index):
+        self.index = index  # faiss.IndexBinaryIDMap2
+        self.d = index.d
+        self.metric_type = faiss.METRIC_L2
+
+    @classmethod
+    def empty(cls, d: int) -> "BinaryIndex":
+        nbits = 8 * ((d + 7) // 8)  # faiss packs codes in whole bytes
+        index = cls(faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(nbits)))
+        index.d = d
+        return index
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def id_map(self):
+        return self.index.id_map
+
+    @staticmethod
+    def encode(x: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(x) > 0, axis=1)
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        self.index.add_with_ids(self.encode(x), np.asarray(ids, dtype=np.int64))
+
+    def search(self, x: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        if params is None:
+            dist, ids = self.index.search(self.encode(x), k)
+        else:
+            dist, ids = self.index.search(self.encode(x), k, params=params)
+        return dist.astype(np.float32), ids
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        raise RuntimeError("Binary codes cannot be decoded; read the segment's full-precision vectors")
+
+    def write(self, path: str | Path):
+        faiss.write_index_binary(self.index, str(path))
+
+    @classmethod
+    def read(cls, path: str | Path, d: int) -> "BinaryIndex":
+        index = cls(faiss.read_index_binary(str(path)))
+        index.d = d
+        return index
+
+
+def quantized_index(vectors: np.ndarray, kind: str):
+    """Empty flat index storing vectors as fp16, 8-bit scalar codes or sign bits (trained on vectors)."""
+    dim = vectors.shape[1]
+    if kind == "binary":
+        return BinaryIndex.empty(dim)
+    index = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[kind], faiss.METRIC_L2)
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))  # sq8: per-dimension ranges
+    return index
+
+
+def codes_kind(index) -> Optional[str]:
+    """Which quantized storage an (ID-mapped) index uses, or None for full-precision indexes."""
+    if isinstance(index, BinaryIndex):
+        return "binary"
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for kind, qtype in _SQ_TYPES.items():
+            if index.sq.qtype == qtype:
+                return kind
+    return None
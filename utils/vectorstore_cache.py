@@ -0,0 +1,237 @@
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from utils.config_loader import load_config
+from utils.faiss_store import index_files, index_memory, load_faiss, mmap_enabled, scoped_vectorstore
+from utils.hybrid_retriever import hybrid_retriever
+from utils.lexical_index import LexicalIndex
+from utils.mmr import mmr_retriever
+#from logger import GLOBAL_LOGGER as log
+from custom_logging import GLOBAL_LOGGER as log
+
+# Per-index load locks are striped over this many locks (see VectorStoreCache._load_lock)
+_LOAD_LOCK_STRIPES = 64
+
+def index_stamp(index_dir: str | Path, index_name: str = "index") -> Tuple:
+    """Cheap on-disk version stamp (mtime + size of the index files, stat only)."""
+    stamp = []
+    for path in index_files(index_dir, index_name):
+        st = os.stat(path)
+        stamp.append((path.name, st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+@dataclass
+class _Entry:
+    vectorstore: FAISS
+    stamp: Tuple
+    nbytes: int
+    mapped_bytes: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    retrievers: "OrderedDict[Tuple, Any]" = field(default_factory=OrderedDict)
+    lexical: Optional[LexicalIndex] = None
+    lexical_loaded: bool = False
+
+
+class VectorStoreCache:
+    """
+    In-process LRU cache of loaded FAISS vectorstores and their retrievers.
+
+    Entries are keyed by (index directory, index name) and carry the on-disk stamp they were
+    loaded from, so a newer version written by any process is picked up on the next lookup.
+    Entries are evicted least-recently-used first once the memory budget is exceeded, and
+    dropped after sitting idle for longer than the TTL.
+
+    Indexes are opened memory-mapped and read-only when faiss_db.mmap is set; mapped
+    bytes live in the shared page cache and do not count against the budget. Each
+    entry keeps at most max_retrievers retrievers (one per session scope and search
+    setting), least-recently-used first out.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 mmap: Optional[bool] = None, max_retrievers: Optional[int] = None):
+        if max_bytes is None or ttl_seconds is None or max_retrievers is None:
+            cfg = load_config().get("vectorstore_cache", {}) or {}
+            max_bytes = max_bytes if max_bytes is not None else int(cfg.get("max_mb", 1024)) * 1024 * 1024
+            ttl_seconds = ttl_seconds if ttl_seconds is not None else float(cfg.get("ttl_seconds", 900))
+            max_retrievers = max_retrievers if max_retrievers is not None else int(cfg.get("max_retrievers", 64))
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_retrievers = max(1, max_retrievers)
+        self.mmap = mmap_enabled() if mmap is None else mmap
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Fixed stripes, so the lock table stays bounded however many indexes come and go
+        self._load_locks = [threading.Lock() for _ in range(_LOAD_LOCK_STRIPES)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(index_dir: str | Path, index_name: str) -> Tuple[str, str]:
+        return (os.path.realpath(index_dir), index_name)
+
+    def get(self, index_dir: str | Path, embeddings, index_name: str = "index") -> FAISS:
+        """Return the vectorstore for index_dir, loading it from disk only on a miss or a new version."""
+        return self._get_entry(index_dir, embeddings, index_name).vectorstore
+
+    def get_retriever(
+        self,
+        index_dir: str | Path,
+        embeddings,
+        index_name: str = "index",
+        search_type: str = "similarity",
+        search_kwargs: Optional[Dict[str, Any]] = None,
+        sessions: Optional[Sequence[str]] = None,
+    ):
+        """
+        Return a (cached) retriever over the cached vectorstore, restricted to the
+        chunks of the given sessions when set (a tenant's shared index). The session
+        filter is built once per index version and reused by every later query.
+
+        search_type "hybrid" fuses BM25 over the index's lexical segments with vector
+        search (see HybridRetriever); fetch_k and rrf_k in search_kwargs override
+        retriever.hybrid. "mmr" re-ranks fetch_k candidates for diversity (see
+        MMRRetriever); fetch_k and lambda_mult override retriever.mmr.
+        """
+        entry = self._get_entry(index_dir, embeddings, index_name)
+        search_kwargs = search_kwargs or {}
+        scope = tuple(sorted(set(sessions))) if sessions is not None else None
+        # Canonical JSON, since values such as a metadata filter dict are not hashable
+        rkey = (search_type, json.dumps(search_kwargs, sort_keys=True, default=str), scope)
+        retriever = self._cached_retriever(entry, rkey)
+        if retriever is not None:
+            return retriever
+
+        # Built outside the cache lock (scoping scans the docstore), once per index key
+        with self._load_lock(self._key(index_dir, index_name)):
+            retriever = self._cached_retriever(entry, rkey)
+            if retriever is not None:
+                return retriever
+            vectorstore = entry.vectorstore if scope is None else scoped_vectorstore(entry.vectorstore, scope)
+            if search_type == "hybrid":
+                retriever = hybrid_retriever(vectorstore, self._lexical(entry, index_dir, index_name), search_kwargs)
+            elif search_type == "mmr":
+                retriever = mmr_retriever(vectorstore, search_kwargs)
+            else:
+                retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+            with self._lock:
+                entry.retrievers[rkey] = retriever
+                while len(entry.retrievers) > self.max_retrievers:
+                    entry.retrievers.popitem(last=False)
+            return retriever
+
+    def invalidate(self, index_dir: str | Path, index_name: Optional[str] = None):
+        """Drop cached entries for index_dir (all index names unless one is given)."""
+        real = os.path.realpath(index_dir)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == real and (index_name is None or k[1] == index_name)]:
+                del self._entries[key]
+                log.info("Vectorstore cache invalidated", index_dir=real, index_name=key[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "mapped_bytes": sum(e.mapped_bytes for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    # ---------- Internals ----------
+
+    def _get_entry(self, index_dir: str | Path, embeddings, index_name: str) -> _Entry:
+        key = self._key(index_dir, index_name)
+        stamp = index_stamp(index_dir, index_name)
+
+        with self._lock:
+            self._expire_idle()
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Load outside the cache lock so other indexes stay servable; one loader per key.
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.stamp == stamp:
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            vectorstore = load_faiss(index_dir, embeddings, index_name=index_name, mmap=self.mmap)
+            # A sqlite docstore stays on disk; only heap-resident vectors (and a legacy pickle) count
+            nbytes, mapped_bytes = index_memory(vectorstore, index_dir, index_name)
+            legacy = Path(index_dir) / f"{index_name}.pkl"
+            nbytes += os.path.getsize(legacy) if legacy.exists() else 0
+            entry = _Entry(vectorstore=vectorstore, stamp=stamp, nbytes=nbytes, mapped_bytes=mapped_bytes)
+            log.info("Vectorstore loaded into cache", index_dir=key[0], index_name=index_name,
+                     nbytes=entry.nbytes, mapped_bytes=entry.mapped_bytes)
+
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self._evict_over_budget()
+            return entry
+
+    def _load_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        # Keys sharing a stripe serialise their (rare) loads, never the cached hits
+        return self._load_locks[hash(key) % len(self._load_locks)]
+
+    def _cached_retriever(self, entry: _Entry, rkey: Tuple):
+        with self._lock:
+            retriever = entry.retrievers.get(rkey)
+            if retriever is not None:
+                entry.retrievers.move_to_end(rkey)
+            return retriever
+
+    def _lexical(self, entry: _Entry, index_dir: str | Path, index_name: str) -> Optional[LexicalIndex]:
+        # Loaded once per cached index version, shared by all its hybrid retrievers. The
+        # caller holds the key's load lock; the cache lock is only taken to publish.
+        if not entry.lexical_loaded:
+            lexical = LexicalIndex.load(index_dir, index_name)
+            with self._lock:
+                entry.lexical, entry.lexical_loaded = lexical, True
+                if lexical is not None:
+                    entry.nbytes += lexical.nbytes
+                    self._evict_over_budget()
+        return entry.lexical
+
+    def _expire_idle(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e.last_used > self.ttl_seconds]:
+            del self._entries[key]
+            self.evictions += 1
+            log.info("Idle vectorstore evicted", index_dir=key[0], index_name=key[1])
+
+    def _evict_over_budget(self):
+        total = sum(e.nbytes for e in self._entries.values())
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+            self.evictions += 1
+            log.info("Vectorstore evicted (memory budget)", index_dir=key[0], index_name=key[1], nbytes=entry.nbytes)
+
+
+# Single shared cache per process
+VECTORSTORE_CACHE = VectorStoreCache()